@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock
+from .models import Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock, NotificationFanout
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -28,7 +28,7 @@ class ConversationParticipantAdmin(admin.ModelAdmin):
 
 @admin.register(SystemNotification)
 class SystemNotificationAdmin(admin.ModelAdmin):
-    list_display = ['recipient', 'title', 'type', 'is_read', 'created_at']
+    list_display = ['recipient', 'title', 'type', 'actor_count', 'is_read', 'created_at']
     list_filter = ['type', 'is_read', 'created_at']
     search_fields = ['title', 'content', 'recipient__username']
 
@@ -36,4 +36,10 @@ class SystemNotificationAdmin(admin.ModelAdmin):
 class UserBlockAdmin(admin.ModelAdmin):
     list_display = ['blocker', 'blocked', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['blocker__username', 'blocked__username']
\ No newline at end of file
+    search_fields = ['blocker__username', 'blocked__username']
+
+@admin.register(NotificationFanout)
+class NotificationFanoutAdmin(admin.ModelAdmin):
+    list_display = ['title', 'type', 'audience', 'status', 'created_count', 'merged_count', 'created_at', 'finished_at']
+    list_filter = ['type', 'audience', 'status']
+    search_fields = ['title']
@@ -0,0 +1,342 @@
+"""私信附件的分块上传、按内容去重存储与下载
+
+上传：
+- 创建 UploadSession 后，客户端按顺序 PUT 分块，请求头 Content-Range: bytes 起始-结束/总大小，
+  请求体为原始字节；服务端边读边写入临时文件，不在内存中保留整个分块
+- 分块必须从已接收的偏移量开始，偏移量不符时返回 409 和当前偏移量，客户端据此续传
+- 文件大小在写入过程中累计并受 ATTACHMENT_MAX_SIZE 限制；文件类型由第一个分块的文件头识别，
+  识别不出时按扩展名推断，受 ATTACHMENT_ALLOWED_TYPES 限制（默认不允许 SVG、HTML、可执行文件）
+- 完成时顺序读一遍临时文件计算 SHA-256，存到 attachments/ab/cd/<sha256>；
+  已有相同内容的文件时直接复用，同一个表情包转发一千次也只存一份
+
+下载：
+- 整个文件用 FileResponse 返回，WSGI 服务器（如 gunicorn）会用 sendfile 零拷贝发送
+- 支持单区间 Range 请求（206），分块同样交给文件包装器发送
+- 设置 ATTACHMENT_ACCEL_REDIRECT 时只返回 X-Accel-Redirect 头，由 nginx 读取文件并处理 Range
+- 只有 INLINE_TYPES 中的位图以 inline 返回，其他类型都作为下载，并带 CSP sandbox 和 nosniff
+
+超过 UPLOAD_SESSION_TTL 的上传会话和超过同样时长未使用、不再被引用的文件由 cleanup_uploads 命令清理。
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import StoredFile, UploadSession
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# 常见文件头，(偏移, 魔数, 类型)
+MAGIC_NUMBERS = [
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'BM', 'image/bmp'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+    (0, b'MZ', 'application/x-msdownload'),
+    (0, b'\x7fELF', 'application/x-executable'),
+]
+
+RIFF_TYPES = {b'WEBP': 'image/webp', b'WAVE': 'audio/wav', b'AVI ': 'video/x-msvideo'}
+
+# 下载时可以在页面内直接展示的类型（不含 SVG 等能携带脚本的格式）
+INLINE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp'}
+
+# 默认允许上传的类型前缀
+DEFAULT_ALLOWED_TYPES = [
+    *sorted(INLINE_TYPES), 'audio/', 'video/', 'text/plain', 'application/pdf',
+    'application/zip', 'application/vnd.rar', 'application/x-7z-compressed', 'application/gzip',
+    'application/msword', 'application/vnd.ms-', 'application/vnd.openxmlformats-officedocument.',
+]
+
+def sniff_mime_type(head, file_name):
+    """按文件头识别类型；识别不出（或只知道是 zip 容器，如 docx）时按扩展名推断"""
+    detected = RIFF_TYPES.get(head[8:12]) if head[:4] == b'RIFF' else None
+    if detected is None:
+        detected = next((mime_type for offset, magic, mime_type in MAGIC_NUMBERS
+                         if head[offset:offset + len(magic)] == magic), None)
+    if detected in (None, 'application/zip'):
+        guessed, _ = mimetypes.guess_type(file_name)
+        # 位图会以 inline 返回，只认文件头，不按扩展名认定
+        if guessed and guessed not in INLINE_TYPES:
+            return guessed
+    return detected or 'application/octet-stream'
+
+def check_mime_type(mime_type):
+    allowed = getattr(settings, 'ATTACHMENT_ALLOWED_TYPES', DEFAULT_ALLOWED_TYPES)
+    if allowed is not None and not any(mime_type.startswith(prefix) for prefix in allowed):
+        raise ValidationError({'file': f'不支持的文件类型：{mime_type}'})
+
+def check_size(size):
+    limit = getattr(settings, 'ATTACHMENT_MAX_SIZE', 50 * 1024 * 1024)
+    if size > limit:
+        raise ValidationError({'size': f'文件不能超过 {limit // (1024 * 1024)}MB'})
+
+def part_path(session):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', f'{session.pk}.part')
+
+def create_session(user, file_name, size):
+    check_size(size)
+    session = UploadSession.objects.create(user=user, file_name=os.path.basename(file_name), size=size)
+    os.makedirs(os.path.dirname(part_path(session)), exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+class OffsetMismatch(Exception):
+    def __init__(self, received):
+        self.received = received
+
+def write_chunk(session, stream, content_range):
+    """把请求体（流）写到临时文件的指定位置，返回新的已接收字节数"""
+    match = CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise ValidationError({'content_range': '需要 Content-Range: bytes 起始-结束/总大小'})
+    start, end, total = (int(value) for value in match.groups())
+    if total != session.size or end < start or end >= total:
+        raise ValidationError({'content_range': 'Content-Range 与上传会话不符'})
+    if session.status != 'uploading':
+        raise ValidationError({'detail': '上传已完成'})
+    if start != session.received:
+        raise OffsetMismatch(session.received)
+
+    expected = end - start + 1
+    written = 0
+    mime_type = session.mime_type
+    with open(part_path(session), 'r+b') as part:
+        part.seek(start)
+        while written < expected:
+            block = stream.read(min(READ_BLOCK_SIZE, expected - written))
+            if not block:
+                break
+            if start + written == 0 and not mime_type:
+                mime_type = sniff_mime_type(block, session.file_name)
+                check_mime_type(mime_type)
+            part.write(block)
+            written += len(block)
+    if written != expected:
+        raise ValidationError({'detail': f'分块不完整：应为 {expected} 字节，收到 {written} 字节'})
+
+    # 条件更新：并发上传同一偏移量的分块时只有一个生效
+    updated = UploadSession.objects.filter(pk=session.pk, received=start, status='uploading').update(
+        received=end + 1, mime_type=mime_type
+    )
+    if not updated:
+        session.refresh_from_db(fields=['received'])
+        raise OffsetMismatch(session.received)
+    session.received = end + 1
+    session.mime_type = mime_type
+    return session.received
+
+def complete_session(session):
+    """上传完毕后计算哈希并存入内容寻址存储，返回 StoredFile"""
+    if session.status == 'complete':
+        return session.stored_file
+    if session.received != session.size:
+        raise OffsetMismatch(session.received)
+    stored = store_file(part_path(session), session.size, session.mime_type or sniff_mime_type(b'', session.file_name))
+    UploadSession.objects.filter(pk=session.pk).update(status='complete', stored_file=stored)
+    session.status = 'complete'
+    session.stored_file = stored
+    return stored
+
+def store_file(path, size, mime_type):
+    """把本地临时文件按 SHA-256 移入存储（已有相同内容时删除临时文件），返回 StoredFile"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+    name = f'attachments/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+    target = default_storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    # 复用已有文件前先刷新使用时间：cleanup_uploads 只删除超过保留期未使用的行，
+    # 并发时要么这里先更新（清理跳过该行），要么清理先删除（这里更新 0 行，重新创建）
+    if StoredFile.objects.filter(sha256=sha256).update(last_used_at=timezone.now()):
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.replace(path, target)
+        return StoredFile.objects.get(sha256=sha256)
+    os.replace(path, target)
+    try:
+        with transaction.atomic():
+            return StoredFile.objects.create(sha256=sha256, file=name, size=size, mime_type=mime_type)
+    except IntegrityError:
+        # 并发写入了相同内容，文件已在同一路径
+        return StoredFile.objects.get(sha256=sha256)
+
+def store_uploaded_file(uploaded):
+    """把表单直接上传的文件（Django UploadedFile）存入内容寻址存储"""
+    check_size(uploaded.size)
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'uploads'), exist_ok=True)
+    path = os.path.join(settings.MEDIA_ROOT, 'uploads', f'{os.urandom(16).hex()}.part')
+    mime_type = None
+    try:
+        with open(path, 'wb') as part:
+            for chunk in uploaded.chunks():
+                if mime_type is None:
+                    mime_type = sniff_mime_type(chunk, uploaded.name)
+                    check_mime_type(mime_type)
+                part.write(chunk)
+    except ValidationError:
+        os.remove(path)
+        raise
+    return store_file(path, uploaded.size, mime_type or sniff_mime_type(b'', uploaded.name))
+
+def cleanup_uploads():
+    """删除过期未完成的上传会话和没有任何附件引用的存储文件，返回 (会话数, 文件数)"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600))
+    stale = UploadSession.objects.filter(updated_at__lt=cutoff).exclude(status='complete')
+    sessions = 0
+    for session in stale.iterator():
+        if os.path.exists(part_path(session)):
+            os.remove(part_path(session))
+        session.delete()
+        sessions += 1
+    UploadSession.objects.filter(updated_at__lt=cutoff, status='complete').delete()
+
+    orphans = StoredFile.objects.filter(last_used_at__lt=cutoff, attachments__isnull=True).exclude(
+        pk__in=UploadSession.objects.filter(stored_file__isnull=False).values('stored_file')
+    )
+    files = 0
+    for pk in list(orphans.values_list('pk', flat=True)):
+        # 先删行、提交后再删文件；加锁后重新确认没有被引用，也没有被 store_file 复用
+        with transaction.atomic():
+            stored = orphans.filter(pk=pk).select_for_update(of=('self',)).first()
+            if stored is None:
+                continue
+            try:
+                stored.delete()
+            except ProtectedError:
+                continue
+            transaction.on_commit(partial(_remove_stored_file, stored.sha256, stored.file.name))
+        files += 1
+    return sessions, files
+
+def _remove_stored_file(sha256, name):
+    # 删除提交后又有相同内容重新存入时，文件已经属于新行
+    if not StoredFile.objects.filter(sha256=sha256).exists():
+        default_storage.delete(name)
+
+class FileRange:
+    """文件的一个区间，按文件包装器的约定提供 read / fileno / close
+
+    文件位置已定位到区间起点；gunicorn 等服务器会按 fileno 当前位置和 Content-Length 调用 sendfile。
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def parse_range(header, size):
+    """解析单区间 Range 头，返回 (start, end)；不是单区间时返回 None（按整个文件返回），越界时返回 False"""
+    match = RANGE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+def attachment_response(request, attachment):
+    """返回附件内容：支持 Range、ETag，内容不可变，可长期缓存"""
+    stored = attachment.stored_file
+    etag = f'"{stored.sha256}"' if stored else None
+    size = stored.size if stored else attachment.file.size
+    content_type = (stored.mime_type if stored else attachment.file_type) or 'application/octet-stream'
+
+    if etag and request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    accel_prefix = getattr(settings, 'ATTACHMENT_ACCEL_REDIRECT', '')
+    if accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + attachment.file.name
+    else:
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if request.headers.get('If-Range') not in (None, etag):
+            byte_range = None
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        file = attachment.file.storage.open(attachment.file.name, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    # 只有位图在页面内直接展示；SVG、HTML 等可执行脚本的类型一律作为下载，并禁止浏览器猜测类型、
+    # 以沙箱方式打开，避免上传的文件在 API 域名下执行脚本
+    inline = content_type in INLINE_TYPES
+    response['Content-Disposition'] = content_disposition_header(not inline, attachment.file_name)
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+class QueryTokenAuthentication(JWTAuthentication):
+    """允许把 access token 放在查询参数 token 中（<img>、<video> 等标签无法设置请求头）"""
+
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        validated = self.get_validated_token(token)
+        return self.get_user(validated), validated
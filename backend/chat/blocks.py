@@ -0,0 +1,49 @@
+"""发消息时的屏蔽检查
+
+为每个用户缓存“屏蔽了他的用户”集合（blocked-by），绝大多数用户没有被任何人屏蔽，
+发消息时集合为空即可放行，不查询数据库；集合非空时才用一条查询核对对话中是否有人屏蔽了发送者。
+
+集合存在 Django 缓存中（多进程部署时各进程共用同一个缓存后端，见 CACHE_BACKEND），
+屏蔽关系增删时由信号在事务提交后删除对应用户的缓存，所有进程下一次发消息就会重新读取；
+另按 BLOCK_CACHE_TIMEOUT 过期。
+"""
+
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import ConversationParticipant, UserBlock
+
+def _cache_key(user_id):
+    return f'blocked_by:{user_id}'
+
+class BlockedByCache:
+    @property
+    def timeout(self):
+        return getattr(settings, 'BLOCK_CACHE_TIMEOUT', 60)
+
+    def get(self, user_id):
+        """返回屏蔽了该用户的用户 id 集合"""
+        key = _cache_key(user_id)
+        blocker_ids = cache.get(key)
+        if blocker_ids is None:
+            blocker_ids = frozenset(UserBlock.objects.filter(blocked_id=user_id).values_list('blocker_id', flat=True))
+            cache.set(key, blocker_ids, self.timeout)
+        return blocker_ids
+
+    def invalidate(self, user_id):
+        """事务提交后删除该用户的缓存，提交前其他请求读到并写回的旧集合也一并清除"""
+        transaction.on_commit(partial(cache.delete, _cache_key(user_id)))
+
+blocked_by_cache = BlockedByCache()
+
+def is_blocked_by(sender_id, recipient_id):
+    """recipient 是否屏蔽了 sender"""
+    return recipient_id in blocked_by_cache.get(sender_id)
+
+def is_blocked_in_conversation(conversation_id, sender_id):
+    """对话中是否有其他参与者屏蔽了 sender"""
+    if not blocked_by_cache.get(sender_id):
+        return False
+    participants = ConversationParticipant.objects.filter(conversation_id=conversation_id).values('user_id')
+    return UserBlock.objects.filter(blocker__in=participants, blocked_id=sender_id).exists()
@@ -0,0 +1,57 @@
+"""推送给 WebSocket 客户端的事件
+
+事件统一为 {"type": ..., ...}：
+- message：新私信，发给对话的所有参与者（包括发送者的其他连接）
+- read：已读回执，发给对话中的其他参与者
+- notification：系统通知，发给接收者
+"""
+
+from django.db import transaction
+from .hub import get_hub, user_channel
+from .models import ConversationParticipant
+from .serializers import PrivateMessageSerializer, SystemNotificationSerializer
+
+def publish_to_users(user_ids, event):
+    """事务提交后再推送，避免客户端收到随后回滚的数据"""
+    channels = [user_channel(user_id) for user_id in user_ids]
+    if channels:
+        transaction.on_commit(lambda: get_hub().publish(channels, event))
+
+def participant_ids(conversation_id):
+    return list(ConversationParticipant.objects.filter(
+        conversation_id=conversation_id
+    ).values_list('user_id', flat=True))
+
+def publish_message(message, user_ids=None):
+    if user_ids is None:
+        user_ids = participant_ids(message.conversation_id)
+    publish_to_users(user_ids, {
+        'type': 'message',
+        'conversation': message.conversation_id,
+        'message': PrivateMessageSerializer(message).data,
+    })
+
+def publish_read_receipt(conversation_id, user_id, last_read_message_id, read_at):
+    recipients = [pk for pk in participant_ids(conversation_id) if pk != user_id]
+    publish_to_users(recipients, {
+        'type': 'read',
+        'conversation': conversation_id,
+        'user': user_id,
+        'last_read_message_id': last_read_message_id,
+        'read_at': read_at,
+    })
+
+def publish_notification(notification):
+    publish_notifications([notification])
+
+def publish_notifications(notifications):
+    """每条通知推送给各自的接收者，事务提交后一次发布"""
+    batch = [
+        ([user_channel(notification.recipient_id)], {
+            'type': 'notification',
+            'notification': SystemNotificationSerializer(notification).data,
+        })
+        for notification in notifications
+    ]
+    if batch:
+        transaction.on_commit(lambda: get_hub().publish_batch(batch))
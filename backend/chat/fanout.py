@@ -0,0 +1,218 @@
+"""系统通知扇出
+
+业务代码调用 notify / notify_tieba_members 只写入一条 NotificationFanout 任务，
+事务提交后按 NOTIFICATION_FANOUT_MODE 处理：thread 由进程内后台线程处理，inline 在提交后同步处理，
+external 不在本进程处理，由 process_notifications 命令作为独立进程处理。
+- 接收者按 id 升序分块，每块一个事务：bulk_create 新通知并推进任务的 cursor，中断后从 cursor 继续，不会重复写入
+- 接收者去重；关闭了推送通知（UserSettings.push_notifications）的用户不接收，system 类型除外
+- 带 group_key 的通知合并：接收者已有同一 group_key 的未读通知时不再新建，
+  而是累加 actor_count 并按 group_title 改写标题，如“3 人赞了你的帖子”
+- 每块提交后向接收者推送新建或合并后的通知（{"type": "notification"}），
+  并失效这些用户的未读数缓存、推送 {"type": "unread"}；批量写入不发 post_save，推送在这里完成
+
+多进程部署时每个进程都有工作线程，任务通过条件 UPDATE 认领，不会被重复处理；
+运行中断（进程退出）的任务超过 NOTIFICATION_FANOUT_STALE_AFTER 秒未更新后可被重新认领。
+"""
+
+import bisect
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from tiebas.models import TiebaMember
+from users.models import User
+from .models import NotificationFanout, SystemNotification
+from .events import publish_notifications
+from .notifications import compact_if_due
+from .unread import unread_changed
+
+logger = logging.getLogger(__name__)
+
+# 不受推送设置影响的通知类型
+ALWAYS_DELIVER_TYPES = {'system'}
+
+def notify(recipient_ids, title, content, type='system', group_key='', group_title='', **related):
+    """给指定用户发通知，related 为 related_post / related_reply / related_tieba / related_user"""
+    recipient_ids = sorted({int(pk) for pk in recipient_ids if pk is not None})
+    if not recipient_ids:
+        return None
+    return _enqueue(NotificationFanout(
+        audience='users', recipient_ids=recipient_ids, type=type, title=title, content=content,
+        group_key=group_key, group_title=group_title, **related,
+    ))
+
+def notify_tieba_members(tieba, title, content, type='tieba_announcement', **related):
+    """给贴吧的全部正常成员发通知"""
+    return _enqueue(NotificationFanout(
+        audience='tieba_members', related_tieba=tieba, type=type, title=title, content=content, **related,
+    ))
+
+def _enqueue(job):
+    job.save()
+    transaction.on_commit(fanout_worker.wake)
+    return job
+
+def claim_next_job():
+    """认领一个待处理（或中断的）任务"""
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATION_FANOUT_STALE_AFTER', 600))
+    claimable = Q(status='pending') | Q(status='running', updated_at__lt=stale_before)
+    for job_id in NotificationFanout.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:10]:
+        claimed = NotificationFanout.objects.filter(claimable, pk=job_id).update(
+            status='running', updated_at=timezone.now()
+        )
+        if claimed:
+            return NotificationFanout.objects.get(pk=job_id)
+    return None
+
+def process_job(job, chunk_size=None):
+    """从 job.cursor 开始分块写入通知直到完成"""
+    chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_FANOUT_CHUNK_SIZE', 1000)
+    try:
+        while True:
+            recipient_ids = _next_recipients(job, chunk_size)
+            if not recipient_ids:
+                break
+            with transaction.atomic():
+                created, merged = _write_chunk(job, recipient_ids)
+                job.cursor = recipient_ids[-1]
+                NotificationFanout.objects.filter(pk=job.pk).update(
+                    cursor=job.cursor,
+                    created_count=F('created_count') + len(created),
+                    merged_count=F('merged_count') + len(merged),
+                    updated_at=timezone.now(),
+                )
+                publish_notifications(created + merged)
+            unread_changed(recipient_ids)
+    except Exception as exc:
+        NotificationFanout.objects.filter(pk=job.pk).update(status='failed', error=repr(exc), updated_at=timezone.now())
+        raise
+    now = timezone.now()
+    NotificationFanout.objects.filter(pk=job.pk).update(status='done', finished_at=now, updated_at=now)
+
+def process_pending(chunk_size=None):
+    """处理所有待处理任务，返回处理的任务数"""
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return processed
+        try:
+            process_job(job, chunk_size)
+        except Exception:
+            logger.exception('通知扇出任务 %s 失败', job.pk)
+        processed += 1
+
+def _next_recipients(job, chunk_size):
+    """取 cursor 之后的下一块接收者 id；一块候选全部被推送设置过滤掉时推进 cursor 继续取"""
+    while True:
+        if job.audience == 'tieba_members':
+            queryset = TiebaMember.objects.filter(
+                tieba_id=job.related_tieba_id, status='active', user_id__gt=job.cursor
+            ).order_by('user_id').values_list('user_id', flat=True)
+            settings_field = 'user__settings__push_notifications'
+            last_candidate = None
+        else:
+            start = bisect.bisect_right(job.recipient_ids, job.cursor)
+            candidates = job.recipient_ids[start:start + chunk_size]
+            if not candidates:
+                return []
+            queryset = User.objects.filter(pk__in=candidates).order_by('pk').values_list('pk', flat=True)
+            settings_field = 'settings__push_notifications'
+            last_candidate = candidates[-1]
+        if job.type not in ALWAYS_DELIVER_TYPES:
+            queryset = queryset.exclude(**{settings_field: False})
+        recipient_ids = list(queryset[:chunk_size])
+        if recipient_ids or last_candidate is None:
+            return recipient_ids
+        job.cursor = last_candidate
+
+def _write_chunk(job, recipient_ids):
+    """写入一块接收者的通知，返回 (新建的通知, 合并后的通知)"""
+    fields = {
+        'type': job.type,
+        'title': job.title,
+        'content': job.content,
+        'group_key': job.group_key,
+        'related_post_id': job.related_post_id,
+        'related_reply_id': job.related_reply_id,
+        'related_tieba_id': job.related_tieba_id,
+        'related_user_id': job.related_user_id,
+    }
+    merged = []
+    if job.group_key:
+        existing = SystemNotification.objects.filter(
+            recipient_id__in=recipient_ids, group_key=job.group_key, is_read=False, is_deleted=False
+        ).order_by('recipient_id', '-id').values_list('recipient_id', 'id', 'actor_count', 'related_user_id')
+        seen = set()
+        now = timezone.now()
+        for recipient_id, notification_id, actor_count, related_user_id in existing:
+            if recipient_id in seen:
+                continue
+            seen.add(recipient_id)
+            # 与最近一次是同一个人（如取消后立即再点赞）时只刷新时间，不重复计数
+            repeated = job.related_user_id is not None and related_user_id == job.related_user_id
+            count = actor_count if repeated else actor_count + 1
+            merged.append(SystemNotification(
+                pk=notification_id,
+                title=job.group_title.format(count=count) if job.group_title else job.title,
+                content=job.content,
+                actor_count=count,
+                related_reply_id=job.related_reply_id,
+                related_user_id=job.related_user_id,
+                created_at=now,
+            ))
+        if merged:
+            SystemNotification.objects.bulk_update(
+                merged, ['title', 'content', 'actor_count', 'related_reply', 'related_user', 'created_at']
+            )
+            merged = list(SystemNotification.objects.filter(pk__in=[notification.pk for notification in merged]))
+        recipient_ids = [pk for pk in recipient_ids if pk not in seen]
+    created = SystemNotification.objects.bulk_create(
+        [SystemNotification(recipient_id=recipient_id, **fields) for recipient_id in recipient_ids],
+        batch_size=500,
+    )
+    return created, merged
+
+class FanoutWorker:
+    """进程内的扇出线程：被唤醒或每隔 NOTIFICATION_FANOUT_POLL_INTERVAL 秒检查一次待处理任务，顺带按期清理过期通知"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def poll_interval(self):
+        return getattr(settings, 'NOTIFICATION_FANOUT_POLL_INTERVAL', 30)
+
+    def wake(self):
+        mode = getattr(settings, 'NOTIFICATION_FANOUT_MODE', 'thread')
+        if mode == 'inline':
+            process_pending()
+            return
+        if mode != 'thread':
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='notification-fanout', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        try:
+            while True:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                try:
+                    process_pending()
+                    compact_if_due()
+                except Exception:
+                    logger.exception('通知扇出失败')
+                close_old_connections()
+        finally:
+            connection.close()
+
+fanout_worker = FanoutWorker()
@@ -0,0 +1,217 @@
+"""实时推送的发布/订阅中心
+
+每个 WebSocket 连接订阅自己的用户频道（user:<id>），业务代码调用 publish 向若干频道发事件。
+- InMemoryHub：进程内直接分发，适用于单进程部署（HTTP 和 WebSocket 由同一个 ASGI 进程提供）
+- DatabaseHub：事件写入 RealtimeEvent 表，各进程的轮询线程读取后在本进程内分发，
+  适用于多 worker 或 WSGI + ASGI 分开部署；事件按 REALTIME_EVENT_RETENTION 定期清理
+
+publish 可以在任意线程调用；事件只编码一次，分发时按事件循环合并投递。
+每个订阅的队列有上限（REALTIME_QUEUE_SIZE），消费跟不上时清空队列并通知连接关闭，
+客户端重连后用消息接口的 since_id 补齐。
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from .models import RealtimeEvent
+
+logger = logging.getLogger(__name__)
+
+# 订阅队列溢出时放入的哨兵
+OVERFLOW = object()
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+def encode_event(event):
+    return json.dumps(event, cls=JSONEncoder, ensure_ascii=False)
+
+class Subscription:
+    """一个连接对一个频道的订阅，必须在事件循环内创建和消费"""
+
+    def __init__(self, hub, channel, maxsize):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, payload):
+        """在事件循环线程内调用"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+class BaseHub(ABC):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    @property
+    def queue_size(self):
+        return getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    @abstractmethod
+    def publish(self, channels, event):
+        """向若干频道发布事件（dict），线程安全"""
+
+    def publish_batch(self, batch):
+        """发布一批 (channels, event)"""
+        for channels, event in batch:
+            self.publish(channels, event)
+
+    def dispatch(self, channel, payload):
+        """把已编码的事件投递给本进程内该频道的订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, group, payload)
+            except RuntimeError:
+                # 事件循环已关闭，连接不会再消费
+                for subscription in group:
+                    self.unsubscribe(subscription)
+
+def _deliver_all(subscriptions, payload):
+    for subscription in subscriptions:
+        subscription.deliver(payload)
+
+class InMemoryHub(BaseHub):
+    def publish(self, channels, event):
+        payload = encode_event(event)
+        for channel in set(channels):
+            self.dispatch(channel, payload)
+
+class DatabaseHub(BaseHub):
+    """以数据库表为中转的跨进程 hub
+
+    写入时每个频道一行；轮询线程只在本进程有订阅者时启动，按自增 id 顺序读取新事件。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._last_id = None
+        self._last_prune = 0
+
+    @property
+    def poll_interval(self):
+        return getattr(settings, 'REALTIME_POLL_INTERVAL', 0.2)
+
+    @property
+    def retention(self):
+        return getattr(settings, 'REALTIME_EVENT_RETENTION', 300)
+
+    def publish(self, channels, event):
+        self.publish_batch([(channels, event)])
+
+    def publish_batch(self, batch):
+        rows = []
+        for channels, event in batch:
+            payload = encode_event(event)
+            rows += [RealtimeEvent(channel=channel, payload=payload) for channel in set(channels)]
+        RealtimeEvent.objects.bulk_create(rows, batch_size=500)
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        self._ensure_poller()
+        return subscription
+
+    def _ensure_poller(self):
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._run_poller, name='realtime-poller', daemon=True)
+            self._poller.start()
+
+    def _run_poller(self):
+        try:
+            while True:
+                try:
+                    fetched = self.poll()
+                except Exception:
+                    logger.exception('实时事件轮询失败')
+                    close_old_connections()
+                    fetched = 0
+                if not fetched:
+                    time.sleep(self.poll_interval)
+        finally:
+            connection.close()
+
+    def poll(self, batch_size=500):
+        """读取并分发一批新事件，返回读取的条数"""
+        if self._last_id is None:
+            self._last_id = RealtimeEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        rows = list(RealtimeEvent.objects.filter(id__gt=self._last_id).order_by('id').values_list(
+            'id', 'channel', 'payload'
+        )[:batch_size])
+        for event_id, channel, payload in rows:
+            self.dispatch(channel, payload)
+            self._last_id = event_id
+        self._prune()
+        return len(rows)
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < self.retention:
+            return
+        self._last_prune = now
+        cutoff = timezone.now() - timedelta(seconds=self.retention)
+        RealtimeEvent.objects.filter(created_at__lt=cutoff).delete()
+
+HUBS = {
+    'memory': InMemoryHub,
+    'database': DatabaseHub,
+}
+
+_hub = None
+
+def get_hub():
+    """按 REALTIME_HUB 配置（memory / database）返回进程内唯一的 hub"""
+    global _hub
+    if _hub is None:
+        _hub = HUBS[getattr(settings, 'REALTIME_HUB', 'memory')]()
+    return _hub
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from chat.attachments import cleanup_uploads
+
+class Command(BaseCommand):
+    help = '清理过期的附件上传会话和不再被引用的附件文件'
+    
+    def handle(self, *args, **options):
+        sessions, files = cleanup_uploads()
+        self.stdout.write(self.style.SUCCESS(f'清理完成：上传会话 {sessions} 个，文件 {files} 个'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from chat.notifications import compact_notifications
+
+class Command(BaseCommand):
+    help = '物理删除已删除和超过保留期的已读系统通知'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批删除的行数')
+    
+    def handle(self, *args, **options):
+        deleted = compact_notifications(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'通知清理完成，删除 {deleted} 条'))
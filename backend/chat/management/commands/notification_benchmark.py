@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from chat.fanout import claim_next_job, notify_tieba_members, process_job
+from chat.models import SystemNotification
+from tiebas.models import Tieba, TiebaMember
+from users.models import User, UserSettings
+
+class Rollback(Exception):
+    pass
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+class Command(BaseCommand):
+    help = '压测贴吧公告的通知扇出：造一个 N 成员的贴吧，对比逐条 INSERT 与分块扇出的耗时（结束后回滚）'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100000, help='贴吧成员数')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='扇出每块写入的接收者数')
+        parser.add_argument('--naive-sample', type=int, default=5000,
+                            help='逐条 INSERT 实测的条数，按比例估算全部成员的耗时；0 表示跳过')
+        parser.add_argument('--opt-out', type=float, default=0.05, help='关闭推送通知的成员比例')
+    
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('压测数据已回滚'))
+    
+    def run(self, options):
+        total = options['recipients']
+        started = time.perf_counter()
+        owner = User.objects.create(username='fanout_bench_owner', nickname='fanout_bench_owner')
+        tieba = Tieba.objects.create(name='fanout_bench', title='fanout_bench', creator=owner)
+        users = User.objects.bulk_create(
+            [User(username=f'fanout_bench_{index}', nickname=f'fanout_bench_{index}') for index in range(total)],
+            batch_size=2000,
+        )
+        TiebaMember.objects.bulk_create(
+            [TiebaMember(tieba=tieba, user=user) for user in users], batch_size=2000,
+        )
+        step = int(1 / options['opt_out']) if options['opt_out'] > 0 else 0
+        if step:
+            UserSettings.objects.bulk_create(
+                [UserSettings(user=user, push_notifications=False) for user in users[::step]], batch_size=2000,
+            )
+        self.stdout.write(f'准备 {total} 个成员用时 {time.perf_counter() - started:.2f}s')
+        
+        sample = min(options['naive_sample'], total)
+        if sample:
+            sid = transaction.savepoint()
+            started = time.perf_counter()
+            for user in users[:sample]:
+                SystemNotification.objects.create(
+                    recipient=user, type='tieba_announcement', title='公告', content='内容', related_tieba=tieba,
+                )
+            elapsed = time.perf_counter() - started
+            transaction.savepoint_rollback(sid)
+            self.stdout.write(f'逐条 INSERT：{sample} 条用时 {elapsed:.2f}s，'
+                              f'{sample / elapsed:.0f} 条/秒，估算 {total} 条约 {elapsed * total / sample:.1f}s')
+        
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            notify_tieba_members(tieba, '公告', '内容')
+        enqueue_elapsed = time.perf_counter() - started
+        
+        job = claim_next_job()
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            process_job(job, chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        job.refresh_from_db()
+        self.stdout.write(f'入队用时 {enqueue_elapsed * 1000:.1f}ms（请求线程上的全部开销）')
+        self.stdout.write(f'分块扇出：写入 {job.created_count} 条（跳过关闭推送的成员 {total - job.created_count} 个），'
+                          f'用时 {elapsed:.2f}s，{job.created_count / elapsed:.0f} 条/秒，{counter.count} 条 SQL')
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from chat.fanout import process_pending
+from chat.notifications import compact_if_due
+
+class Command(BaseCommand):
+    help = '处理待发送的通知扇出任务（包括中断后可重新认领的任务）；--loop 时还会按期清理过期通知'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='每块写入的接收者数')
+        parser.add_argument('--loop', action='store_true', help='持续运行，作为独立的扇出进程')
+        parser.add_argument('--interval', type=float, default=1.0, help='--loop 时空闲的轮询间隔（秒）')
+    
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending(chunk_size=options['chunk_size'])
+            if processed:
+                self.stdout.write(f'处理 {processed} 个任务')
+            if not options['loop']:
+                break
+            compact_if_due()
+            if not processed:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('通知扇出任务处理完成'))
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.hub import get_hub, user_channel
+from chat.websocket import ChatSocket
+
+class Command(BaseCommand):
+    help = '在进程内建立大量 WebSocket 连接，压测实时推送的扇出延迟'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000, help='并发连接数')
+        parser.add_argument('--users', type=int, default=2000, help='连接分布到的用户数（同一用户可有多个连接）')
+        parser.add_argument('--events', type=int, default=2000, help='发布的事件数')
+        parser.add_argument('--recipients', type=int, default=2, help='每个事件的接收用户数')
+        parser.add_argument('--hub', choices=['memory', 'database'], default=None, help='hub 类型，默认取 REALTIME_HUB')
+    
+    def handle(self, *args, **options):
+        if options['hub']:
+            settings.REALTIME_HUB = options['hub']
+        asyncio.run(self.run(options))
+    
+    async def run(self, options):
+        hub = get_hub()
+        app = ChatSocket()
+        users = options['users']
+        
+        started = time.perf_counter()
+        communicators = []
+        for index in range(options['connections']):
+            communicator = ApplicationCommunicator(app, {
+                'type': 'websocket', 'path': '/ws/chat/', 'user_id': index % users,
+            })
+            await communicator.send_input({'type': 'websocket.connect'})
+            communicators.append(communicator)
+        for communicator in communicators:
+            await communicator.receive_output(timeout=10)
+        self.stdout.write(f'建立 {len(communicators)} 个连接用时 {time.perf_counter() - started:.2f}s，'
+                          f'订阅数 {hub.subscriber_count()}')
+        
+        # 预先算好每个连接应收到的事件数
+        plan = [random.sample(range(users), options['recipients']) for _ in range(options['events'])]
+        connections_per_user = [0] * users
+        for index in range(len(communicators)):
+            connections_per_user[index % users] += 1
+        expected = [0] * len(communicators)
+        received_by_user = [0] * users
+        for recipients in plan:
+            for user_id in recipients:
+                received_by_user[user_id] += 1
+        for index in range(len(communicators)):
+            expected[index] = received_by_user[index % users]
+        
+        latencies = []
+        
+        async def consume(communicator, count):
+            for _ in range(count):
+                output = await communicator.receive_output(timeout=30)
+                latencies.append(time.perf_counter() - json.loads(output['text'])['sent_at'])
+        
+        consumers = [asyncio.ensure_future(consume(c, n)) for c, n in zip(communicators, expected)]
+        
+        def publish():
+            for recipients in plan:
+                hub.publish([user_channel(user_id) for user_id in recipients],
+                            {'type': 'loadtest', 'sent_at': time.perf_counter()})
+        
+        started = time.perf_counter()
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        await asyncio.gather(*consumers)
+        elapsed = time.perf_counter() - started
+        publisher.join()
+        
+        latencies.sort()
+        self.stdout.write(f'发布 {len(plan)} 个事件，投递 {len(latencies)} 条，用时 {elapsed:.2f}s，'
+                          f'{len(latencies) / elapsed:.0f} 条/秒')
+        self.stdout.write(f'延迟 p50 {statistics.median(latencies) * 1000:.1f}ms，'
+                          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms，'
+                          f'max {latencies[-1] * 1000:.1f}ms')
+        
+        for communicator in communicators:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        for communicator in communicators:
+            await communicator.wait(timeout=10)
+        self.stdout.write(self.style.SUCCESS(f'断开后剩余订阅数 {hub.subscriber_count()}'))
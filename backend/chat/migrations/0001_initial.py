@@ -0,0 +1,142 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0001_initial'),
+        ('tiebas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=200, verbose_name='对话标题')),
+                ('type', models.CharField(choices=[('private', '私信'), ('group', '群聊')], default='private', max_length=20, verbose_name='对话类型')),
+                ('message_count', models.IntegerField(default=0, verbose_name='消息数')),
+                ('unread_count', models.IntegerField(default=0, verbose_name='未读消息数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True, verbose_name='最后消息时间')),
+                ('participants', models.ManyToManyField(related_name='conversations', to=settings.AUTH_USER_MODEL, verbose_name='参与者')),
+            ],
+            options={
+                'verbose_name': '私信对话',
+                'verbose_name_plural': '私信对话',
+                'ordering': ['-last_message_at', '-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrivateMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField(verbose_name='消息内容')),
+                ('type', models.CharField(choices=[('text', '文本'), ('image', '图片'), ('file', '文件'), ('system', '系统消息')], default='text', max_length=20, verbose_name='消息类型')),
+                ('is_read', models.BooleanField(default=False, verbose_name='是否已读')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='是否删除')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='发送时间')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.conversation', verbose_name='对话')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL, verbose_name='发送者')),
+            ],
+            options={
+                'verbose_name': '私信消息',
+                'verbose_name_plural': '私信消息',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='message_attachments/', verbose_name='附件文件')),
+                ('file_name', models.CharField(max_length=255, verbose_name='文件名')),
+                ('file_size', models.IntegerField(default=0, verbose_name='文件大小')),
+                ('file_type', models.CharField(max_length=50, verbose_name='文件类型')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='上传时间')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='chat.privatemessage', verbose_name='消息')),
+            ],
+            options={
+                'verbose_name': '消息附件',
+                'verbose_name_plural': '消息附件',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_muted', models.BooleanField(default=False, verbose_name='是否静音')),
+                ('is_blocked', models.BooleanField(default=False, verbose_name='是否屏蔽')),
+                ('unread_count', models.IntegerField(default=0, verbose_name='未读消息数')),
+                ('last_read_at', models.DateTimeField(blank=True, null=True, verbose_name='最后阅读时间')),
+                ('joined_at', models.DateTimeField(auto_now_add=True, verbose_name='加入时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participant_status', to='chat.conversation', verbose_name='对话')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_status', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '对话参与者状态',
+                'verbose_name_plural': '对话参与者状态',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='屏蔽时间')),
+                ('blocked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_by', to=settings.AUTH_USER_MODEL, verbose_name='被屏蔽者')),
+                ('blocker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_users', to=settings.AUTH_USER_MODEL, verbose_name='屏蔽者')),
+            ],
+            options={
+                'verbose_name': '用户屏蔽',
+                'verbose_name_plural': '用户屏蔽',
+                'ordering': ['-created_at'],
+                'unique_together': {('blocker', 'blocked')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='通知标题')),
+                ('content', models.TextField(verbose_name='通知内容')),
+                ('type', models.CharField(choices=[('post_reply', '帖子回复'), ('post_like', '帖子点赞'), ('reply_like', '回复点赞'), ('follow', '用户关注'), ('tieba_join', '贴吧加入'), ('tieba_announcement', '贴吧公告'), ('system', '系统消息')], default='system', max_length=50, verbose_name='通知类型')),
+                ('is_read', models.BooleanField(default=False, verbose_name='是否已读')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='是否删除')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='接收者')),
+                ('related_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='posts.post', verbose_name='关联帖子')),
+                ('related_reply', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='posts.reply', verbose_name='关联回复')),
+                ('related_tieba', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tiebas.tieba', verbose_name='关联贴吧')),
+                ('related_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sent_notifications', to=settings.AUTH_USER_MODEL, verbose_name='关联用户')),
+            ],
+            options={
+                'verbose_name': '系统通知',
+                'verbose_name_plural': '系统通知',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['recipient', 'is_read', 'created_at'], name='chat_system_recipie_44f7da_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['conversation', 'created_at'], name='chat_privat_convers_1774b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['sender', 'created_at'], name='chat_privat_sender__37bae1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversationparticipant',
+            unique_together={('conversation', 'user')},
+        ),
+    ]
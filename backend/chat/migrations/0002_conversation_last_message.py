@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_last_message(apps, schema_editor):
+    """回填已有对话的最后一条消息"""
+    Conversation = apps.get_model('chat', 'Conversation')
+    PrivateMessage = apps.get_model('chat', 'PrivateMessage')
+    latest = PrivateMessage.objects.filter(
+        conversation_id=models.OuterRef('pk')
+    ).order_by('-created_at', '-id').values('id')[:1]
+    Conversation.objects.update(last_message_id=models.Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.privatemessage', verbose_name='最后一条消息'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_conversation_last_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealtimeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100, verbose_name='频道')),
+                ('payload', models.TextField(verbose_name='事件内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '实时事件',
+                'verbose_name_plural': '实时事件',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_read_state(apps, schema_editor):
+    """按 last_read_at 推算已读水位，并据此重算未读数（此前发消息时从未累加）"""
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    PrivateMessage = apps.get_model('chat', 'PrivateMessage')
+    watermark = PrivateMessage.objects.filter(
+        conversation_id=models.OuterRef('conversation_id'),
+        created_at__lte=models.OuterRef('last_read_at'),
+    ).order_by().values('conversation_id').annotate(m=models.Max('id')).values('m')
+    ConversationParticipant.objects.filter(last_read_at__isnull=False).update(
+        last_read_message_id=Coalesce(models.Subquery(watermark), 0)
+    )
+    unread = PrivateMessage.objects.filter(
+        conversation_id=models.OuterRef('conversation_id'),
+        id__gt=models.OuterRef('last_read_message_id'),
+    ).exclude(sender_id=models.OuterRef('user_id')).order_by().values('conversation_id').annotate(
+        n=models.Count('id')
+    ).values('n')
+    ConversationParticipant.objects.update(unread_count=Coalesce(models.Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_realtimeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0, verbose_name='已读到的消息ID'),
+        ),
+        migrations.RunPython(backfill_read_state, migrations.RunPython.noop),
+    ]
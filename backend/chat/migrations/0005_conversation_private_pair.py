@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_private_pairs(apps, schema_editor):
+    """为已有的一对一私信填写用户对；同一对用户的重复对话只保留最近活跃的那个作为规范对话"""
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    user_ids = {}
+    for conversation_id, user_id in ConversationParticipant.objects.filter(
+        conversation__type='private'
+    ).values_list('conversation_id', 'user_id'):
+        user_ids.setdefault(conversation_id, set()).add(user_id)
+
+    seen = set()
+    conversations = Conversation.objects.filter(pk__in=user_ids).order_by(
+        models.F('last_message_at').desc(nulls_last=True), '-id'
+    )
+    for conversation_id in conversations.values_list('id', flat=True):
+        pair = sorted(user_ids[conversation_id])
+        if len(pair) != 2 or tuple(pair) in seen:
+            continue
+        seen.add(tuple(pair))
+        Conversation.objects.filter(pk=conversation_id).update(min_user_id=pair[0], max_user_id=pair[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0004_participant_read_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='max_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='私信用户（较大ID）'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='min_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='私信用户（较小ID）'),
+        ),
+        migrations.RunPython(backfill_private_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('min_user', 'max_user'), name='unique_private_conversation_pair'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_hot_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tiebas', '0001_initial'),
+        ('chat', '0005_conversation_private_pair'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationFanout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('post_reply', '帖子回复'), ('post_like', '帖子点赞'), ('reply_like', '回复点赞'), ('follow', '用户关注'), ('tieba_join', '贴吧加入'), ('tieba_announcement', '贴吧公告'), ('system', '系统消息')], default='system', max_length=50, verbose_name='通知类型')),
+                ('title', models.CharField(max_length=200, verbose_name='通知标题')),
+                ('content', models.TextField(verbose_name='通知内容')),
+                ('group_key', models.CharField(blank=True, default='', max_length=100, verbose_name='合并键')),
+                ('group_title', models.CharField(blank=True, default='', max_length=200, verbose_name='合并标题')),
+                ('audience', models.CharField(choices=[('users', '指定用户'), ('tieba_members', '贴吧成员')], default='users', max_length=20, verbose_name='接收范围')),
+                ('recipient_ids', models.JSONField(blank=True, default=list, verbose_name='接收者ID')),
+                ('status', models.CharField(choices=[('pending', '等待中'), ('running', '进行中'), ('done', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('cursor', models.BigIntegerField(default=0, verbose_name='处理进度')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='新建条数')),
+                ('merged_count', models.PositiveIntegerField(default=0, verbose_name='合并条数')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+            ],
+            options={
+                'verbose_name': '通知扇出任务',
+                'verbose_name_plural': '通知扇出任务',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='systemnotification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='合并次数'),
+        ),
+        migrations.AddField(
+            model_name='systemnotification',
+            name='group_key',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='合并键'),
+        ),
+        migrations.AddIndex(
+            model_name='systemnotification',
+            index=models.Index(fields=['recipient', 'group_key'], name='chat_system_recipie_b4a2b9_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='related_post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='posts.post', verbose_name='关联帖子'),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='related_reply',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='posts.reply', verbose_name='关联回复'),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='related_tieba',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tiebas.tieba', verbose_name='关联贴吧'),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='related_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='关联用户'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationfanout',
+            index=models.Index(fields=['status', 'id'], name='chat_notifi_status_730ba8_idx'),
+        ),
+    ]
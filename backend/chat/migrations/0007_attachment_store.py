@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0006_notification_fanout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('file', models.FileField(max_length=200, upload_to='', verbose_name='文件')),
+                ('size', models.BigIntegerField(verbose_name='文件大小')),
+                ('mime_type', models.CharField(max_length=100, verbose_name='文件类型')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '附件存储',
+                'verbose_name_plural': '附件存储',
+            },
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file',
+            field=models.FileField(max_length=200, upload_to='message_attachments/', verbose_name='附件文件'),
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file_size',
+            field=models.BigIntegerField(default=0, verbose_name='文件大小'),
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file_type',
+            field=models.CharField(max_length=100, verbose_name='文件类型'),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255, verbose_name='文件名')),
+                ('size', models.BigIntegerField(verbose_name='文件大小')),
+                ('received', models.BigIntegerField(default=0, verbose_name='已接收字节数')),
+                ('mime_type', models.CharField(blank=True, default='', max_length=100, verbose_name='文件类型')),
+                ('status', models.CharField(choices=[('uploading', '上传中'), ('complete', '已完成')], default='uploading', max_length=20, verbose_name='状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('stored_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.storedfile', verbose_name='存储文件')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='上传者')),
+            ],
+            options={
+                'verbose_name': '上传会话',
+                'verbose_name_plural': '上传会话',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='stored_file',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='chat.storedfile', verbose_name='存储文件'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_attachment_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='最近使用时间'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_stored_file_last_used'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['conversation', 'id'], name='chat_privat_convers_f9c05a_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import uuid
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -26,11 +30,22 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     last_message_at = models.DateTimeField(null=True, blank=True, verbose_name='最后消息时间')
+    last_message = models.ForeignKey('PrivateMessage', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+', verbose_name='最后一条消息')
+    
+    # 一对一私信的规范化用户对（较小 id, 较大 id），群聊为空
+    min_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='+', verbose_name='私信用户（较小ID）')
+    max_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='+', verbose_name='私信用户（较大ID）')
     
     class Meta:
         verbose_name = '私信对话'
         verbose_name_plural = '私信对话'
         ordering = ['-last_message_at', '-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['min_user', 'max_user'], name='unique_private_conversation_pair'),
+        ]
     
     def __str__(self):
         if self.title:
@@ -39,13 +54,36 @@ class Conversation(models.Model):
         names = [user.nickname or user.username for user in participants]
         return ', '.join(names)
     
-    def update_last_message(self):
-        """更新最后消息时间和统计信息"""
-        last_message = self.messages.order_by('-created_at').first()
-        if last_message:
-            self.last_message_at = last_message.created_at
-            self.message_count = self.messages.count()
-            self.save()
+    @classmethod
+    def get_or_create_private(cls, user, other):
+        """按用户对查找或创建一对一私信，返回 (conversation, created)
+
+        查找是唯一索引上的一次点查；并发创建时唯一约束保证只有一个成功，
+        失败的一方回滚后读取已存在的对话。
+        """
+        min_user_id, max_user_id = sorted([user.pk, other.pk])
+        conversation = cls.objects.filter(min_user_id=min_user_id, max_user_id=max_user_id).first()
+        if conversation is not None:
+            return conversation, False
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(type='private', min_user_id=min_user_id, max_user_id=max_user_id)
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation=conversation, user_id=user_id)
+                    for user_id in {min_user_id, max_user_id}
+                ])
+        except IntegrityError:
+            return cls.objects.get(min_user_id=min_user_id, max_user_id=max_user_id), False
+        return conversation, True
+    
+    def update_last_message(self, message):
+        """发送消息后原子地更新最后消息指针和消息数，列表页无需再逐个对话查询最新消息"""
+        Conversation.objects.filter(pk=self.pk).update(
+            last_message=message,
+            last_message_at=message.created_at,
+            message_count=models.F('message_count') + 1,
+            updated_at=timezone.now(),
+        )
 
 class PrivateMessage(models.Model):
     """私信消息"""
@@ -78,19 +116,67 @@ class PrivateMessage(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['conversation', 'created_at']),
+            # 部分已读时统计水位之后的消息
+            models.Index(fields=['conversation', 'id']),
             models.Index(fields=['sender', 'created_at']),
         ]
     
     def __str__(self):
         return f"{self.sender} -> {self.conversation}: {self.content[:50]}"
 
+class StoredFile(models.Model):
+    """按内容寻址存储的附件文件：路径由 SHA-256 决定，相同内容只存一份"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    file = models.FileField(max_length=200, verbose_name='文件')
+    size = models.BigIntegerField(verbose_name='文件大小')
+    mime_type = models.CharField(max_length=100, verbose_name='文件类型')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    last_used_at = models.DateTimeField(default=timezone.now, verbose_name='最近使用时间')
+    
+    class Meta:
+        verbose_name = '附件存储'
+        verbose_name_plural = '附件存储'
+    
+    def __str__(self):
+        return self.sha256
+
+class UploadSession(models.Model):
+    """分块上传会话：客户端按偏移量顺序上传分块，中断后查询已接收的字节数继续上传"""
+    
+    STATUS_CHOICES = [
+        ('uploading', '上传中'),
+        ('complete', '已完成'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions', verbose_name='上传者')
+    file_name = models.CharField(max_length=255, verbose_name='文件名')
+    size = models.BigIntegerField(verbose_name='文件大小')
+    received = models.BigIntegerField(default=0, verbose_name='已接收字节数')
+    mime_type = models.CharField(max_length=100, blank=True, default='', verbose_name='文件类型')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name='状态')
+    stored_file = models.ForeignKey(StoredFile, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+', verbose_name='存储文件')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    
+    class Meta:
+        verbose_name = '上传会话'
+        verbose_name_plural = '上传会话'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.user} - {self.file_name}"
+
 class MessageAttachment(models.Model):
     """消息附件"""
     message = models.ForeignKey(PrivateMessage, on_delete=models.CASCADE, related_name='attachments', verbose_name='消息')
-    file = models.FileField(upload_to='message_attachments/', verbose_name='附件文件')
+    file = models.FileField(upload_to='message_attachments/', max_length=200, verbose_name='附件文件')
+    stored_file = models.ForeignKey(StoredFile, on_delete=models.PROTECT, null=True, blank=True,
+                                    related_name='attachments', verbose_name='存储文件')
     file_name = models.CharField(max_length=255, verbose_name='文件名')
-    file_size = models.IntegerField(default=0, verbose_name='文件大小')
-    file_type = models.CharField(max_length=50, verbose_name='文件类型')
+    file_size = models.BigIntegerField(default=0, verbose_name='文件大小')
+    file_type = models.CharField(max_length=100, verbose_name='文件类型')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='上传时间')
     
     class Meta:
@@ -111,6 +197,7 @@ class ConversationParticipant(models.Model):
     is_blocked = models.BooleanField(default=False, verbose_name='是否屏蔽')
     unread_count = models.IntegerField(default=0, verbose_name='未读消息数')
     last_read_at = models.DateTimeField(null=True, blank=True, verbose_name='最后阅读时间')
+    last_read_message_id = models.BigIntegerField(default=0, verbose_name='已读到的消息ID')
     
     # 时间戳
     joined_at = models.DateTimeField(auto_now_add=True, verbose_name='加入时间')
@@ -124,6 +211,47 @@ class ConversationParticipant(models.Model):
     
     def __str__(self):
         return f"{self.user} - {self.conversation}"
+    
+    @classmethod
+    def record_message(cls, message):
+        """新消息到达：除发送者外的参与者未读数各 +1，一条 UPDATE"""
+        return cls.objects.filter(
+            conversation_id=message.conversation_id
+        ).exclude(user_id=message.sender_id).update(unread_count=models.F('unread_count') + 1)
+    
+    @classmethod
+    def mark_read(cls, conversation_id, user_id, message_id=None):
+        """把已读水位推进到 message_id（默认为对话的最后一条消息），一条 UPDATE
+
+        水位之后他人发来的消息即为未读，水位只前进不后退。
+        读到最新（message_id 不早于对话的 last_message_id）时未读数直接清零，与消息条数无关；
+        只读到中间某条时，剩余未读数按水位之后他人发来的消息 COUNT：
+        未读数只计他人的消息，水位之后可能夹着自己发的消息，无法由计数相减得出。
+        这个 COUNT 沿 (conversation, id) 索引只扫描仍未读的消息，即本次返回的未读数本身。
+        水位没有前进且没有未读时不写库，返回 False。
+        """
+        participant = cls.objects.filter(conversation_id=conversation_id, user_id=user_id)
+        latest = models.Subquery(Conversation.objects.filter(pk=conversation_id).order_by().values('last_message_id'))
+        if message_id is None:
+            return participant.filter(
+                models.Q(unread_count__gt=0) | models.Q(last_read_message_id__lt=latest)
+            ).update(
+                last_read_message_id=Coalesce(latest, models.F('last_read_message_id')),
+                unread_count=0,
+                last_read_at=timezone.now(),
+            ) > 0
+        
+        remaining = PrivateMessage.objects.filter(
+            conversation_id=conversation_id, id__gt=message_id
+        ).exclude(sender_id=user_id).order_by().values('conversation_id').annotate(n=models.Count('id')).values('n')
+        return participant.filter(last_read_message_id__lt=message_id).update(
+            last_read_message_id=message_id,
+            unread_count=models.Case(
+                models.When(GreaterThanOrEqual(models.Value(message_id), latest), then=models.Value(0)),
+                default=Coalesce(models.Subquery(remaining), 0),
+            ),
+            last_read_at=timezone.now(),
+        ) > 0
 
 class SystemNotification(models.Model):
     """系统通知"""
@@ -153,6 +281,10 @@ class SystemNotification(models.Model):
     related_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, 
                                     related_name='sent_notifications', verbose_name='关联用户')
     
+    # 合并通知：同一 group_key 的未读通知只保留一条，actor_count 记录合并的次数
+    group_key = models.CharField(max_length=100, blank=True, default='', verbose_name='合并键')
+    actor_count = models.PositiveIntegerField(default=1, verbose_name='合并次数')
+    
     # 通知状态
     is_read = models.BooleanField(default=False, verbose_name='是否已读')
     is_deleted = models.BooleanField(default=False, verbose_name='是否删除')
@@ -166,11 +298,66 @@ class SystemNotification(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', 'is_read', 'created_at']),
+            models.Index(fields=['recipient', 'group_key']),
         ]
     
     def __str__(self):
         return f"{self.recipient} - {self.title}"
 
+class NotificationFanout(models.Model):
+    """通知扇出任务：一条任务对应发给一批用户的同一条通知，由后台按接收者 id 顺序分块写入"""
+    
+    AUDIENCE_CHOICES = [
+        ('users', '指定用户'),
+        ('tieba_members', '贴吧成员'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', '等待中'),
+        ('running', '进行中'),
+        ('done', '已完成'),
+        ('failed', '失败'),
+    ]
+    
+    # 通知内容，group_title 为合并后的标题模板，可包含 {count}
+    type = models.CharField(max_length=50, choices=SystemNotification.NOTIFICATION_TYPES, default='system', verbose_name='通知类型')
+    title = models.CharField(max_length=200, verbose_name='通知标题')
+    content = models.TextField(verbose_name='通知内容')
+    group_key = models.CharField(max_length=100, blank=True, default='', verbose_name='合并键')
+    group_title = models.CharField(max_length=200, blank=True, default='', verbose_name='合并标题')
+    
+    related_post = models.ForeignKey('posts.Post', on_delete=models.CASCADE, null=True, blank=True, verbose_name='关联帖子')
+    related_reply = models.ForeignKey('posts.Reply', on_delete=models.CASCADE, null=True, blank=True, verbose_name='关联回复')
+    related_tieba = models.ForeignKey('tiebas.Tieba', on_delete=models.CASCADE, null=True, blank=True, verbose_name='关联贴吧')
+    related_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='+', verbose_name='关联用户')
+    
+    # 接收者：指定用户列表，或 related_tieba 的全部正常成员
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='users', verbose_name='接收范围')
+    recipient_ids = models.JSONField(default=list, blank=True, verbose_name='接收者ID')
+    
+    # 进度：已处理到的接收者 id，中断后从这里继续
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='状态')
+    cursor = models.BigIntegerField(default=0, verbose_name='处理进度')
+    created_count = models.PositiveIntegerField(default=0, verbose_name='新建条数')
+    merged_count = models.PositiveIntegerField(default=0, verbose_name='合并条数')
+    error = models.TextField(blank=True, default='', verbose_name='错误信息')
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+    
+    class Meta:
+        verbose_name = '通知扇出任务'
+        verbose_name_plural = '通知扇出任务'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_display()} - {self.title}"
+
 class UserBlock(models.Model):
     """用户屏蔽"""
     blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocked_users', verbose_name='屏蔽者')
@@ -184,4 +371,18 @@ class UserBlock(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.blocker} 屏蔽 {self.blocked}"
\ No newline at end of file
+        return f"{self.blocker} 屏蔽 {self.blocked}"
+
+class RealtimeEvent(models.Model):
+    """实时事件中转（REALTIME_HUB = 'database' 时使用），只保留最近一段时间"""
+    channel = models.CharField(max_length=100, verbose_name='频道')
+    payload = models.TextField(verbose_name='事件内容')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')
+    
+    class Meta:
+        verbose_name = '实时事件'
+        verbose_name_plural = '实时事件'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.channel} #{self.pk}"
@@ -0,0 +1,72 @@
+"""系统通知收件箱的批量操作与保留期清理
+
+- 标记已读、删除都是一条带条件的 UPDATE，与通知条数无关；删除是软删除，同时视为已读
+- 已软删除的通知和超过 NOTIFICATION_RETENTION_DAYS 天的已读通知由清理任务按主键分批物理删除，
+  清理任务在通知扇出的工作线程（或 process_notifications --loop）中每隔 NOTIFICATION_COMPACT_INTERVAL 秒运行一次，
+  也可以用 compact_notifications 命令手动运行
+"""
+
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import SystemNotification
+from .unread import unread_changed
+
+def mark_notifications_read(user_id, ids=None, before=None):
+    """把用户的未读通知标记为已读：ids 指定通知，before 指定该时间及之前的全部通知，都不传则全部；返回修改条数"""
+    # is_read__in 生成 IN (?)，才能用上 (recipient, is_read, created_at) 索引
+    queryset = SystemNotification.objects.filter(recipient_id=user_id, is_read__in=[False])
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if before is not None:
+        queryset = queryset.filter(created_at__lte=before)
+    updated = queryset.update(is_read=True)
+    if updated:
+        unread_changed([user_id])
+    return updated
+
+def delete_notifications(user_id, ids):
+    """软删除用户的通知，返回修改条数"""
+    queryset = SystemNotification.objects.filter(recipient_id=user_id, pk__in=ids, is_deleted=False)
+    updated = queryset.update(is_deleted=True, is_read=True)
+    if updated:
+        unread_changed([user_id])
+    return updated
+
+def compact_notifications(batch_size=1000):
+    """物理删除已软删除和过期的已读通知，返回删除条数
+
+    这些通知都不影响未读数，直接执行 DELETE，不逐条发送 post_delete 信号。
+    """
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 30))
+    expired = Q(is_deleted=True) | Q(is_read=True, created_at__lt=cutoff)
+    table = connection.ops.quote_name(SystemNotification._meta.db_table)
+    deleted = 0
+    last_pk = 0
+    while True:
+        ids = list(SystemNotification.objects.filter(expired, pk__gt=last_pk).order_by('pk').values_list(
+            'pk', flat=True
+        )[:batch_size])
+        if not ids:
+            return deleted
+        last_pk = ids[-1]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+            deleted += cursor.rowcount
+
+_compact_lock = threading.Lock()
+_last_compact = None
+
+def compact_if_due():
+    """距离上次清理超过 NOTIFICATION_COMPACT_INTERVAL 秒时运行一次清理"""
+    global _last_compact
+    now = time.monotonic()
+    with _compact_lock:
+        if _last_compact is not None and now - _last_compact < getattr(settings, 'NOTIFICATION_COMPACT_INTERVAL', 3600):
+            return 0
+        _last_compact = now
+    return compact_notifications()
@@ -0,0 +1,31 @@
+from operator import attrgetter
+from tieba_backend.pagination import KeysetPagination
+
+class MessageKeysetPagination(KeysetPagination):
+    """消息历史游标分页：从最新消息往前翻"""
+    ordering = ('-created_at', '-id')
+
+class NotificationKeysetPagination(KeysetPagination):
+    """通知列表游标分页，从最新往前翻
+
+    (recipient, is_read, created_at) 索引只有在 is_read 取定值时才能按 created_at 顺序扫描。
+    视图通过 keyset_partition = (字段, 取值) 声明未按该字段过滤时，分别按每个取值取前 N 行再归并，
+    每页最多读 N × 取值个数 行，不需要对该用户的全部通知排序。
+    布尔字段用 __in 过滤：SQLite 上 is_read=False 会生成 NOT "is_read"，不能作为索引的等值条件。
+    """
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.partition = getattr(view, 'keyset_partition', None)
+        return super().paginate_queryset(queryset, request, view)
+
+    def fetch(self, queryset, ordering, limit):
+        if not self.partition:
+            return super().fetch(queryset, ordering, limit)
+        field, values = self.partition
+        rows = []
+        for value in values:
+            rows.extend(queryset.filter(**{f'{field}__in': [value]})[:limit])
+        for key in reversed(ordering):
+            rows.sort(key=attrgetter(key.lstrip('-')), reverse=key.startswith('-'))
+        return rows[:limit]
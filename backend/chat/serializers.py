@@ -1,11 +1,31 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock
+from .attachments import store_uploaded_file
+from .models import (
+    Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock, UploadSession
+)
 from users.models import User
 
 class MessageAttachmentSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+    
     class Meta:
         model = MessageAttachment
-        fields = ['id', 'file', 'file_name', 'file_size', 'file_type', 'created_at']
+        fields = ['id', 'file', 'download_url', 'file_name', 'file_size', 'file_type', 'created_at']
+    
+    def get_download_url(self, obj):
+        return reverse('chat:attachment-download', args=[obj.pk])
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'file_name', 'size', 'received', 'mime_type', 'status', 'created_at']
+        read_only_fields = ['received', 'mime_type', 'status']
+    
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('文件不能为空')
+        return value
 
 class PrivateMessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.username', read_only=True)
@@ -27,7 +47,7 @@ class ConversationParticipantSerializer(serializers.ModelSerializer):
         model = ConversationParticipant
         fields = [
             'id', 'user', 'username', 'avatar', 'conversation',
-            'is_muted', 'is_blocked', 'unread_count', 'last_read_at'
+            'is_muted', 'is_blocked', 'unread_count', 'last_read_at', 'last_read_message_id'
         ]
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -49,16 +69,19 @@ class ConversationSerializer(serializers.ModelSerializer):
             'id': participant.user.id,
             'username': participant.user.username,
             'nickname': participant.user.nickname,
-            'avatar': participant.user.avatar or ''
+            'avatar': participant.user.avatar or '',
+            'last_read_message_id': participant.last_read_message_id
         } for participant in participants]
     
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-created_at').first()
-        if last_message:
-            return PrivateMessageSerializer(last_message).data
+        if obj.last_message is not None:
+            return PrivateMessageSerializer(obj.last_message).data
         return None
     
     def get_unread_count(self, obj):
+        # 列表页通过 Prefetch 把当前用户的参与者状态放在 viewer_status 上
+        if hasattr(obj, 'viewer_status'):
+            return obj.viewer_status[0].unread_count if obj.viewer_status else 0
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             participant = obj.participant_status.filter(user=request.user).first()
@@ -66,14 +89,10 @@ class ConversationSerializer(serializers.ModelSerializer):
         return 0
 
 class ConversationDetailSerializer(ConversationSerializer):
-    messages = serializers.SerializerMethodField()
+    """对话详情；消息历史不再内嵌，改由消息列表接口分页获取"""
     
     class Meta(ConversationSerializer.Meta):
-        fields = ConversationSerializer.Meta.fields + ['messages']
-    
-    def get_messages(self, obj):
-        messages = obj.messages.order_by('created_at')
-        return PrivateMessageSerializer(messages, many=True).data
+        fields = ConversationSerializer.Meta.fields
 
 class ConversationCreateSerializer(serializers.ModelSerializer):
     participant_ids = serializers.ListField(
@@ -85,13 +104,31 @@ class ConversationCreateSerializer(serializers.ModelSerializer):
         model = Conversation
         fields = ['title', 'type', 'participant_ids']
     
+    def validate(self, attrs):
+        user_ids = set(attrs['participant_ids'])
+        if attrs.get('type', 'private') == 'private':
+            # 一对一私信必须且只能有一个对方（可以包含自己），统一按用户对唯一键创建
+            user_ids.discard(self.context['request'].user.pk)
+            if len(user_ids) != 1:
+                raise serializers.ValidationError({'participant_ids': '私信只能指定一个对方用户'})
+        users = list(User.objects.filter(id__in=user_ids))
+        if len(users) != len(user_ids):
+            raise serializers.ValidationError({'participant_ids': '用户不存在'})
+        attrs['participants'] = users
+        return attrs
+    
     def create(self, validated_data):
-        participant_ids = validated_data.pop('participant_ids')
+        validated_data.pop('participant_ids')
+        participants = validated_data.pop('participants')
+        if validated_data.get('type', 'private') == 'private':
+            # 一对一私信复用已有对话
+            conversation, _ = Conversation.get_or_create_private(self.context['request'].user, participants[0])
+            return conversation
+        
         conversation = Conversation.objects.create(**validated_data)
         
         # 添加参与者
-        for user_id in participant_ids:
-            user = User.objects.get(id=user_id)
+        for user in participants:
             ConversationParticipant.objects.create(
                 conversation=conversation,
                 user=user
@@ -102,30 +139,51 @@ class ConversationCreateSerializer(serializers.ModelSerializer):
 class PrivateMessageCreateSerializer(serializers.ModelSerializer):
     attachments = serializers.ListField(
         child=serializers.FileField(),
-        required=False
+        required=False,
+        write_only=True
+    )
+    # 分块上传完成后的上传会话 id
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        write_only=True
     )
     
     class Meta:
         model = PrivateMessage
-        fields = ['conversation', 'content', 'type', 'attachments']
+        fields = ['conversation', 'content', 'type', 'attachments', 'upload_ids']
+    
+    def validate_upload_ids(self, value):
+        sessions = {
+            session.pk: session for session in UploadSession.objects.filter(
+                pk__in=value, user=self.context['request'].user, status='complete'
+            ).select_related('stored_file')
+        }
+        if len(sessions) != len(set(value)):
+            raise serializers.ValidationError('上传不存在或尚未完成')
+        return [sessions[pk] for pk in value]
     
     def create(self, validated_data):
-        attachments_data = validated_data.pop('attachments', [])
-        message = PrivateMessage.objects.create(**validated_data)
-        
-        # 保存附件
-        for attachment_data in attachments_data:
-            MessageAttachment.objects.create(message=message, file=attachment_data)
-        
-        # 更新对话的最后消息时间
-        message.conversation.update_last_message()
+        uploaded_files = validated_data.pop('attachments', [])
+        sessions = validated_data.pop('upload_ids', [])
+        files = [(session.stored_file, session.file_name) for session in sessions]
+        files += [(store_uploaded_file(uploaded), uploaded.name) for uploaded in uploaded_files]
         
+        message = PrivateMessage.objects.create(**validated_data)
+        # 附件引用按内容去重的存储文件，不再复制文件
+        MessageAttachment.objects.bulk_create([
+            MessageAttachment(
+                message=message, stored_file=stored, file=stored.file.name,
+                file_name=file_name, file_size=stored.size, file_type=stored.mime_type,
+            )
+            for stored, file_name in files
+        ])
         return message
 
 class SystemNotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = SystemNotification
-        fields = ['id', 'recipient', 'title', 'content', 'type', 'is_read', 'created_at']
+        fields = ['id', 'recipient', 'title', 'content', 'type', 'actor_count', 'is_read', 'created_at']
 
 class UserBlockSerializer(serializers.ModelSerializer):
     blocked_username = serializers.CharField(source='blocked.username', read_only=True)
@@ -133,12 +191,17 @@ class UserBlockSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserBlock
         fields = ['id', 'blocker', 'blocked', 'blocked_username', 'created_at']
+        read_only_fields = ['blocker']
 
 class MarkMessagesAsReadSerializer(serializers.Serializer):
     message_ids = serializers.ListField(
         child=serializers.IntegerField()
     )
 
+class MarkNotificationsAsReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    before = serializers.DateTimeField(required=False)
+
 class SendMessageSerializer(serializers.Serializer):
     recipient_id = serializers.IntegerField()
     content = serializers.CharField()
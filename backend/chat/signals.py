@@ -0,0 +1,69 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from posts.models import PostLike, Reply, ReplyLike
+from tiebas.models import TiebaAnnouncement
+from .blocks import blocked_by_cache
+from .events import publish_notification
+from .fanout import notify, notify_tieba_members
+from .models import SystemNotification, UserBlock
+from .unread import unread_changed
+
+@receiver(post_save, sender=SystemNotification)
+def push_notification(sender, instance, created, raw=False, **kwargs):
+    """新通知实时推送给接收者"""
+    if created and not raw:
+        publish_notification(instance)
+
+@receiver([post_save, post_delete], sender=SystemNotification)
+def invalidate_unread_notifications(sender, instance, raw=False, **kwargs):
+    if not raw:
+        unread_changed([instance.recipient_id])
+
+@receiver([post_save, post_delete], sender=UserBlock)
+def invalidate_blocked_by(sender, instance, **kwargs):
+    """屏蔽关系变化后失效被屏蔽者的 blocked-by 缓存"""
+    blocked_by_cache.invalidate(instance.blocked_id)
+
+@receiver(post_save, sender=TiebaAnnouncement)
+def announce_to_members(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.is_active:
+        notify_tieba_members(
+            instance.tieba, f'【{instance.tieba.name}】{instance.title}', instance.content,
+            related_user_id=instance.author_id,
+        )
+
+@receiver(post_save, sender=PostLike)
+def notify_post_like(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    post = instance.post
+    if post.author_id != instance.user_id:
+        notify(
+            [post.author_id], f'{instance.user} 赞了你的帖子', post.title, type='post_like',
+            group_key=f'post_like:{post.pk}', group_title='{count} 人赞了你的帖子',
+            related_post_id=post.pk, related_user_id=instance.user_id,
+        )
+
+@receiver(post_save, sender=ReplyLike)
+def notify_reply_like(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    reply = instance.reply
+    if reply.author_id != instance.user_id:
+        notify(
+            [reply.author_id], f'{instance.user} 赞了你的回复', reply.content[:100], type='reply_like',
+            group_key=f'reply_like:{reply.pk}', group_title='{count} 人赞了你的回复',
+            related_post_id=reply.post_id, related_reply_id=reply.pk, related_user_id=instance.user_id,
+        )
+
+@receiver(post_save, sender=Reply)
+def notify_post_reply(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    post = instance.post
+    if post.author_id != instance.author_id:
+        notify(
+            [post.author_id], f'{instance.author} 回复了你的帖子', instance.content[:100], type='post_reply',
+            group_key=f'post_reply:{post.pk}', group_title='{count} 人回复了你的帖子',
+            related_post_id=post.pk, related_reply_id=instance.pk, related_user_id=instance.author_id,
+        )
@@ -0,0 +1,708 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import User
+from .models import Conversation, ConversationParticipant, MessageAttachment, PrivateMessage, StoredFile, SystemNotification, UploadSession, UserBlock
+from .attachments import cleanup_uploads, store_uploaded_file
+from .blocks import blocked_by_cache
+from .fanout import notify, process_pending
+from .notifications import compact_notifications
+from .hub import OVERFLOW, DatabaseHub, InMemoryHub, get_hub, user_channel
+from .websocket import ChatSocket
+from .views import ConversationListView
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AttachmentDownloadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='sender', password='x', nickname='sender')
+        self.receiver = User.objects.create_user(username='receiver', password='x', nickname='receiver')
+        self.conversation, _ = Conversation.get_or_create_private(self.sender, self.receiver)
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender)
+
+    def upload(self, name, content):
+        response = self.client.post('/api/chat/uploads/', {'file_name': name, 'size': len(content)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return self.client.put(
+            f"/api/chat/uploads/{response.data['id']}/", content, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{len(content) - 1}/{len(content)}',
+        )
+
+    def download(self, name, content, mime_type):
+        message = PrivateMessage.objects.create(
+            conversation=self.conversation, sender=self.sender, content='附件',
+        )
+        # 绕过上传检查，模拟放开类型限制之前已经存下的文件
+        with override_settings(ATTACHMENT_ALLOWED_TYPES=None):
+            stored = store_uploaded_file(SimpleUploadedFile(name, content))
+        stored.mime_type = mime_type
+        stored.save()
+        attachment = MessageAttachment.objects.create(
+            message=message, stored_file=stored, file=stored.file.name,
+            file_name=name, file_size=stored.size, file_type=mime_type,
+        )
+        return self.client.get(f'/api/chat/attachments/{attachment.pk}/')
+
+    def test_svg_and_html_are_rejected(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"/>'
+        self.assertEqual(self.upload('x.svg', svg).status_code, 400)
+        self.assertEqual(self.upload('x.html', b'<script>alert(1)</script>').status_code, 400)
+        # 扩展名是图片但文件头不是，不按图片处理
+        self.assertEqual(self.upload('x.png', svg).status_code, 400)
+        self.assertEqual(self.upload('x.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 16).status_code, 200)
+
+    def test_only_raster_images_are_inline(self):
+        response = self.download('a.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 16, 'image/png')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+        response = self.download('x.svg', b'<svg onload="alert(1)"/>', 'image/svg+xml')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def upload_in_chunks(self, name, content, chunk_size):
+        response = self.client.post('/api/chat/uploads/', {'file_name': name, 'size': len(content)}, format='json')
+        session_id = response.data['id']
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            response = self.client.put(
+                f'/api/chat/uploads/{session_id}/', chunk, content_type='application/octet-stream',
+                HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}/{len(content)}',
+            )
+            self.assertEqual(response.data, {'received': start + len(chunk)})
+        return session_id
+
+    def test_chunks_are_assembled_in_order(self):
+        content = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+        response = self.client.post('/api/chat/uploads/', {'file_name': 'a.png', 'size': len(content)}, format='json')
+        url = f"/api/chat/uploads/{response.data['id']}/"
+
+        def put(start, end):
+            return self.client.put(
+                url, content[start:end + 1], content_type='application/octet-stream',
+                HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(content)}',
+            )
+
+        self.assertEqual(put(0, 99).data, {'received': 100})
+        # 跳过或重复的分块返回当前偏移量，客户端据此续传
+        for start, end in ((200, 299), (0, 99)):
+            response = put(start, end)
+            self.assertEqual((response.status_code, response.data['received']), (409, 100))
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 409)
+        self.assertEqual(put(100, len(content) - 1).data, {'received': len(content)})
+
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['mime_type']), ('complete', 'image/png'))
+        stored = UploadSession.objects.get(pk=response.data['id']).stored_file
+        with default_storage.open(stored.file.name) as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(stored.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(put(0, 99).status_code, 400)
+
+    def test_same_content_is_stored_once(self):
+        content = b'hello world ' * 100
+        sessions = [self.upload_in_chunks('a.txt', content, 500), self.upload_in_chunks('b.txt', content, 333)]
+        for session_id in sessions:
+            self.assertEqual(self.client.post(f'/api/chat/uploads/{session_id}/complete/').status_code, 200)
+        stored = StoredFile.objects.get()
+        self.assertEqual(
+            set(UploadSession.objects.values_list('stored_file', flat=True)), {stored.pk},
+        )
+        self.assertEqual(store_uploaded_file(SimpleUploadedFile('c.txt', content)).pk, stored.pk)
+        # 临时分块文件已移入存储或删除
+        for session_id in sessions:
+            self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, 'uploads', f'{session_id}.part')))
+
+    def test_range_requests(self):
+        response = self.download('a.txt', b'0123456789', 'text/plain')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        attachment_url = response.wsgi_request.path
+        etag = response['ETag']
+
+        cases = [
+            ('bytes=2-5', b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-3', b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+        ]
+        for header, body, content_range in cases:
+            response = self.client.get(attachment_url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(b''.join(response.streaming_content), body, header)
+            self.assertEqual(response['Content-Range'], content_range, header)
+            self.assertEqual(response['Content-Length'], str(len(body)), header)
+
+        for header in ('bytes=10-', 'bytes=5-2'):
+            response = self.client.get(attachment_url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        # 多区间和 If-Range 不匹配时返回整个文件
+        for extra in ({'HTTP_RANGE': 'bytes=0-1,3-4'}, {'HTTP_RANGE': 'bytes=2-5', 'HTTP_IF_RANGE': '"other"'}):
+            response = self.client.get(attachment_url, **extra)
+            self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b'0123456789'))
+        response = self.client.get(attachment_url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_cleanup_keeps_referenced_and_reused_files(self):
+        old = timezone.now() - timedelta(days=2)
+        orphan = store_uploaded_file(SimpleUploadedFile('a.txt', b'orphan'))
+        reused = store_uploaded_file(SimpleUploadedFile('b.txt', b'reused'))
+        StoredFile.objects.update(last_used_at=old)
+        # 再次存入相同内容会刷新使用时间，清理不会删掉马上要被引用的文件
+        self.assertEqual(store_uploaded_file(SimpleUploadedFile('c.txt', b'reused')).pk, reused.pk)
+        referenced = self.download('d.txt', b'referenced', 'text/plain')
+        StoredFile.objects.filter(sha256=referenced['ETag'].strip('"')).update(last_used_at=old)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _, files = cleanup_uploads()
+        self.assertEqual(files, 1)
+        self.assertFalse(StoredFile.objects.filter(pk=orphan.pk).exists())
+        self.assertFalse(default_storage.exists(orphan.file.name))
+        self.assertEqual(StoredFile.objects.count(), 2)
+        for stored in StoredFile.objects.all():
+            self.assertTrue(default_storage.exists(stored.file.name))
+
+class RecordingHub(InMemoryHub):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channels, event):
+        self.published.append((sorted(channels), event))
+
+@override_settings(NOTIFICATION_FANOUT_MODE='external')
+class NotificationFanoutPushTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'user{index}', password='x', nickname=f'user{index}')
+            for index in range(3)
+        ]
+        self.hub = RecordingHub()
+        patcher = mock.patch('chat.events.get_hub', return_value=self.hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def notifications_pushed(self):
+        return [
+            (channels[0], event['notification'])
+            for channels, event in self.hub.published if event['type'] == 'notification'
+        ]
+
+    def test_each_recipient_receives_notification_event(self):
+        notify([user.pk for user in self.users], '标题', '内容')
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending(chunk_size=2)
+        pushed = self.notifications_pushed()
+        self.assertEqual(sorted(channel for channel, _ in pushed), sorted(user_channel(user.pk) for user in self.users))
+        for channel, notification in pushed:
+            self.assertEqual(channel, user_channel(notification['recipient']))
+            self.assertEqual(notification['title'], '标题')
+            self.assertIsNotNone(notification['id'])
+
+    def test_merged_notification_is_pushed_with_new_title(self):
+        owner, first, second = self.users
+        for actor in (first, second):
+            notify(
+                [owner.pk], f'{actor} 赞了你的帖子', '帖子', type='post_like',
+                group_key='post_like:1', group_title='{count} 人赞了你的帖子', related_user_id=actor.pk,
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                process_pending()
+        titles = [notification['title'] for _, notification in self.notifications_pushed()]
+        self.assertEqual(titles, ['user1 赞了你的帖子', '2 人赞了你的帖子'])
+
+class ConversationListQueryCountTests(TestCase):
+    """对话列表的查询数不随对话数增长"""
+
+    def create_conversations(self, user, count):
+        for index in range(count):
+            other = User.objects.create(username=f'{user.username}_{index}', nickname='other')
+            conversation, _ = Conversation.get_or_create_private(user, other)
+            for sender in (user, other):
+                message = PrivateMessage.objects.create(
+                    conversation=conversation, sender=sender, content=f'{index}:{sender.username}',
+                )
+                conversation.update_last_message(message)
+            conversation.participant_status.filter(user=user).update(unread_count=index)
+
+    def count_queries(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(ConversationListView.pagination_class, 'page_size', 100):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data['results']
+
+    def test_inbox_of_100_conversations(self):
+        few = User.objects.create_user(username='few', password='x', nickname='few')
+        many = User.objects.create_user(username='many', password='x', nickname='many')
+        self.create_conversations(few, 3)
+        self.create_conversations(many, 100)
+        few_queries, _ = self.count_queries(few)
+        many_queries, results = self.count_queries(many)
+        self.assertEqual(len(results), 100)
+        self.assertEqual(many_queries, few_queries)
+        latest = results[0]
+        self.assertEqual(latest['last_message']['content'], '99:many_99')
+        self.assertEqual(latest['unread_count'], 99)
+        self.assertEqual(len(latest['participants']), 2)
+
+class PrivateConversationCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.other = User.objects.create_user(username='other', password='x', nickname='other')
+        self.third = User.objects.create_user(username='third', password='x', nickname='third')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, participant_ids, type='private'):
+        return self.client.post(
+            '/api/chat/conversations/create/', {'type': type, 'participant_ids': participant_ids}, format='json',
+        )
+
+    def test_private_conversation_is_reused(self):
+        for participant_ids in ([self.other.pk], [self.user.pk, self.other.pk], [self.other.pk, self.other.pk]):
+            self.assertEqual(self.create(participant_ids).status_code, 201, participant_ids)
+        conversation = Conversation.objects.get()
+        self.assertEqual(
+            (conversation.min_user_id, conversation.max_user_id), tuple(sorted([self.user.pk, self.other.pk])),
+        )
+        self.assertEqual(conversation.participant_status.count(), 2)
+
+    def test_private_conversation_needs_exactly_one_counterpart(self):
+        for participant_ids in ([], [self.user.pk], [self.other.pk, self.third.pk], [0]):
+            self.assertEqual(self.create(participant_ids).status_code, 400, participant_ids)
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_group_conversation(self):
+        self.assertEqual(self.create([self.other.pk, self.third.pk], type='group').status_code, 201)
+        conversation = Conversation.objects.get()
+        self.assertIsNone(conversation.min_user_id)
+        self.assertEqual(conversation.participant_status.count(), 3)
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.base = timezone.now() - timedelta(hours=1)
+        # 按创建时间从旧到新
+        self.notifications = [self.create(index) for index in range(6)]
+
+    def create(self, index, **fields):
+        notification = SystemNotification.objects.create(
+            recipient=self.user, title=f'通知{index}', content='内容', **fields,
+        )
+        SystemNotification.objects.filter(pk=notification.pk).update(created_at=self.base + timedelta(minutes=index))
+        notification.refresh_from_db()
+        return notification
+
+    def unread(self):
+        return self.client.get('/api/chat/unread-count/').data['unread_notifications']
+
+    def read_ids(self):
+        return set(SystemNotification.objects.filter(is_read=True).values_list('pk', flat=True))
+
+    def mark_read(self, url='/api/chat/notifications/mark-read/', **data):
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['updated']
+
+    def test_mark_read_by_ids_before_and_all(self):
+        first, second, third = self.notifications[:3]
+        self.assertEqual(self.unread(), 6)
+        self.assertEqual(self.mark_read(ids=[first.pk, third.pk]), 2)
+        self.assertEqual(self.read_ids(), {first.pk, third.pk})
+        self.assertEqual(self.unread(), 4)
+
+        # before 包含该时间点本身，已读的不重复计数
+        self.assertEqual(self.mark_read(before=third.created_at.isoformat()), 1)
+        self.assertEqual(self.read_ids(), {first.pk, second.pk, third.pk})
+        self.assertEqual(self.unread(), 3)
+
+        self.assertEqual(self.mark_read('/api/chat/notifications/mark-all-read/'), 3)
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(self.mark_read(), 0)
+
+    def test_other_users_notifications_are_untouched(self):
+        other = User.objects.create(username='other', nickname='other')
+        foreign = SystemNotification.objects.create(recipient=other, title='别人的', content='内容')
+        self.assertEqual(self.mark_read(ids=[foreign.pk]), 0)
+        self.assertEqual(self.mark_read(), 6)
+        foreign.refresh_from_db()
+        self.assertFalse(foreign.is_read)
+
+    def test_soft_delete(self):
+        notification = self.notifications[0]
+        response = self.client.delete(f'/api/chat/notifications/{notification.pk}/')
+        self.assertEqual(response.status_code, 204)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_deleted)
+        self.assertTrue(notification.is_read)
+        self.assertEqual(self.unread(), 5)
+        ids = [row['id'] for row in self.client.get('/api/chat/notifications/').data['results']]
+        self.assertNotIn(notification.pk, ids)
+        self.assertEqual(self.client.get(f'/api/chat/notifications/{notification.pk}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/chat/notifications/{notification.pk}/').status_code, 404)
+
+    @override_settings(NOTIFICATION_RETENTION_DAYS=30)
+    def test_compact_removes_deleted_and_expired_read(self):
+        deleted, expired, old_unread, recent_read = self.notifications[:4]
+        long_ago = timezone.now() - timedelta(days=31)
+        SystemNotification.objects.filter(pk=deleted.pk).update(is_deleted=True, is_read=True)
+        SystemNotification.objects.filter(pk=expired.pk).update(is_read=True, created_at=long_ago)
+        SystemNotification.objects.filter(pk=old_unread.pk).update(created_at=long_ago)
+        SystemNotification.objects.filter(pk=recent_read.pk).update(is_read=True)
+        self.assertEqual(compact_notifications(batch_size=1), 2)
+        remaining = set(SystemNotification.objects.values_list('pk', flat=True))
+        self.assertEqual(remaining, {notification.pk for notification in self.notifications} - {deleted.pk, expired.pk})
+
+    def test_group_key_merges_into_unread_notification(self):
+        first, second = (User.objects.create(username=f'actor{index}', nickname=f'actor{index}') for index in range(2))
+        SystemNotification.objects.all().delete()
+
+        def like(actor):
+            notify(
+                [self.user.pk], f'{actor.nickname} 赞了你的帖子', '帖子', type='post_like',
+                group_key='post_like:1', group_title='{count} 人赞了你的帖子', related_user_id=actor.pk,
+            )
+            process_pending()
+
+        for actor in (first, second, second):
+            like(actor)
+        merged = SystemNotification.objects.get()
+        # 同一个人连续触发不重复计数
+        self.assertEqual((merged.title, merged.actor_count, merged.related_user_id), ('2 人赞了你的帖子', 2, second.pk))
+        self.assertEqual(self.unread(), 1)
+
+        # 已读之后的新动作另起一条
+        self.mark_read()
+        like(first)
+        self.assertEqual(
+            list(SystemNotification.objects.order_by('pk').values_list('title', 'is_read')),
+            [('2 人赞了你的帖子', True), ('actor0 赞了你的帖子', False)],
+        )
+
+    def test_keyset_pages_merge_read_and_unread(self):
+        # 已读、未读交错，最新的在前
+        SystemNotification.objects.filter(pk__in=[n.pk for n in self.notifications[::2]]).update(is_read=True)
+        expected = [notification.pk for notification in reversed(self.notifications)]
+        for unread_only, wanted in ((False, expected), (True, expected[::2])):
+            url, seen = f'/api/chat/notifications/?page_size=2&unread_only={str(unread_only).lower()}', []
+            while url:
+                response = self.client.get(url)
+                self.assertLessEqual(len(response.data['results']), 2)
+                seen += [row['id'] for row in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(seen, wanted, unread_only)
+
+class ConversationHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.other = User.objects.create_user(username='other', password='x', nickname='other')
+        self.conversation, _ = Conversation.get_or_create_private(self.user, self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, content, conversation=None):
+        response = self.client.post('/api/chat/messages/create/', {
+            'conversation': (conversation or self.conversation).pk, 'content': content,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return PrivateMessage.objects.get(conversation=conversation or self.conversation, content=content)
+
+    def messages(self, **params):
+        return self.client.get(f'/api/chat/conversations/{self.conversation.pk}/messages/', params)
+
+    def test_last_message_follows_sends(self):
+        self.send('第一条')
+        latest = self.send('第二条')
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, latest.pk)
+        response = self.client.get(f'/api/chat/conversations/{self.conversation.pk}/')
+        self.assertEqual(response.data['last_message']['content'], '第二条')
+        # 详情不再内嵌消息历史
+        self.assertNotIn('messages', response.data)
+
+    def test_history_is_newest_first_and_since_id_returns_newer(self):
+        sent = [self.send(f'消息{index}') for index in range(4)]
+        self.assertEqual(
+            [row['content'] for row in self.messages().data['results']], ['消息3', '消息2', '消息1', '消息0'],
+        )
+        response = self.messages(since_id=sent[1].pk)
+        self.assertEqual([row['id'] for row in response.data['results']], [sent[3].pk, sent[2].pk])
+        self.assertEqual(self.messages(since_id=sent[3].pk).data['results'], [])
+
+    def test_bad_since_id_is_400(self):
+        other_conversation, _ = Conversation.get_or_create_private(
+            self.user, User.objects.create(username='third', nickname='third'),
+        )
+        foreign = self.send('别的对话', conversation=other_conversation)
+        for since_id in ('abc', '999999', str(foreign.pk)):
+            self.assertEqual(self.messages(since_id=since_id).status_code, 400, since_id)
+
+class BlockEnforcementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user(username='sender', password='x', nickname='sender')
+        self.receiver = User.objects.create_user(username='receiver', password='x', nickname='receiver')
+        self.conversation, _ = Conversation.get_or_create_private(self.sender, self.receiver)
+        self.sender_client = APIClient()
+        self.sender_client.force_authenticate(self.sender)
+        self.receiver_client = APIClient()
+        self.receiver_client.force_authenticate(self.receiver)
+
+    def send(self):
+        by_conversation = self.sender_client.post('/api/chat/messages/create/', {
+            'conversation': self.conversation.pk, 'content': '你好',
+        }, format='json')
+        direct = self.sender_client.post('/api/chat/send/', {
+            'recipient_id': self.receiver.pk, 'content': '你好',
+        }, format='json')
+        return by_conversation.status_code, direct.status_code
+
+    def block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.receiver_client.post('/api/chat/blocks/create/', {'blocked': self.sender.pk}, format='json')
+
+    def test_block_and_unblock_take_effect_immediately(self):
+        # 先发一次，缓存中留下“没有人屏蔽”的集合
+        self.assertEqual(self.send(), (201, 201))
+        self.assertEqual(blocked_by_cache.get(self.sender.pk), frozenset())
+
+        self.assertEqual(self.block().status_code, 201)
+        self.assertEqual(self.send(), (400, 400))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.receiver_client.delete(f'/api/chat/blocks/{self.sender.pk}/delete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.send(), (201, 201))
+
+    def test_blocked_by_set_lives_in_shared_cache(self):
+        UserBlock.objects.create(blocker=self.receiver, blocked=self.sender)
+        cache.clear()
+        self.assertEqual(blocked_by_cache.get(self.sender.pk), {self.receiver.pk})
+        # 其他进程读到的是同一个缓存条目，失效后都会重新读取
+        self.assertEqual(cache.get(f'blocked_by:{self.sender.pk}'), {self.receiver.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            blocked_by_cache.invalidate(self.sender.pk)
+        self.assertIsNone(cache.get(f'blocked_by:{self.sender.pk}'))
+
+    def test_repeated_block_is_400(self):
+        self.assertEqual(self.block().status_code, 201)
+        self.assertEqual(self.block().status_code, 400)
+        self.assertEqual(UserBlock.objects.count(), 1)
+        response = self.sender_client.post('/api/chat/blocks/create/', {'blocked': self.sender.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='x', nickname='reader')
+        self.writer = User.objects.create_user(username='writer', password='x', nickname='writer')
+        self.conversation, _ = Conversation.get_or_create_private(self.reader, self.writer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.messages = [self.send(self.writer, f'消息{index}') for index in range(5)]
+
+    def send(self, sender, content):
+        client = APIClient()
+        client.force_authenticate(sender)
+        response = client.post('/api/chat/messages/create/', {
+            'conversation': self.conversation.pk, 'content': content,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return PrivateMessage.objects.get(content=content)
+
+    def read(self, message=None):
+        data = {} if message is None else {'message_id': message.pk}
+        response = self.client.post(f'/api/chat/conversations/{self.conversation.pk}/read/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        state = ConversationParticipant.objects.get(conversation=self.conversation, user=self.reader)
+        unread = self.client.get('/api/chat/unread-count/').data['unread_messages']
+        self.assertEqual(unread, state.unread_count)
+        return state.last_read_message_id, state.unread_count
+
+    def test_partial_read_leaves_the_rest_unread(self):
+        self.assertEqual(self.read(self.messages[1]), (self.messages[1].pk, 3))
+        # 自己发的消息不计入未读
+        self.send(self.reader, '回复')
+        self.assertEqual(self.read(self.messages[2]), (self.messages[2].pk, 2))
+
+    def test_read_to_latest_clears_unread(self):
+        self.assertEqual(self.read(self.messages[-1]), (self.messages[-1].pk, 0))
+        latest = self.send(self.writer, '新消息')
+        self.assertEqual(self.read(), (latest.pk, 0))
+
+    def test_watermark_never_moves_backwards(self):
+        self.assertEqual(self.read(self.messages[3]), (self.messages[3].pk, 1))
+        self.assertEqual(self.read(self.messages[0]), (self.messages[3].pk, 1))
+        self.assertEqual(self.read(), (self.messages[-1].pk, 0))
+        self.assertEqual(self.read(self.messages[2]), (self.messages[-1].pk, 0))
+
+
+class RealtimeDeliveryTests(TestCase):
+    """数据库操作都在事件循环外完成，循环内只做订阅和收发"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.other = User.objects.create_user(username='other', password='x', nickname='other')
+        self.conversation, _ = Conversation.get_or_create_private(self.user, self.other)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_loop(self, coroutine):
+        return self.loop.run_until_complete(asyncio.wait_for(coroutine, timeout=5))
+
+    def subscribe(self, hub, user):
+        async def subscribe():
+            return hub.subscribe(user_channel(user.pk))
+        return self.run_loop(subscribe())
+
+    def send_message(self, content):
+        """发送私信，返回尚未执行的推送回调"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/chat/messages/create/', {
+                'conversation': self.conversation.pk, 'content': content,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return callbacks
+
+    def test_conversation_message_reaches_chat_socket(self):
+        hub = InMemoryHub()
+        callbacks = self.send_message('你好')
+        frames = []
+        inbox = asyncio.Queue()
+
+        async def send(frame):
+            frames.append(frame)
+
+        async def session():
+            socket = asyncio.ensure_future(ChatSocket()({'user_id': self.other.pk}, inbox.get, send))
+            await inbox.put({'type': 'websocket.connect'})
+            while not hub.subscriber_count():
+                await asyncio.sleep(0)
+            for callback in callbacks:
+                callback()
+            while len(frames) < 2:
+                await asyncio.sleep(0.01)
+            await inbox.put({'type': 'websocket.disconnect'})
+            await socket
+
+        with mock.patch('chat.events.get_hub', return_value=hub), mock.patch('chat.websocket.get_hub', return_value=hub):
+            self.run_loop(session())
+        self.assertEqual(frames[0], {'type': 'websocket.accept'})
+        event = json.loads(frames[1]['text'])
+        self.assertEqual((event['type'], event['conversation']), ('message', self.conversation.pk))
+        self.assertEqual(event['message']['content'], '你好')
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    def test_in_memory_hub_delivers_to_channel_subscribers_only(self):
+        hub = InMemoryHub()
+        mine, others = self.subscribe(hub, self.user), self.subscribe(hub, self.other)
+        hub.publish([user_channel(self.user.pk)], {'type': 'ping'})
+        self.assertEqual(json.loads(self.run_loop(mine.get())), {'type': 'ping'})
+        self.run_loop(asyncio.sleep(0))
+        self.assertTrue(others.queue.empty())
+
+        others.close()
+        self.assertEqual(hub.subscriber_count(), 1)
+
+    @override_settings(REALTIME_QUEUE_SIZE=2)
+    def test_slow_subscriber_overflows(self):
+        hub = InMemoryHub()
+        subscription = self.subscribe(hub, self.user)
+        for index in range(3):
+            hub.publish([user_channel(self.user.pk)], {'type': 'ping', 'index': index})
+        self.assertIs(self.run_loop(subscription.get()), OVERFLOW)
+
+    def test_database_hub_delivers_across_instances(self):
+        publisher, receiver = DatabaseHub(), DatabaseHub()
+        with mock.patch.object(DatabaseHub, '_ensure_poller'):
+            subscription = self.subscribe(receiver, self.other)
+        # 首次轮询只记录起点，之前的事件不补发
+        receiver.poll()
+
+        for callback in self.send_message('跨进程'):
+            with mock.patch('chat.events.get_hub', return_value=publisher):
+                callback()
+        self.assertTrue(receiver.poll())
+        self.assertEqual(receiver.poll(), 0)
+        self.run_loop(asyncio.sleep(0))
+        events = []
+        while not subscription.queue.empty():
+            events.append(json.loads(subscription.queue.get_nowait()))
+        messages = [event for event in events if event['type'] == 'message']
+        self.assertEqual([event['message']['content'] for event in messages], ['跨进程'])
+
+
+class UnreadStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.other = User.objects.create_user(username='other', password='x', nickname='other')
+        conversation, _ = Conversation.get_or_create_private(self.user, self.other)
+        client = APIClient()
+        client.force_authenticate(self.other)
+        client.post('/api/chat/messages/create/', {'conversation': conversation.pk, 'content': '在吗'}, format='json')
+        SystemNotification.objects.create(recipient=self.user, title='标题', content='内容')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def parse(self, chunk):
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n') if ': ' in line)
+        return fields.get('event'), json.loads(fields['data'])
+
+    async def test_first_event_carries_unread_counts(self):
+        response = await self.async_client.get(
+            '/api/chat/unread-count/stream/', headers={'Authorization': f'Bearer {self.token}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            chunk = await asyncio.wait_for(stream.__anext__(), timeout=5)
+            self.assertIn(b'retry: 3000', chunk)
+            self.assertEqual(self.parse(chunk), ('unread', {'unread_messages': 1, 'unread_notifications': 1}))
+
+            # 数值变化后收到 unread 事件才推送新值
+            await SystemNotification.objects.filter(recipient=self.user).aupdate(is_read=True)
+            await asyncio.to_thread(cache.clear)
+            get_hub().publish([user_channel(self.user.pk)], {'type': 'unread'})
+            chunk = await asyncio.wait_for(stream.__anext__(), timeout=5)
+            self.assertEqual(self.parse(chunk), ('unread', {'unread_messages': 1, 'unread_notifications': 0}))
+        finally:
+            await stream.aclose()
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get('/api/chat/unread-count/stream/', {'token': 'invalid'})
+        self.assertEqual(response.status_code, 401)
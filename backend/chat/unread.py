@@ -0,0 +1,59 @@
+"""私信已读状态与每个用户的未读计数
+
+每个参与者记录已读水位 last_read_message_id 和未读数 unread_count：
+发消息时其他参与者未读数 +1，标记已读时推进水位，都是一条 UPDATE，与消息条数无关。
+
+未读私信数（各对话 unread_count 之和）和未读通知数缓存在 Django 缓存中，
+只在缓存缺失时才做聚合；发消息、标记已读、通知增删改时调用 unread_changed 失效缓存，
+并向用户频道发布 {"type": "unread"} 事件，唤醒 SSE 连接和 WebSocket 客户端。
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from .events import participant_ids, publish_message, publish_read_receipt, publish_to_users
+from .models import ConversationParticipant, SystemNotification
+
+def _cache_key(user_id):
+    return f'unread:{user_id}'
+
+def get_unread_counts(user_id):
+    key = _cache_key(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        unread_messages = ConversationParticipant.objects.filter(
+            user_id=user_id
+        ).aggregate(total_unread=Sum('unread_count'))['total_unread'] or 0
+        unread_notifications = SystemNotification.objects.filter(
+            recipient_id=user_id, is_read__in=[False]
+        ).count()
+        counts = {'unread_messages': unread_messages, 'unread_notifications': unread_notifications}
+        cache.set(key, counts, getattr(settings, 'UNREAD_CACHE_TIMEOUT', 300))
+    return counts
+
+def unread_changed(user_ids):
+    """这些用户的未读数可能已变化"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+    publish_to_users(user_ids, {'type': 'unread'})
+
+def deliver_message(message):
+    """消息写入后：更新对话的最后消息和其他参与者的未读数，并实时推送"""
+    message.conversation.update_last_message(message)
+    ConversationParticipant.record_message(message)
+    user_ids = participant_ids(message.conversation_id)
+    publish_message(message, user_ids)
+    unread_changed(set(user_ids) - {message.sender_id})
+
+def mark_conversation_read(conversation_id, user_id, message_id=None):
+    """推进已读水位；有变化时发送已读回执，返回是否有变化"""
+    if not ConversationParticipant.mark_read(conversation_id, user_id, message_id):
+        return False
+    state = ConversationParticipant.objects.filter(
+        conversation_id=conversation_id, user_id=user_id
+    ).values('last_read_message_id', 'last_read_at').get()
+    publish_read_receipt(conversation_id, user_id, state['last_read_message_id'], state['last_read_at'])
+    unread_changed([user_id])
+    return True
@@ -14,15 +14,25 @@ urlpatterns = [
     
     # 消息相关
     path('conversations/<int:pk>/messages/', views.PrivateMessageListView.as_view(), name='message-list'),
+    path('conversations/<int:pk>/read/', views.mark_conversation_as_read, name='conversation-read'),
     path('messages/create/', views.PrivateMessageCreateView.as_view(), name='message-create'),
     path('messages/mark-read/', views.mark_messages_as_read, name='mark-messages-read'),
     
+    # 附件分块上传与下载
+    path('uploads/', views.create_upload, name='upload-create'),
+    path('uploads/<uuid:pk>/', views.UploadSessionView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:pk>/complete/', views.complete_upload, name='upload-complete'),
+    path('attachments/<int:pk>/', views.AttachmentDownloadView.as_view(), name='attachment-download'),
+    
     # 私信发送
     path('send/', views.send_direct_message, name='send-direct-message'),
     
     # 系统通知
     path('notifications/', views.SystemNotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:pk>/', views.SystemNotificationDetailView.as_view(), name='notification-detail'),
+    path('notifications/<int:pk>/read/', views.mark_notification_as_read, name='notification-read'),
+    path('notifications/mark-read/', views.mark_notifications_as_read, name='mark-notifications-read'),
+    path('notifications/mark-all-read/', views.mark_notifications_as_read, name='mark-all-notifications-read'),
     
     # 用户屏蔽
     path('blocks/', views.UserBlockListView.as_view(), name='block-list'),
@@ -31,4 +41,5 @@ urlpatterns = [
     
     # 未读数量
     path('unread-count/', views.unread_count, name='unread-count'),
+    path('unread-count/stream/', views.unread_count_stream, name='unread-count-stream'),
 ]
\ No newline at end of file
@@ -1,15 +1,35 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db.models import Q, Sum
+from rest_framework.views import APIView
+from django.conf import settings
+from django.db.models import Max, Prefetch, Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock
+from .models import (
+    Conversation, PrivateMessage, MessageAttachment, ConversationParticipant, SystemNotification, UserBlock, UploadSession
+)
 from .serializers import (
     ConversationSerializer, ConversationDetailSerializer, ConversationCreateSerializer,
     PrivateMessageSerializer, PrivateMessageCreateSerializer, SystemNotificationSerializer,
-    UserBlockSerializer, MarkMessagesAsReadSerializer, SendMessageSerializer
+    UserBlockSerializer, MarkMessagesAsReadSerializer, MarkNotificationsAsReadSerializer, SendMessageSerializer,
+    UploadSessionSerializer
+)
+from .pagination import MessageKeysetPagination, NotificationKeysetPagination
+from .attachments import (
+    OffsetMismatch, QueryTokenAuthentication, attachment_response, complete_session, create_session, write_chunk
 )
+from .blocks import is_blocked_by, is_blocked_in_conversation
+from .hub import OVERFLOW, encode_event, get_hub, user_channel
+from .notifications import delete_notifications, mark_notifications_read
+from .unread import deliver_message, get_unread_counts, mark_conversation_read
+from .websocket import authenticate_token
 from users.models import User
+from tieba_backend.relations import add_relation
 
 class ConversationListView(generics.ListAPIView):
     """获取对话列表"""
@@ -17,10 +37,19 @@ class ConversationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        # 获取用户参与的所有对话
+        # 获取用户参与的所有对话；最后一条消息走反规范化指针，
+        # 参与者和当前用户的未读状态各一次预取，查询数不随对话数增长
         return Conversation.objects.filter(
             participant_status__user=self.request.user
-        ).prefetch_related('participants', 'participant_status', 'participant_status__user').order_by('-last_message_at')
+        ).select_related('last_message__sender').prefetch_related(
+            'last_message__attachments',
+            Prefetch('participant_status', queryset=ConversationParticipant.objects.select_related('user')),
+            Prefetch(
+                'participant_status',
+                queryset=ConversationParticipant.objects.filter(user=self.request.user),
+                to_attr='viewer_status',
+            ),
+        ).order_by('-last_message_at', '-id')
 
 class ConversationDetailView(generics.RetrieveAPIView):
     """获取对话详情"""
@@ -29,14 +58,16 @@ class ConversationDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         # 只能获取用户参与的对话
-        return Conversation.objects.filter(participants__user=self.request.user)
+        return Conversation.objects.filter(
+            participant_status__user=self.request.user
+        ).select_related('last_message__sender').prefetch_related(
+            Prefetch('participant_status', queryset=ConversationParticipant.objects.select_related('user')),
+        )
     
     def get(self, request, *args, **kwargs):
         # 标记对话为已读
         conversation = self.get_object()
-        participant = conversation.participants.filter(user=request.user).first()
-        if participant:
-            participant.mark_as_read()
+        mark_conversation_read(conversation.pk, request.user.pk)
         
         return super().get(request, *args, **kwargs)
 
@@ -48,24 +79,39 @@ class ConversationCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         conversation = serializer.save()
-        # 添加当前用户为参与者
-        ConversationParticipant.objects.create(
+        # 添加当前用户为参与者（一对一私信创建时已包含）
+        ConversationParticipant.objects.get_or_create(
             conversation=conversation,
             user=self.request.user
         )
 
 class PrivateMessageListView(generics.ListAPIView):
-    """获取对话的消息列表"""
+    """获取对话的消息列表
+
+    从最新消息往前按游标分页；带 since_id 时只返回该消息之后的新消息，用于增量同步。
+    """
     serializer_class = PrivateMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageKeysetPagination
     
     def get_queryset(self):
         conversation = get_object_or_404(Conversation, id=self.kwargs['pk'])
         # 检查用户是否参与该对话
-        if not conversation.participants.filter(user=self.request.user).exists():
+        if not conversation.participant_status.filter(user=self.request.user).exists():
             return PrivateMessage.objects.none()
         
-        return PrivateMessage.objects.filter(conversation=conversation).order_by('created_at')
+        queryset = PrivateMessage.objects.filter(conversation=conversation)
+        
+        since_id = self.request.query_params.get('since_id')
+        if since_id:
+            since = queryset.filter(pk=since_id).values_list('created_at', 'id').first() if since_id.isdigit() else None
+            if since is None:
+                raise ValidationError({'since_id': '无效的消息ID'})
+            queryset = queryset.filter(
+                Q(created_at__gt=since[0]) | Q(created_at=since[0], id__gt=since[1])
+            )
+        
+        return queryset.select_related('sender').prefetch_related('attachments').order_by('-created_at', '-id')
 
 class PrivateMessageCreateView(generics.CreateAPIView):
     """发送消息"""
@@ -76,38 +122,104 @@ class PrivateMessageCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         conversation = serializer.validated_data['conversation']
         # 检查用户是否参与该对话
-        if not conversation.participants.filter(user=self.request.user).exists():
-            raise serializers.ValidationError("您不是该对话的参与者")
+        if not conversation.participant_status.filter(user=self.request.user).exists():
+            raise ValidationError("您不是该对话的参与者")
         
         # 检查是否被对方屏蔽
-        for participant in conversation.participants.exclude(user=self.request.user):
-            if UserBlock.objects.filter(blocker=participant.user, blocked=self.request.user).exists():
-                raise serializers.ValidationError("您已被对方屏蔽，无法发送消息")
+        if is_blocked_in_conversation(conversation.pk, self.request.user.pk):
+            raise ValidationError("您已被对方屏蔽，无法发送消息")
         
-        serializer.save(sender=self.request.user)
+        message = serializer.save(sender=self.request.user)
+        deliver_message(message)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_upload(request):
+    """创建分块上传会话：file_name、size"""
+    serializer = UploadSessionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    session = create_session(request.user, serializer.validated_data['file_name'], serializer.validated_data['size'])
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+class UploadSessionView(APIView):
+    """GET 查询上传进度；PUT 上传一个分块（请求头 Content-Range，请求体为原始字节）"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_session(self, request, pk):
+        return get_object_or_404(UploadSession, pk=pk, user=request.user)
+    
+    def get(self, request, pk):
+        return Response(UploadSessionSerializer(self.get_session(request, pk)).data)
+    
+    def put(self, request, pk):
+        session = self.get_session(request, pk)
+        try:
+            received = write_chunk(session, request.stream, request.headers.get('Content-Range'))
+        except OffsetMismatch as exc:
+            return Response({'error': '分块偏移量不符', 'received': exc.received}, status=status.HTTP_409_CONFLICT)
+        return Response({'received': received})
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_upload(request, pk):
+    """结束上传：计算哈希并存储，相同内容只存一份"""
+    session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+    try:
+        complete_session(session)
+    except OffsetMismatch as exc:
+        return Response({'error': '文件尚未上传完', 'received': exc.received}, status=status.HTTP_409_CONFLICT)
+    return Response(UploadSessionSerializer(session).data)
+
+class AttachmentDownloadView(APIView):
+    """下载附件（对话参与者可见），支持 Range"""
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [QueryTokenAuthentication, *APIView.authentication_classes]
+    
+    def get(self, request, pk):
+        attachment = get_object_or_404(
+            MessageAttachment.objects.select_related('stored_file'),
+            pk=pk, message__conversation__participant_status__user=request.user,
+        )
+        return attachment_response(request, attachment)
 
 class SystemNotificationListView(generics.ListAPIView):
-    """获取系统通知列表"""
+    """获取系统通知列表：从最新往前游标分页，unread_only=true 时只返回未读"""
     serializer_class = SystemNotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationKeysetPagination
+    
+    @property
+    def unread_only(self):
+        return self.request.query_params.get('unread_only') in ('true', '1')
+    
+    @property
+    def keyset_partition(self):
+        # 未读、已读分别沿索引取数后归并
+        return None if self.unread_only else ('is_read', (False, True))
     
     def get_queryset(self):
-        return SystemNotification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        queryset = SystemNotification.objects.filter(recipient=self.request.user, is_deleted=False)
+        if self.unread_only:
+            queryset = queryset.filter(is_read__in=[False])
+        return queryset.order_by('-created_at', '-id')
 
-class SystemNotificationDetailView(generics.RetrieveAPIView):
-    """获取系统通知详情"""
+class SystemNotificationDetailView(generics.RetrieveDestroyAPIView):
+    """获取系统通知详情（同时标记为已读）或删除通知"""
     serializer_class = SystemNotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return SystemNotification.objects.filter(recipient=self.request.user)
+        return SystemNotification.objects.filter(recipient=self.request.user, is_deleted=False)
     
-    def get(self, request, *args, **kwargs):
-        # 标记通知为已读
+    def retrieve(self, request, *args, **kwargs):
         notification = self.get_object()
-        notification.mark_as_read()
-        
-        return super().get(request, *args, **kwargs)
+        if not notification.is_read:
+            mark_notifications_read(request.user.pk, ids=[notification.pk])
+            notification.is_read = True
+        return Response(self.get_serializer(notification).data)
+    
+    def perform_destroy(self, instance):
+        delete_notifications(self.request.user.pk, [instance.pk])
 
 class UserBlockListView(generics.ListAPIView):
     """获取用户屏蔽列表"""
@@ -126,15 +238,15 @@ class UserBlockCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         blocked_user = serializer.validated_data['blocked']
         
-        # 检查是否已经屏蔽
-        if UserBlock.objects.filter(blocker=self.request.user, blocked=blocked_user).exists():
-            raise serializers.ValidationError("已经屏蔽该用户")
-        
         # 不能屏蔽自己
         if blocked_user == self.request.user:
-            raise serializers.ValidationError("不能屏蔽自己")
+            raise ValidationError("不能屏蔽自己")
         
-        serializer.save(blocker=self.request.user)
+        # 一条 INSERT ... ON CONFLICT DO NOTHING，并发的重复屏蔽不会撞上唯一约束
+        block = add_relation(UserBlock, blocker=self.request.user, blocked=blocked_user)
+        if block is None:
+            raise ValidationError("已经屏蔽该用户")
+        serializer.instance = block
 
 class UserBlockDeleteView(generics.DestroyAPIView):
     """取消屏蔽用户"""
@@ -150,22 +262,58 @@ class UserBlockDeleteView(generics.DestroyAPIView):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_messages_as_read(request):
-    """标记消息为已读"""
+    """标记消息为已读：每个对话把已读水位推进到所给消息中最新的一条"""
     serializer = MarkMessagesAsReadSerializer(data=request.data)
     if serializer.is_valid():
         message_ids = serializer.validated_data['message_ids']
-        messages = PrivateMessage.objects.filter(
+        latest = PrivateMessage.objects.filter(
             id__in=message_ids,
-            conversation__participants__user=request.user
-        )
+            conversation__participant_status__user=request.user
+        ).order_by().values('conversation_id').annotate(last_id=Max('id'))
         
-        for message in messages:
-            message.mark_as_read(request.user)
+        for row in latest:
+            mark_conversation_read(row['conversation_id'], request.user.pk, row['last_id'])
         
         return Response({'message': '标记成功'}, status=status.HTTP_200_OK)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_conversation_as_read(request, pk):
+    """标记对话为已读；可传 message_id 只读到该消息为止"""
+    conversation = get_object_or_404(Conversation, pk=pk, participant_status__user=request.user)
+    message_id = request.data.get('message_id')
+    if message_id is not None:
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            return Response({'error': '无效的消息ID'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    mark_conversation_read(conversation.pk, request.user.pk, message_id)
+    return Response({'message': '标记成功'}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notifications_as_read(request):
+    """批量标记通知为已读：ids 指定通知，before 指定该时间及之前的全部通知，都不传则全部标记"""
+    serializer = MarkNotificationsAsReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    updated = mark_notifications_read(
+        request.user.pk,
+        ids=serializer.validated_data.get('ids'),
+        before=serializer.validated_data.get('before'),
+    )
+    return Response({'message': '标记成功', 'updated': updated}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notification_as_read(request, pk):
+    """标记单条通知为已读"""
+    get_object_or_404(SystemNotification, pk=pk, recipient=request.user, is_deleted=False)
+    mark_notifications_read(request.user.pk, ids=[pk])
+    return Response({'message': '标记成功'}, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def send_direct_message(request):
@@ -177,22 +325,11 @@ def send_direct_message(request):
         message_type = serializer.validated_data['type']
         
         # 检查是否被对方屏蔽
-        if UserBlock.objects.filter(blocker=recipient, blocked=request.user).exists():
+        if is_blocked_by(request.user.pk, recipient.pk):
             return Response({'error': '您已被对方屏蔽，无法发送消息'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 查找或创建对话
-        conversation = Conversation.objects.filter(
-            type='private',
-            participant_status__user=request.user
-        ).filter(
-            participant_status__user=recipient
-        ).distinct().first()
-        
-        if not conversation:
-            # 创建新的私信对话
-            conversation = Conversation.objects.create(type='private')
-            ConversationParticipant.objects.create(conversation=conversation, user=request.user)
-            ConversationParticipant.objects.create(conversation=conversation, user=recipient)
+        # 按用户对查找或创建对话
+        conversation, _ = Conversation.get_or_create_private(request.user, recipient)
         
         # 发送消息
         message = PrivateMessage.objects.create(
@@ -202,8 +339,8 @@ def send_direct_message(request):
             type=message_type
         )
         
-        # 更新对话的最后消息时间
-        conversation.update_last_message()
+        # 更新对话的最后消息和未读数，并实时推送
+        deliver_message(message)
         
         return Response(PrivateMessageSerializer(message).data, status=status.HTTP_201_CREATED)
     
@@ -213,17 +350,47 @@ def send_direct_message(request):
 @permission_classes([permissions.IsAuthenticated])
 def unread_count(request):
     """获取未读消息和通知数量"""
-    # 未读私信数量 - 通过ConversationParticipant模型获取
-    unread_messages = ConversationParticipant.objects.filter(
-        user=request.user
-    ).aggregate(total_unread=Sum('unread_count'))
-    
-    # 未读系统通知数量
-    unread_notifications = SystemNotification.objects.filter(
-        recipient=request.user, is_read=False
-    ).count()
-    
-    return Response({
-        'unread_messages': unread_messages['total_unread'] or 0,
-        'unread_notifications': unread_notifications
-    })
\ No newline at end of file
+    return Response(get_unread_counts(request.user.pk))
+
+async def unread_count_stream(request):
+    """以 Server-Sent Events 推送未读数量（需要 ASGI 部署）
+
+    连接建立时先推送一次当前值，之后只在收到该用户的 unread 事件且数值变化时推送；
+    EventSource 无法设置请求头，access token 也可以放在查询参数 token 中。
+    """
+    token = request.GET.get('token')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    user_id = await sync_to_async(authenticate_token)(token) if token else None
+    if user_id is None:
+        return JsonResponse({'detail': '身份认证信息未提供或已失效'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    heartbeat_interval = getattr(settings, 'REALTIME_HEARTBEAT_INTERVAL', 25)
+    
+    async def stream():
+        subscription = get_hub().subscribe(user_channel(user_id))
+        try:
+            counts = await sync_to_async(get_unread_counts)(user_id)
+            yield f'retry: 3000\nevent: unread\ndata: {encode_event(counts)}\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.get(), timeout=heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                if payload is OVERFLOW:
+                    return
+                if json.loads(payload).get('type') != 'unread':
+                    continue
+                latest = await sync_to_async(get_unread_counts)(user_id)
+                if latest != counts:
+                    counts = latest
+                    yield f'event: unread\ndata: {encode_event(counts)}\n\n'
+        finally:
+            subscription.close()
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,117 @@
+"""私信实时推送的 WebSocket 端点（ASGI）
+
+连接地址 /ws/chat/?token=<access token>。连接建立后订阅当前用户的频道，
+服务端推送 chat.events 中定义的事件，不接收业务消息：
+- 客户端可发送 {"type": "ping"}，服务端回复 {"type": "pong"}
+- 服务端空闲 REALTIME_HEARTBEAT_INTERVAL 秒后发送 {"type": "ping"}，客户端需回复任意数据，
+  发出 ping 后 REALTIME_HEARTBEAT_TIMEOUT 秒内没有收到回复即断开
+- 推送队列溢出（客户端消费太慢）时以 4008 关闭，客户端重连后自行补齐
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .hub import OVERFLOW, encode_event, get_hub, user_channel
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_OVERFLOW = 4008
+CLOSE_TIMEOUT = 4408
+
+PING = encode_event({'type': 'ping'})
+PONG = encode_event({'type': 'pong'})
+
+def authenticate_token(token):
+    """校验 access token，返回有效用户的 id"""
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user.pk
+
+class JWTAuthMiddleware:
+    """从查询参数 token 认证用户，结果放在 scope['user_id']（未认证为 None）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        token = query.get('token', [None])[0]
+        user_id = await sync_to_async(authenticate_token)(token) if token else None
+        return await self.app(dict(scope, user_id=user_id), receive, send)
+
+class ChatSocket:
+    """每个连接：读协程处理客户端帧，写协程负责推送事件和心跳，任一结束即关闭连接"""
+
+    @property
+    def heartbeat_interval(self):
+        return getattr(settings, 'REALTIME_HEARTBEAT_INTERVAL', 25)
+
+    @property
+    def heartbeat_timeout(self):
+        return getattr(settings, 'REALTIME_HEARTBEAT_TIMEOUT', 60)
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        user_id = scope.get('user_id')
+        if user_id is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+
+        await send({'type': 'websocket.accept'})
+        subscription = get_hub().subscribe(user_channel(user_id))
+        state = {'last_seen': time.monotonic()}
+        reader = asyncio.ensure_future(self.read(receive, subscription, state))
+        writer = asyncio.ensure_future(self.write(send, subscription, state))
+        try:
+            await asyncio.wait([reader, writer], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            subscription.close()
+            for task in (reader, writer):
+                task.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+
+    async def read(self, receive, subscription, state):
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message['type'] != 'websocket.receive':
+                continue
+            state['last_seen'] = time.monotonic()
+            try:
+                data = json.loads(message.get('text') or '{}')
+            except ValueError:
+                continue
+            if isinstance(data, dict) and data.get('type') == 'ping':
+                subscription.deliver(PONG)
+
+    async def write(self, send, subscription, state):
+        while True:
+            try:
+                payload = await asyncio.wait_for(subscription.get(), timeout=self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                now = time.monotonic()
+                ping_sent_at = state.get('ping_sent_at')
+                if ping_sent_at is not None and state['last_seen'] < ping_sent_at:
+                    if now - ping_sent_at >= self.heartbeat_timeout:
+                        await send({'type': 'websocket.close', 'code': CLOSE_TIMEOUT})
+                        return
+                    continue
+                state['ping_sent_at'] = now
+                payload = PING
+            if payload is OVERFLOW:
+                await send({'type': 'websocket.close', 'code': CLOSE_OVERFLOW})
+                return
+            await send({'type': 'websocket.send', 'text': payload})
+
+def websocket_application():
+    return JWTAuthMiddleware(ChatSocket())
@@ -0,0 +1,8 @@
+from tieba_backend.counters import Counter
+from .models import Post, Reply, PostLike, ReplyLike, PostFavorite
+
+post_like_count = Counter(PostLike, 'post', 'like_count')
+post_favorite_count = Counter(PostFavorite, 'post', 'favorite_count')
+post_reply_count = Counter(Reply, 'post', 'reply_count')
+reply_like_count = Counter(ReplyLike, 'reply', 'like_count')
+tieba_post_count = Counter(Post, 'tieba', 'post_count')
\ No newline at end of file
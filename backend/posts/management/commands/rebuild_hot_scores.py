@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from posts.ranking import hot_ranking
+
+class Command(BaseCommand):
+    help = '按当前计数列全量重算帖子热度分'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批重算的行数')
+    
+    def handle(self, *args, **options):
+        fixed = hot_ranking.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'热度重算完成，修改 {fixed} 行'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from tieba_backend.counters import Counter
+
+class Command(BaseCommand):
+    help = '按实际数据批量校正帖子、回复、贴吧的计数列'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批校正的行数')
+    
+    def handle(self, *args, **options):
+        for counter in Counter.registry:
+            fixed = counter.reconcile(batch_size=options['batch_size'])
+            self.stdout.write(f'{counter}: 修正 {fixed} 行')
+        self.stdout.write(self.style.SUCCESS('计数校正完成'))
\ No newline at end of file
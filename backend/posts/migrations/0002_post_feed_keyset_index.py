@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['tieba', 'status', '-is_pinned', '-published_at', '-id'], name='posts_post_tieba_i_82ec8d_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+def backfill_floors(apps, schema_editor):
+    """为已有回复重排重复楼层，并回填 Post.last_floor"""
+    Post = apps.get_model('posts', 'Post')
+    Reply = apps.get_model('posts', 'Reply')
+    duplicated = (
+        Reply.objects.values('post_id', 'floor').order_by()
+        .annotate(n=models.Count('id')).filter(n__gt=1)
+        .values_list('post_id', flat=True).distinct()
+    )
+    for post_id in set(duplicated):
+        replies = Reply.objects.filter(post_id=post_id).order_by('floor', 'created_at', 'id')
+        for floor, reply in enumerate(replies, start=1):
+            if reply.floor != floor:
+                Reply.objects.filter(pk=reply.pk).update(floor=floor)
+
+    last_floor = models.Subquery(
+        Reply.objects.filter(post_id=models.OuterRef('pk')).order_by()
+        .values('post_id').annotate(m=models.Max('floor')).values('m')
+    )
+    Post.objects.update(last_floor=models.functions.Coalesce(last_floor, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_post_feed_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='last_floor',
+            field=models.IntegerField(default=0, verbose_name='最大楼层'),
+        ),
+        migrations.RunPython(backfill_floors, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reply',
+            constraint=models.UniqueConstraint(fields=('post', 'floor'), name='unique_reply_floor'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_last_floor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, verbose_name='热度'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['tieba', 'status', '-hot_score', '-id'], name='posts_post_tieba_i_ba1e29_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-hot_score', '-id'], name='posts_post_status_988ae1_idx'),
+        ),
+    ]
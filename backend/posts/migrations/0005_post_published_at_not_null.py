@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+def backfill_published_at(apps, schema_editor):
+    """已发布但没有发布时间的帖子按创建时间回填"""
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(status='published', published_at__isnull=True).update(published_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_hot_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_published_at, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.CheckConstraint(
+                check=models.Q(('status', 'published'), _negated=True) | models.Q(('published_at__isnull', False)),
+                name='published_post_has_published_at',
+            ),
+        ),
+    ]
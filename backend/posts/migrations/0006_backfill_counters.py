@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# (source 模型, 外键, target 计数列)，与 posts/counters.py 中注册的计数器一致
+COUNTERS = [
+    ('posts.PostLike', 'post', 'like_count'),
+    ('posts.PostFavorite', 'post', 'favorite_count'),
+    ('posts.Reply', 'post', 'reply_count'),
+    ('posts.ReplyLike', 'reply', 'like_count'),
+    ('posts.Post', 'tieba', 'post_count'),
+]
+
+
+def backfill_counters(apps, schema_editor):
+    """按关联表回填计数列，之前只由注解统计，已有数据的计数列都是 0"""
+    for label, fk_name, target_field in COUNTERS:
+        source = apps.get_model(label)
+        target = source._meta.get_field(fk_name).related_model
+        counts = source.objects.filter(
+            **{fk_name: OuterRef('pk')}
+        ).order_by().values(fk_name).annotate(n=Count('pk')).values('n')
+        target.objects.update(**{target_field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_published_at_not_null'),
+        ('tiebas', '0003_member_experience_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
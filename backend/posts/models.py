@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from tiebas.models import Tieba
 
@@ -38,6 +39,8 @@ class Post(models.Model):
     reply_count = models.IntegerField(default=0, verbose_name='回复数')
     like_count = models.IntegerField(default=0, verbose_name='点赞数')
     favorite_count = models.IntegerField(default=0, verbose_name='收藏数')
+    last_floor = models.IntegerField(default=0, verbose_name='最大楼层')
+    hot_score = models.FloatField(default=0, verbose_name='热度')
     
     # 帖子设置
     is_pinned = models.BooleanField(default=False, verbose_name='是否置顶')
@@ -57,15 +60,48 @@ class Post(models.Model):
         indexes = [
             models.Index(fields=['tieba', 'status', 'created_at']),
             models.Index(fields=['author', 'status', 'created_at']),
+            models.Index(fields=['tieba', 'status', '-is_pinned', '-published_at', '-id']),
+            models.Index(fields=['tieba', 'status', '-hot_score', '-id']),
+            models.Index(fields=['status', '-hot_score', '-id']),
         ]
+        constraints = [
+            # 帖子列表按 published_at 做游标分页，NULL 不满足任何比较条件，翻页会漏掉这些帖子
+            models.CheckConstraint(
+                check=~models.Q(status='published') | models.Q(published_at__isnull=False),
+                name='published_post_has_published_at',
+            ),
+        ]
+    
+    # 影响热度分或榜单归属的字段：只有它们变化时才需要重算热度（见 posts.signals.rank_post）
+    RANKING_FIELDS = ('status', 'tieba', 'published_at', 'view_count', 'like_count', 'reply_count', 'favorite_count')
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_ranking_values = instance.ranking_values()
+        return instance
+    
+    def ranking_values(self):
+        """RANKING_FIELDS 的当前值；延迟加载的字段记为 None，不触发查询"""
+        return tuple(self.__dict__.get(self._meta.get_field(name).attname) for name in self.RANKING_FIELDS)
+    
     def save(self, *args, **kwargs):
         if self.status == 'published' and not self.published_at:
-            self.published_at = models.DateTimeField(auto_now_add=True)
+            self.published_at = timezone.now()
         super().save(*args, **kwargs)
+    
+    @classmethod
+    def allocate_floor(cls, post_id):
+        """原子地分配下一个楼层号，需在事务内调用
+
+        UPDATE 持有该帖子行的写锁直到事务结束，并发回复会排队拿到连续楼层；
+        事务回滚时楼层号一并回滚，不会留下空洞。
+        """
+        cls.objects.filter(pk=post_id).update(last_floor=models.F('last_floor') + 1)
+        return cls.objects.filter(pk=post_id).values_list('last_floor', flat=True).get()
 
 class PostImage(models.Model):
     """帖子图片"""
@@ -123,15 +159,20 @@ class Reply(models.Model):
             models.Index(fields=['post', 'status', 'created_at']),
             models.Index(fields=['author', 'status', 'created_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'floor'], name='unique_reply_floor'),
+        ]
     
     def __str__(self):
         return f"{self.post.title} - 回复{self.floor}"
     
     def save(self, *args, **kwargs):
         if not self.floor:
-            # 自动计算楼层
-            last_reply = Reply.objects.filter(post=self.post).order_by('-floor').first()
-            self.floor = last_reply.floor + 1 if last_reply else 1
+            # 自动分配楼层：楼层号与回复写入在同一事务内
+            with transaction.atomic():
+                self.floor = Post.allocate_floor(self.post_id)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
 class ReplyImage(models.Model):
@@ -0,0 +1,47 @@
+from tieba_backend.pagination import KeysetPagination
+
+class PostKeysetPagination(KeysetPagination):
+    """帖子列表游标分页：默认置顶优先，再按发布时间倒序
+
+    sort=hot 时视图提供 hot_leaderboard，落在榜单覆盖范围内的页直接按主键取帖子。
+    """
+    ordering = ('-is_pinned', '-published_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        leaderboard = getattr(view, 'hot_leaderboard', None)
+        if leaderboard is not None and self.page_number_class.page_query_param not in request.query_params:
+            results = self.paginate_leaderboard(leaderboard, queryset, request, view)
+            if results is not None:
+                return results
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_leaderboard(self, leaderboard, queryset, request, view):
+        self.request = request
+        self.ordering = tuple(view.keyset_ordering)
+        self.page_number_paginator = None
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request, queryset)
+
+        if reverse:
+            ids = leaderboard.page_before(position, self.page_size + 1)
+        else:
+            ids = leaderboard.page_after(position, self.page_size + 1)
+        if ids is None:
+            return None
+
+        has_more = len(ids) > self.page_size
+        ids = ids[-self.page_size:] if reverse else ids[:self.page_size]
+        posts = queryset.order_by().in_bulk(ids)
+        results = [posts[post_id] for post_id in ids if post_id in posts]
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+class ReplyKeysetPagination(KeysetPagination):
+    """回复列表游标分页：按楼层正序"""
+    ordering = ('floor', 'id')
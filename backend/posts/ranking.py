@@ -0,0 +1,175 @@
+"""帖子热度排行
+
+热度分采用“对数权重 + 发布时间”的形式：
+    hot_score = log2(1 + Σ 互动数 × 权重) + (发布时间 - EPOCH) / HOT_SCORE_HALF_LIFE
+晚发布 HOT_SCORE_HALF_LIFE 秒的帖子只需一半的互动量就能与之持平，相当于按半衰期衰减；
+而分数本身不随时间变化，无需定时全表重算，只在点赞/收藏/回复/浏览事件后按计数列重算该帖子。
+
+hot_score 列配合 (tieba, status, -hot_score, -id) 索引即可做 sort=hot 的游标分页；
+此外每个进程为全站和每个贴吧各维护一份前 HOT_RANKING_SIZE 名的有序榜单，
+榜单覆盖范围内的分页直接按主键取帖子，不再查询排序索引。
+"""
+
+import bisect
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from .models import Post
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+DEFAULT_WEIGHTS = {'view': 0.1, 'like': 1.0, 'reply': 2.0, 'favorite': 3.0}
+
+# 榜单键为 (-hot_score, -id)，升序即热度降序
+_UNBOUNDED = (math.inf, math.inf)
+
+def compute_hot_score(view_count, like_count, reply_count, favorite_count, published_at):
+    weights = {**DEFAULT_WEIGHTS, **getattr(settings, 'HOT_SCORE_WEIGHTS', {})}
+    weighted = (view_count * weights['view'] + like_count * weights['like']
+                + reply_count * weights['reply'] + favorite_count * weights['favorite'])
+    half_life = getattr(settings, 'HOT_SCORE_HALF_LIFE', 12 * 3600)
+    age = (published_at - EPOCH).total_seconds() if published_at else 0
+    return round(math.log2(1 + max(weighted, 0)) + age / half_life, 9)
+
+class Leaderboard:
+    """热度前 N 名的有序列表
+
+    不变式：热度高于 boundary 的已发布帖子都在榜单里。
+    榜单未满时 boundary 为无穷，表示覆盖了全部帖子；
+    榜单中的帖子热度跌出 boundary 后直接移除，超出容量时淘汰末尾并收紧 boundary。
+    """
+
+    def __init__(self, size, rows):
+        self.size = size
+        self.keys = sorted((-score, -post_id) for post_id, score in rows)
+        self.scores = {post_id: score for post_id, score in rows}
+        self.boundary = self.keys[-1] if len(self.keys) >= size else _UNBOUNDED
+        self.loaded_at = time.monotonic()
+
+    def update(self, post_id, score):
+        self.discard(post_id)
+        if score is None:
+            return
+        key = (-score, -post_id)
+        if key >= self.boundary:
+            return
+        bisect.insort(self.keys, key)
+        self.scores[post_id] = score
+        if len(self.keys) > self.size:
+            evicted = self.keys.pop()
+            del self.scores[-evicted[1]]
+            self.boundary = evicted
+
+    def discard(self, post_id):
+        score = self.scores.pop(post_id, None)
+        if score is not None:
+            index = bisect.bisect_left(self.keys, (-score, -post_id))
+            del self.keys[index]
+
+    def page_after(self, position, count):
+        """返回排在 position（(score, id)，None 表示开头）之后的 count 个帖子 id；超出覆盖范围返回 None"""
+        start = 0
+        if position is not None:
+            key = (-position[0], -position[1])
+            if key >= self.boundary:
+                return None
+            start = bisect.bisect_right(self.keys, key)
+        keys = self.keys[start:start + count]
+        if len(keys) < count and self.boundary != _UNBOUNDED:
+            return None
+        return [-post_id for _, post_id in keys]
+
+    def page_before(self, position, count):
+        """返回排在 position 之前的最多 count 个帖子 id（按榜单顺序）"""
+        key = (-position[0], -position[1])
+        if key > self.boundary:
+            return None
+        end = bisect.bisect_left(self.keys, key)
+        return [-post_id for _, post_id in self.keys[max(0, end - count):end]]
+
+class HotRanking:
+    """全站及各贴吧的热度榜单；贴吧榜单在首次访问时加载"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._boards = {}
+
+    @property
+    def size(self):
+        return getattr(settings, 'HOT_RANKING_SIZE', 200)
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'HOT_RANKING_REFRESH_INTERVAL', 60)
+
+    def get_board(self, tieba_id=None):
+        with self._lock:
+            board = self._boards.get(tieba_id)
+            if board is not None and time.monotonic() - board.loaded_at <= self.refresh_interval:
+                return board
+        # 其他进程产生的热度变化只体现在数据库里，榜单按间隔整体重载
+        queryset = Post.objects.filter(status='published')
+        if tieba_id is not None:
+            queryset = queryset.filter(tieba_id=tieba_id)
+        rows = list(queryset.order_by('-hot_score', '-id').values_list('id', 'hot_score')[:self.size])
+        board = Leaderboard(self.size, rows)
+        with self._lock:
+            self._boards[tieba_id] = board
+        return board
+
+    def refresh(self, post_ids):
+        """按当前计数列重算这些帖子的热度，写回数据库并更新榜单"""
+        post_ids = set(post_ids)
+        if not post_ids:
+            return
+        rows = Post.objects.filter(pk__in=post_ids).values_list(
+            'id', 'tieba_id', 'status', 'hot_score',
+            'view_count', 'like_count', 'reply_count', 'favorite_count', 'published_at',
+        )
+        changed = []
+        for post_id, tieba_id, status, old_score, *counts in rows:
+            score = compute_hot_score(*counts)
+            if score != old_score:
+                changed.append(Post(pk=post_id, hot_score=score))
+            self._place(post_id, tieba_id, score if status == 'published' else None)
+        if changed:
+            Post.objects.bulk_update(changed, ['hot_score'])
+
+    def remove(self, post_id, tieba_id):
+        self._place(post_id, tieba_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+    def _place(self, post_id, tieba_id, score):
+        with self._lock:
+            for key in (None, tieba_id):
+                board = self._boards.get(key)
+                if board is not None:
+                    board.update(post_id, score)
+
+    def rebuild(self, batch_size=1000):
+        """全量重算热度分，返回修改的行数"""
+        fixed = 0
+        last_pk = 0
+        while True:
+            rows = list(Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'id', 'hot_score', 'view_count', 'like_count', 'reply_count', 'favorite_count', 'published_at',
+            )[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            changed = []
+            for post_id, old_score, *counts in rows:
+                score = compute_hot_score(*counts)
+                if score != old_score:
+                    changed.append(Post(pk=post_id, hot_score=score))
+            Post.objects.bulk_update(changed, ['hot_score'])
+            fixed += len(changed)
+        self.clear()
+        return fixed
+
+hot_ranking = HotRanking()
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Count, F, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from .models import Reply
+from .viewer_state import get_viewer_state
+
+class ReplyTreeBuilder:
+    """回复树构建器
+
+    按层批量取出回复，在内存中组装 children 结构，并一次性预加载
+    图片和当前用户的点赞状态。嵌套深度和每个节点的子回复数都有上限，
+    避免超长楼中楼拖垮单次请求。
+
+    组装结果直接挂在 Reply 实例上：
+    - tree_children: 截断后的子回复列表
+    - child_count: 子回复总数（截断前）
+    """
+
+    def __init__(self, context, max_depth=None, max_children=None):
+        self.context = context
+        self.max_depth = max_depth if max_depth is not None else getattr(settings, 'REPLY_TREE_MAX_DEPTH', 3)
+        self.max_children = max_children if max_children is not None else getattr(settings, 'REPLY_TREE_MAX_CHILDREN', 20)
+
+    def base_queryset(self):
+        return Reply.objects.select_related('author').order_by('floor', 'created_at')
+
+    def build_for_post(self, post, limit=None):
+        """取帖子按楼层排在最前的 limit 个顶层回复（与回复列表第一页一致）并组装回复树，其余楼层走回复列表分页"""
+        if limit is None:
+            limit = getattr(settings, 'POST_DETAIL_REPLY_LIMIT', 20)
+        roots = list(self.base_queryset().filter(post=post, parent__isnull=True).order_by('floor', 'id')[:limit])
+        return self.build_for_roots(roots)
+
+    def build_for_roots(self, roots):
+        """为一页顶层回复逐层加载子回复，查询次数与深度上限成正比；每个节点最多取 max_children 个子回复"""
+        roots = [reply for reply in roots if not hasattr(reply, 'tree_children')]
+        nodes = list(roots)
+        frontier = roots
+        for depth in range(self.max_depth + 1):
+            if not frontier:
+                break
+            if depth < self.max_depth:
+                by_parent, counts = self._fetch_children(frontier)
+            else:
+                # 最深一层不再取子回复，只统计数量，客户端据此知道分支被截断
+                by_parent, counts = {}, self._count_children(frontier)
+            frontier = self._link(frontier, by_parent, depth, counts)
+            nodes.extend(frontier)
+
+        self._preload(nodes)
+        return roots
+
+    def _fetch_children(self, parents):
+        """每个父节点只取前 max_children 个子回复，返回 ({父回复 id: 子回复列表}, {父回复 id: 子回复总数})"""
+        queryset = self.base_queryset().filter(parent__in=parents).annotate(
+            position=Window(
+                RowNumber(), partition_by=F('parent_id'),
+                order_by=[F('floor').asc(), F('created_at').asc(), F('id').asc()],
+            ),
+            sibling_count=Window(Count('id'), partition_by=F('parent_id')),
+        ).filter(position__lte=self.max_children)
+        by_parent = defaultdict(list)
+        counts = {}
+        for reply in queryset:
+            by_parent[reply.parent_id].append(reply)
+            counts[reply.parent_id] = reply.sibling_count
+        return by_parent, counts
+
+    def _count_children(self, parents):
+        return dict(
+            Reply.objects.filter(parent__in=parents).order_by().values('parent_id').annotate(
+                count=Count('id')
+            ).values_list('parent_id', 'count')
+        )
+
+    def _link(self, parents, by_parent, depth, counts):
+        """把子回复挂到父节点上，返回下一层节点；counts 为子回复总数"""
+        next_level = []
+        for parent in parents:
+            children = by_parent.get(parent.pk, [])
+            parent.child_count = counts.get(parent.pk, 0)
+            parent.tree_children = children[:self.max_children] if depth < self.max_depth else []
+            next_level.extend(parent.tree_children)
+        return next_level
+
+    def _preload(self, nodes):
+        if not nodes:
+            return
+        prefetch_related_objects(nodes, 'images')
+        get_viewer_state(self.context).load_replies(nodes)
\ No newline at end of file
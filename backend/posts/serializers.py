@@ -1,17 +1,27 @@
 from rest_framework import serializers
 from .models import Post, PostImage, Reply, ReplyImage, PostLike, ReplyLike, PostFavorite, PostViewHistory
+from .viewer_state import get_viewer_state
+from .reply_tree import ReplyTreeBuilder
 from users.models import User
 from tiebas.models import Tieba
 
 class PostImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostImage
-        fields = ['id', 'image', 'order', 'created_at']
+        fields = ['id', 'image', 'caption', 'sort_order', 'created_at']
 
 class ReplyImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReplyImage
-        fields = ['id', 'image', 'order', 'created_at']
+        fields = ['id', 'image', 'created_at']
+
+class PostListSerializer(serializers.ListSerializer):
+    """帖子列表序列化器：整页预加载当前用户的点赞/收藏状态"""
+    
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        get_viewer_state(self.context).load_posts(posts)
+        return super().to_representation(posts)
 
 class PostSerializer(serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.username', read_only=True)
@@ -28,20 +38,15 @@ class PostSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'content', 'author', 'author_name', 'author_avatar',
             'tieba', 'tieba_name', 'like_count', 'reply_count', 'is_liked', 'is_favorited',
-            'images', 'is_anonymous', 'is_top', 'is_essence', 'status', 'created_at', 'updated_at'
+            'images', 'is_anonymous', 'is_pinned', 'is_essence', 'status', 'created_at', 'updated_at'
         ]
+        list_serializer_class = PostListSerializer
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return PostLike.objects.filter(user=request.user, post=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_post_liked(obj)
     
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return PostFavorite.objects.filter(user=request.user, post=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_post_favorited(obj)
 
 class PostDetailSerializer(PostSerializer):
     replies = serializers.SerializerMethodField()
@@ -50,9 +55,17 @@ class PostDetailSerializer(PostSerializer):
         fields = PostSerializer.Meta.fields + ['replies']
     
     def get_replies(self, obj):
-        replies = Reply.objects.filter(post=obj, parent__isnull=True).order_by('created_at')
+        replies = ReplyTreeBuilder(self.context).build_for_post(obj)
         return ReplySerializer(replies, many=True, context=self.context).data
 
+class ReplyListSerializer(serializers.ListSerializer):
+    """回复列表序列化器：为尚未组装的顶层回复批量加载回复树"""
+    
+    def to_representation(self, data):
+        replies = list(data.all() if hasattr(data, 'all') else data)
+        ReplyTreeBuilder(self.context).build_for_roots(replies)
+        return super().to_representation(replies)
+
 class ReplySerializer(serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.username', read_only=True)
     author_avatar = serializers.CharField(source='author.avatar', read_only=True)
@@ -60,23 +73,28 @@ class ReplySerializer(serializers.ModelSerializer):
     is_liked = serializers.SerializerMethodField()
     images = ReplyImageSerializer(many=True, read_only=True)
     children = serializers.SerializerMethodField()
+    child_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Reply
         fields = [
-            'id', 'content', 'author', 'author_name', 'author_avatar', 'post', 'parent',
-            'like_count', 'is_liked', 'images', 'children', 'is_anonymous', 'created_at'
+            'id', 'content', 'author', 'author_name', 'author_avatar', 'post', 'parent', 'floor',
+            'like_count', 'is_liked', 'images', 'children', 'child_count', 'is_anonymous', 'created_at'
         ]
+        list_serializer_class = ReplyListSerializer
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ReplyLike.objects.filter(user=request.user, reply=obj).exists()
-        return False
+        return get_viewer_state(self.context).is_reply_liked(obj)
     
     def get_children(self, obj):
-        children = Reply.objects.filter(parent=obj).order_by('created_at')
-        return ReplySerializer(children, many=True, context=self.context).data
+        if not hasattr(obj, 'tree_children'):
+            ReplyTreeBuilder(self.context).build_for_roots([obj])
+        return ReplySerializer(obj.tree_children, many=True, context=self.context).data
+    
+    def get_child_count(self, obj):
+        if not hasattr(obj, 'child_count'):
+            ReplyTreeBuilder(self.context).build_for_roots([obj])
+        return obj.child_count
 
 class PostCreateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
@@ -142,4 +160,4 @@ class PostViewHistorySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PostViewHistory
-        fields = ['id', 'user', 'post', 'post_title', 'post_author', 'viewed_at']
\ No newline at end of file
+        fields = ['id', 'user', 'post', 'post_title', 'post_author', 'created_at']
\ No newline at end of file
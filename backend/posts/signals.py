@@ -0,0 +1,60 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from tieba_backend.cache import bump_cache_scopes
+from tiebas.bundle import invalidate_tieba_bundles
+from .models import Post, Reply, PostLike, PostFavorite
+from .ranking import hot_ranking
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_lists(sender, instance, **kwargs):
+    """帖子增删改后，失效全站和所属贴吧的帖子列表缓存"""
+    bump_cache_scopes('posts', f'tieba:{instance.tieba_id}:posts')
+
+@receiver(post_save, sender=Post)
+def invalidate_tieba_post_count(sender, instance, created=False, **kwargs):
+    """发帖、删帖改变贴吧头部数据中的 post_count"""
+    if created:
+        invalidate_tieba_bundles(instance.tieba_id)
+
+@receiver(post_delete, sender=Post)
+def invalidate_tieba_post_count_removed(sender, instance, **kwargs):
+    invalidate_tieba_bundles(instance.tieba_id)
+
+@receiver([post_save, post_delete], sender=Reply)
+def invalidate_reply_list(sender, instance, **kwargs):
+    """回复增删改后，失效该帖子的回复列表缓存"""
+    bump_cache_scopes(f'post:{instance.post_id}:replies')
+
+@receiver(post_save, sender=Post)
+def rank_post(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """只在影响热度的字段变化时重算：编辑标题正文、置顶加精等保存不重算"""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(Post.RANKING_FIELDS):
+        return
+    values = instance.ranking_values()
+    if not created and values == getattr(instance, '_loaded_ranking_values', None):
+        return
+    hot_ranking.refresh([instance.pk])
+    instance._loaded_ranking_values = values
+
+@receiver(post_delete, sender=Post)
+def unrank_post(sender, instance, **kwargs):
+    hot_ranking.remove(instance.pk, instance.tieba_id)
+
+# 互动计数由 counters 中的接收器先行更新（apps.ready 中先导入 counters），这里再按新计数重算热度
+@receiver(post_save, sender=PostLike)
+@receiver(post_save, sender=PostFavorite)
+@receiver(post_save, sender=Reply)
+def rerank_on_interaction(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        hot_ranking.refresh([instance.post_id])
+
+@receiver(post_delete, sender=PostLike)
+@receiver(post_delete, sender=PostFavorite)
+@receiver(post_delete, sender=Reply)
+def rerank_on_interaction_removed(sender, instance, origin=None, **kwargs):
+    # 帖子本身被级联删除时无需重算
+    if getattr(origin, 'model', type(origin)) is Post:
+        return
+    hot_ranking.refresh([instance.post_id])
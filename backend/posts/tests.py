@@ -0,0 +1,537 @@
+import importlib
+import math
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tiebas.models import Tieba, TiebaMember
+from users.models import User
+from tieba_backend.relations import add_relation
+from .models import Post, PostFavorite, PostImage, PostLike, PostViewHistory, Reply, ReplyLike
+from .ranking import EPOCH, Leaderboard, compute_hot_score, hot_ranking
+from .reply_tree import ReplyTreeBuilder
+from .view_buffer import ViewBuffer, get_client_ip
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PostListQueryCountTests(TestCase):
+    """帖子列表的查询数不随每页条数增长（点赞、收藏状态按页批量加载）"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.viewer = User.objects.create_user(username='viewer', password='x', nickname='viewer')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def create_posts(self, author, count):
+        posts = [
+            Post.objects.create(tieba=self.tieba, author=author, title=f'帖子{index}', content='内容')
+            for index in range(count)
+        ]
+        for post in posts[::2]:
+            PostLike.objects.create(post=post, user=self.viewer)
+            PostFavorite.objects.create(post=post, user=self.viewer)
+            PostImage.objects.create(post=post, image=SimpleUploadedFile('a.png', b'png'))
+        return posts
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_post_list_query_count_is_constant(self):
+        self.create_posts(self.author, 20)
+        small, response = self.count_queries('/api/posts/?page_size=3')
+        self.assertEqual(len(response.data['results']), 3)
+        with self.assertNumQueries(small):
+            response = self.client.get('/api/posts/?page_size=20')
+        results = response.data['results']
+        self.assertEqual(len(results), 20)
+        liked = {post['id'] for post in results if post['is_liked']}
+        self.assertEqual(liked, set(PostLike.objects.values_list('post_id', flat=True)))
+        self.assertEqual(liked, {post['id'] for post in results if post['is_favorited']})
+
+    def test_user_posts_query_count_is_constant(self):
+        self.create_posts(self.viewer, 3)
+        small, _ = self.count_queries('/api/posts/user/posts/')
+        self.create_posts(self.viewer, 17)
+        with self.assertNumQueries(small):
+            response = self.client.get('/api/posts/user/posts/')
+        self.assertEqual(len(response.data), 20)
+
+class PostCreateTests(TestCase):
+    def test_private_tieba_requires_membership(self):
+        author = User.objects.create_user(username='author', password='x', nickname='author')
+        tieba = Tieba.objects.create(name='私密吧', title='私密吧', creator=author, is_public=False)
+        client = APIClient()
+        client.force_authenticate(author)
+        data = {'title': '帖子', 'content': '内容', 'tieba': tieba.pk}
+        response = client.post('/api/posts/create/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, ['您不是该贴吧的成员，无法发帖'])
+        self.assertFalse(Post.objects.exists())
+
+class ReplyFloorTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.post = Post.objects.create(tieba=tieba, author=self.author, title='帖子', content='内容')
+
+    def test_rolled_back_reply_leaves_no_gap(self):
+        Reply.objects.create(post=self.post, author=self.author, content='1')
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Reply.objects.create(post=self.post, author=self.author, content='回滚')
+                raise RuntimeError
+        Reply.objects.create(post=self.post, author=self.author, content='2')
+        self.assertEqual(list(Reply.objects.filter(post=self.post).values_list('floor', flat=True)), [1, 2])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_floor, 2)
+
+    def test_duplicate_floor_is_rejected(self):
+        Reply.objects.create(post=self.post, author=self.author, content='1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reply.objects.create(post=self.post, author=self.author, content='重复', floor=1)
+
+class ConcurrentReplyFloorTests(TransactionTestCase):
+    """并发回复拿到的楼层连续且不重复"""
+
+    def test_concurrent_replies_get_unique_gap_free_floors(self):
+        author = User.objects.create_user(username='author', password='x', nickname='author')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=author)
+        post = Post.objects.create(tieba=tieba, author=author, title='帖子', content='内容')
+        start = threading.Barrier(8)
+        errors = []
+
+        def reply():
+            try:
+                start.wait()
+                for index in range(10):
+                    while True:
+                        try:
+                            Reply.objects.create(post_id=post.pk, author=author, content=str(index))
+                            break
+                        except OperationalError:
+                            # SQLite 并发写入时可能报锁冲突，整个事务回滚，不占用楼层，重试即可
+                            time.sleep(0.001)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reply) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        floors = sorted(Reply.objects.filter(post=post).values_list('floor', flat=True))
+        self.assertEqual(floors, list(range(1, 81)))
+        post.refresh_from_db()
+        self.assertEqual((post.last_floor, post.reply_count), (80, 80))
+
+class ReplyTreeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.post = Post.objects.create(tieba=tieba, author=self.author, title='帖子', content='内容')
+        self.root = Reply.objects.create(post=self.post, author=self.author, content='根')
+        self.children = [
+            Reply.objects.create(post=self.post, author=self.author, content=f'子{index}', parent=self.root)
+            for index in range(5)
+        ]
+        for index in range(3):
+            Reply.objects.create(post=self.post, author=self.author, content=f'孙{index}', parent=self.children[0])
+
+    def build(self, method, **limits):
+        builder = ReplyTreeBuilder({}, **limits)
+        if method == 'post':
+            return builder.build_for_post(self.post)[0]
+        return builder.build_for_roots([Reply.objects.get(pk=self.root.pk)])[0]
+
+    def test_child_count_at_max_depth_matches_full_tree(self):
+        for method in ('post', 'roots'):
+            root = self.build(method, max_depth=1)
+            child = root.tree_children[0]
+            self.assertEqual((root.child_count, child.child_count), (5, 3), method)
+            self.assertEqual(child.tree_children, [])
+
+    def test_children_are_limited_per_parent(self):
+        for method in ('post', 'roots'):
+            root = self.build(method, max_children=2)
+            self.assertEqual(root.child_count, 5, method)
+            self.assertEqual([reply.pk for reply in root.tree_children], [reply.pk for reply in self.children[:2]])
+            self.assertEqual(root.tree_children[0].child_count, 3)
+            self.assertEqual(len(root.tree_children[0].tree_children), 2)
+
+    @override_settings(POST_DETAIL_REPLY_LIMIT=2)
+    def test_post_detail_embeds_first_page_of_roots(self):
+        later = [Reply.objects.create(post=self.post, author=self.author, content=f'楼{index}') for index in range(3)]
+        response = APIClient().get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual([reply['id'] for reply in response.data['replies']], [self.root.pk, later[0].pk])
+        self.assertEqual(response.data['replies'][0]['child_count'], 5)
+        # 其余楼层从回复列表接着取
+        response = APIClient().get(f'/api/posts/{self.post.pk}/replies/', {'page_size': 2})
+        response = APIClient().get(response.data['next'])
+        self.assertEqual([reply['id'] for reply in response.data['results']], [later[1].pk, later[2].pk])
+
+class PostRelationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.viewer = User.objects.create_user(username='viewer', password='x', nickname='viewer')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.post = Post.objects.create(tieba=tieba, author=self.author, title='帖子', content='内容')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_repeated_like_and_unlike_change_count_once(self):
+        url = f'/api/posts/{self.post.pk}/'
+        self.assertEqual(self.client.post(url + 'like/').status_code, 201)
+        self.assertEqual(self.client.post(url + 'like/').status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.client.delete(url + 'unlike/').status_code, 200)
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_missing_target_returns_404(self):
+        for url in ('/api/posts/0/unlike/', '/api/posts/0/unfavorite/', '/api/posts/replies/0/unlike/'):
+            self.assertEqual(self.client.delete(url).status_code, 404, url)
+
+    def test_toggle_writes_with_one_statement(self):
+        for url in (f'/api/posts/{self.post.pk}/like/', f'/api/posts/{self.post.pk}/favorite/'):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.post(url).status_code, 201)
+            statements = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+            # 不先查询帖子，第一条语句就是带 EXISTS 条件的 INSERT
+            self.assertTrue(statements[0].startswith('INSERT INTO'), statements[0])
+            self.assertIn('EXISTS', statements[0])
+            self.assertEqual(self.client.post(url).status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.favorite_count), (1, 1))
+
+    def test_reply_like_is_idempotent(self):
+        reply = Reply.objects.create(post=self.post, author=self.author, content='回复')
+        url = f'/api/posts/replies/{reply.pk}/'
+        self.assertEqual(self.client.post(url + 'like/').status_code, 201)
+        self.assertEqual(self.client.post(url + 'like/').status_code, 200)
+        reply.refresh_from_db()
+        self.assertEqual(reply.like_count, 1)
+
+    def test_unlike_without_like_is_a_noop(self):
+        PostLike.objects.create(user=self.author, post=self.post)
+        for url in ('unlike/', 'unfavorite/'):
+            self.assertEqual(self.client.delete(f'/api/posts/{self.post.pk}/{url}').status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.favorite_count), (1, 0))
+        self.assertEqual(PostLike.objects.count(), 1)
+
+    def test_like_missing_target_returns_404(self):
+        for url in ('/api/posts/0/like/', '/api/posts/0/favorite/', '/api/posts/replies/0/like/'):
+            self.assertEqual(self.client.post(url).status_code, 404, url)
+        self.assertFalse(PostLike.objects.exists())
+        self.assertFalse(PostFavorite.objects.exists())
+        self.assertFalse(ReplyLike.objects.exists())
+
+    def test_only_unique_conflicts_are_ignored(self):
+        self.assertIsNotNone(add_relation(PostLike, user=self.viewer, post=self.post))
+        self.assertIsNone(add_relation(PostLike, user=self.viewer, post=self.post))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            add_relation(PostLike, user=None, post=self.post)
+
+class ViewBufferTests(TestCase):
+    def client_ip(self, remote_addr, forwarded=None):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return get_client_ip(RequestFactory().get('/', REMOTE_ADDR=remote_addr, **headers))
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        self.assertEqual(self.client_ip('203.0.113.5', '1.2.3.4'), '203.0.113.5')
+        self.assertIsNone(self.client_ip('not-an-ip'))
+
+    @override_settings(TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_forwarded_for_through_trusted_proxy(self):
+        # 最左边的值由客户端伪造，只取最右边的非代理地址
+        self.assertEqual(self.client_ip('10.0.0.2', '1.2.3.4, 198.51.100.7, 10.0.0.1'), '198.51.100.7')
+        self.assertEqual(self.client_ip('10.0.0.2', '<script>'), '10.0.0.2')
+        self.assertEqual(self.client_ip('203.0.113.5', '1.2.3.4'), '203.0.113.5')
+
+    @override_settings(POST_VIEW_FLUSH_INTERVAL=60)
+    def test_flush_skips_deleted_posts(self):
+        kept, deleted = self.create_posts(2)
+        buffer = self.create_buffer()
+        for post in (kept, deleted):
+            buffer.record(post.pk, self.author, '127.0.0.1')
+        deleted.delete()
+        self.assertEqual(buffer.flush(), 1)
+        kept.refresh_from_db()
+        self.assertEqual(kept.view_count, 1)
+        self.assertEqual(list(PostViewHistory.objects.values_list('post_id', flat=True)), [kept.pk])
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+
+    def create_posts(self, count):
+        return [
+            Post.objects.create(tieba=self.tieba, author=self.author, title=f'帖子{index}', content='内容')
+            for index in range(count)
+        ]
+
+    def create_buffer(self):
+        buffer = ViewBuffer()
+        self.addCleanup(buffer.drain)
+        # 测试中不启动后台线程，由测试显式 flush
+        patcher = mock.patch.object(buffer, '_wake')
+        self.wake = patcher.start()
+        self.addCleanup(patcher.stop)
+        return buffer
+
+    def view_count(self, post):
+        post.refresh_from_db()
+        return post.view_count
+
+    @override_settings(POST_VIEW_FLUSH_INTERVAL=60)
+    def test_views_are_deduplicated(self):
+        post, = self.create_posts(1)
+        buffer = self.create_buffer()
+        for _ in range(3):
+            buffer.record(post.pk, self.author, '127.0.0.1')
+            buffer.record(post.pk, None, '198.51.100.1')
+        buffer.record(post.pk, None, '198.51.100.2')
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.view_count(post), 3)
+        self.assertEqual(PostViewHistory.objects.count(), 1)
+
+    @override_settings(POST_VIEW_FLUSH_INTERVAL=60, POST_VIEW_ANONYMOUS_WINDOW=60, POST_VIEW_ANONYMOUS_MAX=2)
+    def test_anonymous_dedup_expires_and_is_capped(self):
+        post, = self.create_posts(1)
+        buffer = self.create_buffer()
+        with mock.patch('posts.view_buffer.time.monotonic', return_value=1000):
+            for ip in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+                buffer.record(post.pk, None, ip)
+            self.assertEqual(len(buffer._anonymous_seen), 2)
+            # 最早的记录已被淘汰，再次浏览重新计数
+            buffer.record(post.pk, None, '198.51.100.1')
+            buffer.record(post.pk, None, '198.51.100.3')
+        with mock.patch('posts.view_buffer.time.monotonic', return_value=1061):
+            buffer.record(post.pk, None, '198.51.100.3')
+            self.assertEqual(list(buffer._anonymous_seen), [(post.pk, '198.51.100.3')])
+        buffer.flush()
+        self.assertEqual(self.view_count(post), 5)
+
+    @override_settings(POST_VIEW_FLUSH_INTERVAL=60, POST_VIEW_MAX_PENDING=3)
+    def test_threshold_wakes_background_flush(self):
+        posts = self.create_posts(3)
+        buffer = self.create_buffer()
+        for post in posts:
+            buffer.record(post.pk, None, '127.0.0.1')
+        self.assertEqual([call.kwargs['immediate'] for call in self.wake.call_args_list], [False, False, True])
+        # 请求本身不写库
+        self.assertEqual(self.view_count(posts[0]), 0)
+
+    @override_settings(POST_VIEW_FLUSH_INTERVAL=60, POST_VIEW_BATCH_SIZE=2)
+    def test_flush_in_chunks_and_requeue_failed_chunk(self):
+        posts = self.create_posts(5)
+        buffer = self.create_buffer()
+        for post in posts:
+            buffer.record(post.pk, self.author, '127.0.0.1')
+        bulk_create = PostViewHistory.objects.bulk_create
+        calls = []
+
+        def failing_second_chunk(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise OperationalError('database is locked')
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(PostViewHistory.objects, 'bulk_create', failing_second_chunk):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(calls, [2, 2])
+        self.assertEqual([self.view_count(post) for post in posts], [1, 1, 0, 0, 0])
+        # 失败的一块放回缓冲，下次刷新写入
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual([self.view_count(post) for post in posts], [1] * 5)
+        self.assertEqual(PostViewHistory.objects.count(), 5)
+
+class PostFeedPaginationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', password='x', nickname='author')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=author)
+        self.posts = [
+            Post.objects.create(tieba=tieba, author=author, title=f'帖子{index}', content='内容') for index in range(5)
+        ]
+
+    def test_published_post_requires_published_at(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Post.objects.filter(pk=self.posts[0].pk).update(published_at=None)
+        Post.objects.filter(pk=self.posts[0].pk).update(status='draft', published_at=None)
+
+    def test_cursor_reaches_every_post(self):
+        Post.objects.update(published_at=self.posts[0].published_at)
+        url, seen = '/api/posts/?page_size=2', []
+        while url:
+            response = APIClient().get(url)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(post.pk for post in self.posts))
+
+
+class CounterBackfillMigrationTests(TestCase):
+    def test_backfill_restores_counts(self):
+        author = User.objects.create_user(username='author', password='x', nickname='author')
+        fan = User.objects.create_user(username='fan', password='x', nickname='fan')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=author)
+        TiebaMember.objects.create(tieba=tieba, user=fan)
+        post = Post.objects.create(tieba=tieba, author=author, title='标题', content='内容')
+        reply = Reply.objects.create(post=post, author=fan, content='回复')
+        PostLike.objects.create(post=post, user=fan)
+        PostFavorite.objects.create(post=post, user=fan)
+        ReplyLike.objects.create(reply=reply, user=author)
+        Post.objects.update(like_count=0, favorite_count=0, reply_count=0)
+        Reply.objects.update(like_count=0)
+        Tieba.objects.update(member_count=0, post_count=0)
+
+        importlib.import_module('posts.migrations.0006_backfill_counters').backfill_counters(apps, None)
+        importlib.import_module('tiebas.migrations.0004_backfill_member_count').backfill_member_count(apps, None)
+
+        post.refresh_from_db()
+        tieba.refresh_from_db()
+        self.assertEqual((post.like_count, post.favorite_count, post.reply_count), (1, 1, 1))
+        self.assertEqual(Reply.objects.get(pk=reply.pk).like_count, 1)
+        self.assertEqual((tieba.member_count, tieba.post_count), (1, 1))
+
+
+@override_settings(HOT_SCORE_HALF_LIFE=3600, HOT_SCORE_WEIGHTS={'view': 0, 'like': 1, 'reply': 2, 'favorite': 3})
+class HotRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        hot_ranking.clear()
+        self.addCleanup(hot_ranking.clear)
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+
+    def test_compute_hot_score(self):
+        published = EPOCH + timedelta(hours=10)
+        self.assertEqual(compute_hot_score(0, 0, 0, 0, published), 10)
+        # 1 赞 + 1 回复 + 1 收藏 = 6，再加 1 次浏览（权重 0）
+        self.assertAlmostEqual(compute_hot_score(1, 1, 1, 1, published), 10 + math.log2(7))
+        # 晚一个半衰期发布的帖子只需一半左右的互动量就能持平
+        self.assertAlmostEqual(
+            compute_hot_score(0, 3, 0, 0, published), compute_hot_score(0, 1, 0, 0, published + timedelta(hours=1)),
+        )
+
+    def test_leaderboard_orders_by_score_then_id(self):
+        board = Leaderboard(3, [(1, 5.0), (2, 7.0), (3, 5.0)])
+        self.assertEqual(board.page_after(None, 3), [2, 3, 1])
+        board.update(4, 6.0)
+        # 超出容量淘汰末尾，边界收紧到被淘汰的帖子
+        self.assertEqual(board.page_after(None, 3), [2, 4, 3])
+        self.assertEqual(board.boundary, (-5.0, -1))
+        board.update(5, 4.0)
+        self.assertNotIn(5, board.scores)
+        board.update(2, None)
+        self.assertEqual(board.page_after(None, 2), [4, 3])
+        # 超出覆盖范围时交给数据库分页
+        self.assertIsNone(board.page_after((5.0, 3), 2))
+        self.assertEqual(board.page_before((5.0, 3), 2), [4])
+
+    @override_settings(HOT_RANKING_SIZE=3)
+    def test_hot_keyset_paging_crosses_leaderboard(self):
+        posts = [
+            Post.objects.create(tieba=self.tieba, author=self.author, title=f'帖子{index}', content='内容')
+            for index in range(6)
+        ]
+        for likes, post in zip([2, 0, 5, 1, 0, 3], posts):
+            Post.objects.filter(pk=post.pk).update(like_count=likes)
+        hot_ranking.refresh([post.pk for post in posts])
+        expected = list(Post.objects.order_by('-hot_score', '-id').values_list('id', flat=True))
+        for base in ('/api/posts/?sort=hot', f'/api/posts/?sort=hot&tieba={self.tieba.pk}'):
+            url, seen = base + '&page_size=2', []
+            while url:
+                response = APIClient().get(url)
+                self.assertEqual(response.status_code, 200)
+                seen += [post['id'] for post in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(seen, expected, base)
+
+    def test_invalid_tieba_is_400(self):
+        for query in ('tieba=abc&sort=hot', 'tieba=abc', 'tieba=1x'):
+            self.assertEqual(APIClient().get(f'/api/posts/?{query}').status_code, 400, query)
+
+    def test_only_ranking_fields_trigger_refresh(self):
+        post = Post.objects.create(tieba=self.tieba, author=self.author, title='帖子', content='内容')
+        post = Post.objects.get(pk=post.pk)
+        with mock.patch.object(hot_ranking, 'refresh') as refresh:
+            post.title = '新标题'
+            post.save()
+            post.save(update_fields=['content'])
+            post.is_pinned = True
+            post.save()
+            refresh.assert_not_called()
+            post.like_count = 3
+            post.save()
+            post.save(update_fields=['like_count'])
+            post.view_count = 10
+            post.save(update_fields=['view_count'])
+            post.status = 'deleted'
+            post.save(update_fields=['status'])
+        self.assertEqual(refresh.call_count, 3)
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class PostListResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.other = Tieba.objects.create(name='其他吧', title='其他吧', creator=self.author)
+        self.post = Post.objects.create(tieba=self.tieba, author=self.author, title='帖子', content='内容')
+        self.url = f'/api/posts/?tieba={self.tieba.pk}'
+
+    def test_etag_and_last_modified_return_304(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = APIClient().get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(APIClient().get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        self.assertEqual(APIClient().get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_cached_until_scope_is_bumped(self):
+        self.assertEqual(len(APIClient().get(self.url).data['results']), 1)
+        # 绕过信号直接写库，缓存的响应不变
+        Post.objects.filter(pk=self.post.pk).update(title='改过的标题')
+        with self.assertNumQueries(0):
+            response = APIClient().get(self.url)
+        self.assertEqual(response.data['results'][0]['title'], '帖子')
+
+        # 其他贴吧发帖不影响本吧的缓存
+        Post.objects.create(tieba=self.other, author=self.author, title='别处', content='内容')
+        self.assertEqual(APIClient().get(self.url).data['results'][0]['title'], '帖子')
+
+        etag = APIClient().get(self.url)['ETag']
+        Post.objects.create(tieba=self.tieba, author=self.author, title='新帖', content='内容')
+        response = APIClient().get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['title'] for post in response.data['results']], ['新帖', '改过的标题'])
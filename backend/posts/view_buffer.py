@@ -0,0 +1,214 @@
+"""帖子浏览量/浏览历史的写回缓冲
+
+PostDetailView 不再每次请求同步写库，而是把浏览事件记在进程内缓冲里：
+- 登录用户按 (帖子, 用户) 合并，一个刷新周期内只写一条浏览历史
+- 匿名用户按 (帖子, IP) 在时间窗口内去重，只计浏览量；IP 只在经过 TRUSTED_PROXIES 时才取自 X-Forwarded-For；
+  去重表按时间顺序过期，最多保留 POST_VIEW_ANONYMOUS_MAX 条
+- 刷新由后台线程按时间间隔进行，缓冲达到 POST_VIEW_MAX_PENDING 时立即唤醒，请求本身不写库
+- 每次刷新按 POST_VIEW_BATCH_SIZE 分块，每块一个事务：bulk_create 浏览历史，
+  每个帖子一条 view_count = view_count + n 的 UPDATE，随后批量重算这些帖子的热度；
+  刷新前已被删除的帖子、用户的事件直接丢弃；某块写入失败时整块放回缓冲，下次刷新重试
+- 进程退出时 drain 剩余事件
+"""
+
+import atexit
+import ipaddress
+import logging
+import threading
+import time
+from collections import Counter as TallyCounter, OrderedDict
+from itertools import islice
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from users.models import User
+from .models import Post, PostViewHistory
+from .ranking import hot_ranking
+
+logger = logging.getLogger(__name__)
+
+def get_client_ip(request):
+    """客户端 IP
+
+    默认只信任 REMOTE_ADDR；直连地址属于 TRUSTED_PROXIES 时才读取 X-Forwarded-For，
+    从右往左跳过受信任的代理，取第一个其他地址。客户端自己填写的头部无法伪造来源，
+    不是合法 IP 的值不会写入数据库。
+    """
+    address = _parse_ip(request.META.get('REMOTE_ADDR'))
+    if address is None:
+        return None
+    proxies = _trusted_proxies()
+    if _is_trusted(address, proxies):
+        for value in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+            forwarded = _parse_ip(value)
+            if forwarded is None:
+                break
+            address = forwarded
+            if not _is_trusted(address, proxies):
+                break
+    return str(address)
+
+def _parse_ip(value):
+    try:
+        return ipaddress.ip_address((value or '').strip())
+    except ValueError:
+        return None
+
+def _trusted_proxies():
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in getattr(settings, 'TRUSTED_PROXIES', [])]
+
+def _is_trusted(address, proxies):
+    return any(address in network for network in proxies)
+
+class ViewBuffer:
+    """进程内浏览事件缓冲"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._view_counts = TallyCounter()
+        # (帖子, IP) -> 最近一次计数的时间，按时间先后排列
+        self._anonymous_seen = OrderedDict()
+        self._thread = None
+        self._flush_now = threading.Event()
+        self._stopped = False
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'POST_VIEW_FLUSH_INTERVAL', 5)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'POST_VIEW_MAX_PENDING', 1000)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'POST_VIEW_BATCH_SIZE', 500)
+
+    @property
+    def anonymous_window(self):
+        return getattr(settings, 'POST_VIEW_ANONYMOUS_WINDOW', 30 * 60)
+
+    @property
+    def anonymous_max(self):
+        return getattr(settings, 'POST_VIEW_ANONYMOUS_MAX', 100000)
+
+    def record(self, post_id, user=None, ip_address=None):
+        """记录一次浏览"""
+        now = time.monotonic()
+        with self._lock:
+            if user is not None and user.is_authenticated:
+                key = (post_id, user.pk)
+                if key not in self._pending:
+                    self._view_counts[post_id] += 1
+                self._pending[key] = ip_address
+            else:
+                self._prune_anonymous(now)
+                key = (post_id, ip_address)
+                if key in self._anonymous_seen:
+                    return
+                while len(self._anonymous_seen) >= self.anonymous_max:
+                    self._anonymous_seen.popitem(last=False)
+                self._anonymous_seen[key] = now
+                self._view_counts[post_id] += 1
+            full = len(self._pending) >= self.max_pending or len(self._view_counts) >= self.max_pending
+
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._wake(immediate=full)
+
+    def flush(self):
+        """把缓冲分块写入数据库，返回写入的浏览历史条数
+
+        每块最多 batch_size 条浏览历史和 batch_size 个帖子的浏览量，一块一个事务；
+        写入失败时这一块放回缓冲，剩余的留到下次刷新。
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    pending = dict(_take(self._pending, self.batch_size))
+                    view_counts = TallyCounter(dict(_take(self._view_counts, self.batch_size)))
+                if not pending and not view_counts:
+                    return written
+                try:
+                    written += self._write(pending, view_counts)
+                except Exception:
+                    logger.exception('帖子浏览记录写入失败，%d 条浏览历史放回缓冲', len(pending))
+                    self._requeue(pending, view_counts)
+                    return written
+
+    def drain(self):
+        """停止后台刷新并写完剩余事件（进程退出时调用）"""
+        self._stopped = True
+        self._flush_now.set()
+        self.flush()
+
+    def _write(self, pending, view_counts):
+        # 刷新前已被删除的帖子和用户不再写入，避免一条外键错误导致整块反复重试
+        post_ids = set(Post.objects.filter(
+            pk__in={post_id for post_id, _ in pending} | set(view_counts)
+        ).values_list('pk', flat=True))
+        user_ids = set(User.objects.filter(
+            pk__in={user_id for _, user_id in pending}
+        ).values_list('pk', flat=True))
+        history = [
+            PostViewHistory(post_id=post_id, user_id=user_id, ip_address=ip_address)
+            for (post_id, user_id), ip_address in pending.items()
+            if post_id in post_ids and user_id in user_ids
+        ]
+        view_counts = {post_id: count for post_id, count in view_counts.items() if post_id in post_ids}
+        with transaction.atomic():
+            PostViewHistory.objects.bulk_create(history)
+            for post_id, count in view_counts.items():
+                Post.objects.filter(pk=post_id).update(view_count=F('view_count') + count)
+            hot_ranking.refresh(view_counts.keys())
+        return len(history)
+
+    def _requeue(self, pending, view_counts):
+        with self._lock:
+            for key, ip_address in pending.items():
+                self._pending.setdefault(key, ip_address)
+            self._view_counts.update(view_counts)
+
+    def _wake(self, immediate=False):
+        """确保后台刷新线程在运行；immediate 时让它立即刷新"""
+        with self._lock:
+            if self._stopped:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='post-view-flush', daemon=True)
+                self._thread.start()
+        if immediate:
+            self._flush_now.set()
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                self._flush_now.wait(self.flush_interval)
+                self._flush_now.clear()
+                if self._stopped:
+                    return
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('帖子浏览记录刷新失败')
+                close_old_connections()
+        finally:
+            connection.close()
+
+    def _prune_anonymous(self, now):
+        """按时间顺序去掉过期的匿名去重记录；条数超过 anonymous_max 时 record 淘汰最早的"""
+        cutoff = now - self.anonymous_window
+        seen = self._anonymous_seen
+        while seen and next(iter(seen.values())) < cutoff:
+            seen.popitem(last=False)
+
+def _take(items, count):
+    """从字典中取出（并删除）最早放入的 count 项"""
+    return [(key, items.pop(key)) for key in list(islice(items, count))]
+
+view_buffer = ViewBuffer()
+atexit.register(view_buffer.drain)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from .models import PostLike, ReplyLike, PostFavorite
+
+CONTEXT_KEY = 'viewer_state'
+
+class ViewerState:
+    """当前用户对帖子/回复的点赞、收藏状态
+
+    同一请求内共享一个实例，按页批量加载：每种关系一次查询，
+    序列化时只查内存集合，不再逐行发起 EXISTS 查询。
+    """
+
+    def __init__(self, user):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.liked_post_ids = set()
+        self.favorited_post_ids = set()
+        self._loaded_post_ids = set()
+        self.liked_reply_ids = set()
+        self._loaded_reply_ids = set()
+
+    def load_posts(self, posts):
+        """批量加载一组帖子的点赞/收藏状态"""
+        post_ids = {post.pk for post in posts} - self._loaded_post_ids
+        if not post_ids:
+            return
+        self._loaded_post_ids |= post_ids
+        if self.user is None:
+            return
+
+        self.liked_post_ids.update(PostLike.objects.filter(
+            user=self.user, post_id__in=post_ids
+        ).values_list('post_id', flat=True))
+        self.favorited_post_ids.update(PostFavorite.objects.filter(
+            user=self.user, post_id__in=post_ids
+        ).values_list('post_id', flat=True))
+
+    def load_replies(self, replies):
+        """批量加载一组回复的点赞状态"""
+        reply_ids = {reply.pk for reply in replies} - self._loaded_reply_ids
+        if not reply_ids:
+            return
+        self._loaded_reply_ids |= reply_ids
+        if self.user is None:
+            return
+
+        self.liked_reply_ids.update(ReplyLike.objects.filter(
+            user=self.user, reply_id__in=reply_ids
+        ).values_list('reply_id', flat=True))
+
+    def is_post_liked(self, post):
+        self.load_posts([post])
+        return post.pk in self.liked_post_ids
+
+    def is_post_favorited(self, post):
+        self.load_posts([post])
+        return post.pk in self.favorited_post_ids
+
+    def is_reply_liked(self, reply):
+        self.load_replies([reply])
+        return reply.pk in self.liked_reply_ids
+
+def get_viewer_state(context):
+    """获取（或创建）序列化上下文中的 ViewerState"""
+    state = context.get(CONTEXT_KEY)
+    if state is None:
+        request = context.get('request')
+        state = ViewerState(getattr(request, 'user', None))
+        context[CONTEXT_KEY] = state
+    return state
\ No newline at end of file
@@ -1,67 +1,78 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404
-from .models import Post, PostImage, Reply, ReplyImage, PostLike, ReplyLike, PostFavorite, PostViewHistory
+from .models import Post, Reply, PostLike, ReplyLike, PostFavorite, PostViewHistory
+from tieba_backend.cache import ResponseCacheMixin
+from tieba_backend.relations import add_relation, remove_relation
+from .view_buffer import view_buffer, get_client_ip
+from .ranking import hot_ranking
+from .pagination import PostKeysetPagination, ReplyKeysetPagination
 from .serializers import (
     PostSerializer, PostDetailSerializer, PostCreateSerializer, ReplySerializer,
-    ReplyCreateSerializer, PostLikeSerializer, ReplyLikeSerializer, PostFavoriteSerializer,
-    PostViewHistorySerializer
+    ReplyCreateSerializer, PostFavoriteSerializer, PostViewHistorySerializer
 )
-from tiebas.models import Tieba
+from tiebas.models import TiebaMember
+from search.engines import get_search_engine
 
-class PostListView(generics.ListAPIView):
+class PostListView(ResponseCacheMixin, generics.ListAPIView):
     """获取帖子列表"""
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = PostKeysetPagination
+    sort_orderings = {
+        'like_count': ('-like_count', '-id'),
+        'reply_count': ('-reply_count', '-id'),
+        'hot': ('-hot_score', '-id'),
+    }
+    hot_leaderboard = None
+    
+    def get_cache_scopes(self):
+        tieba_id = self.request.query_params.get('tieba')
+        if tieba_id:
+            return [f'tieba:{tieba_id}:posts']
+        return ['posts']
     
     def get_queryset(self):
-        queryset = Post.objects.select_related('author', 'tieba').annotate(
-            like_count=Count('likes'),
-            reply_count=Count('replies')
-        ).filter(status='published')
+        queryset = Post.objects.select_related('author', 'tieba').prefetch_related('images').filter(status='published')
         
         # 贴吧过滤
         tieba_id = self.request.query_params.get('tieba', None)
         if tieba_id:
+            if not tieba_id.isdigit():
+                raise ValidationError({'tieba': '无效的贴吧ID'})
             queryset = queryset.filter(tieba_id=tieba_id)
         
-        # 搜索过滤
+        # 搜索过滤（走全文索引），未指定排序时按相关度排
         search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(Q(title__icontains=search) | Q(content__icontains=search))
-        
-        # 排序
         sort = self.request.query_params.get('sort', 'created_at')
-        if sort == 'created_at':
-            queryset = queryset.order_by('-created_at')
-        elif sort == 'like_count':
-            queryset = queryset.order_by('-like_count')
-        elif sort == 'reply_count':
-            queryset = queryset.order_by('-reply_count')
+        self.keyset_ordering = self.sort_orderings.get(sort, PostKeysetPagination.ordering)
+        if search:
+            engine = get_search_engine()
+            queryset = engine.rank_posts(queryset, search)
+            if sort not in self.sort_orderings:
+                self.keyset_ordering = engine.rank_ordering
         
-        # 置顶帖子优先
-        queryset = queryset.order_by('-is_top', '-created_at')
+        # 排序：默认置顶优先；热度排序在无搜索条件时优先走内存榜单
+        if sort == 'hot' and not search:
+            self.hot_leaderboard = hot_ranking.get_board(int(tieba_id) if tieba_id else None)
         
-        return queryset
+        return queryset.order_by(*self.keyset_ordering)
 
 class PostDetailView(generics.RetrieveAPIView):
     """获取帖子详情"""
-    queryset = Post.objects.select_related('author', 'tieba').annotate(
-        annotated_like_count=Count('likes'),
-        annotated_reply_count=Count('replies')
-    ).filter(status='published')
+    queryset = Post.objects.select_related('author', 'tieba').prefetch_related('images').filter(status='published')
     serializer_class = PostDetailSerializer
     permission_classes = [permissions.AllowAny]
     
-    def get(self, request, *args, **kwargs):
-        # 记录浏览历史
+    def retrieve(self, request, *args, **kwargs):
         post = self.get_object()
-        if request.user.is_authenticated:
-            PostViewHistory.objects.create(user=request.user, post=post)
+        # 浏览量和浏览历史先进缓冲，批量写库
+        view_buffer.record(post.pk, request.user, get_client_ip(request))
         
-        return super().get(request, *args, **kwargs)
+        serializer = self.get_serializer(post)
+        return Response(serializer.data)
 
 class PostCreateView(generics.CreateAPIView):
     """创建帖子"""
@@ -74,9 +85,8 @@ class PostCreateView(generics.CreateAPIView):
         tieba = serializer.validated_data['tieba']
         if not tieba.is_public:
             # 对于非公开贴吧，需要检查成员身份
-            from tiebas.models import TiebaMember
             if not TiebaMember.objects.filter(user=self.request.user, tieba=tieba).exists():
-                raise serializers.ValidationError("您不是该贴吧的成员，无法发帖")
+                raise ValidationError("您不是该贴吧的成员，无法发帖")
         
         serializer.save(author=self.request.user)
 
@@ -104,14 +114,10 @@ class PostLikeView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, id=kwargs['pk'])
-        
-        # 检查是否已经点赞
-        if PostLike.objects.filter(user=request.user, post=post).exists():
-            return Response({'error': '已经点赞过该帖子'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 点赞
-        PostLike.objects.create(user=request.user, post=post)
+        # 点赞（已经点赞过时不变）：一条 INSERT，同时确认帖子存在；没有插入时再区分 404
+        if add_relation(PostLike, Post.objects.filter(pk=kwargs['pk']), user=request.user, post_id=kwargs['pk']) is None:
+            get_object_or_404(Post.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '已经点赞过该帖子'}, status=status.HTTP_200_OK)
         return Response({'message': '点赞成功'}, status=status.HTTP_201_CREATED)
 
 class PostUnlikeView(generics.DestroyAPIView):
@@ -119,25 +125,24 @@ class PostUnlikeView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, id=kwargs['pk'])
-        like = get_object_or_404(PostLike, user=request.user, post=post)
-        
-        like.delete()
+        # 没有点赞过时不变；没有删除任何行时再确认帖子存在，不存在仍返回 404
+        if remove_relation(PostLike, user=request.user, post=kwargs['pk']) is None:
+            get_object_or_404(Post.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '未点赞过该帖子'}, status=status.HTTP_200_OK)
         return Response({'message': '取消点赞成功'}, status=status.HTTP_200_OK)
+    
+    def post(self, request, *args, **kwargs):
+        return self.delete(request, *args, **kwargs)
 
 class PostFavoriteView(generics.CreateAPIView):
     """收藏帖子"""
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, id=kwargs['pk'])
-        
-        # 检查是否已经收藏
-        if PostFavorite.objects.filter(user=request.user, post=post).exists():
-            return Response({'error': '已经收藏过该帖子'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 收藏
-        PostFavorite.objects.create(user=request.user, post=post)
+        # 收藏（已经收藏过时不变）：一条 INSERT，同时确认帖子存在；没有插入时再区分 404
+        if add_relation(PostFavorite, Post.objects.filter(pk=kwargs['pk']), user=request.user, post_id=kwargs['pk']) is None:
+            get_object_or_404(Post.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '已经收藏过该帖子'}, status=status.HTTP_200_OK)
         return Response({'message': '收藏成功'}, status=status.HTTP_201_CREATED)
 
 class PostUnfavoriteView(generics.DestroyAPIView):
@@ -145,11 +150,14 @@ class PostUnfavoriteView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, id=kwargs['pk'])
-        favorite = get_object_or_404(PostFavorite, user=request.user, post=post)
-        
-        favorite.delete()
+        # 没有收藏过时不变；不存在的帖子返回 404
+        if remove_relation(PostFavorite, user=request.user, post=kwargs['pk']) is None:
+            get_object_or_404(Post.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '未收藏过该帖子'}, status=status.HTTP_200_OK)
         return Response({'message': '取消收藏成功'}, status=status.HTTP_200_OK)
+    
+    def post(self, request, *args, **kwargs):
+        return self.delete(request, *args, **kwargs)
 
 class ReplyCreateView(generics.CreateAPIView):
     """创建回复"""
@@ -165,14 +173,10 @@ class ReplyLikeView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        reply = get_object_or_404(Reply, id=kwargs['pk'])
-        
-        # 检查是否已经点赞
-        if ReplyLike.objects.filter(user=request.user, reply=reply).exists():
-            return Response({'error': '已经点赞过该回复'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 点赞
-        ReplyLike.objects.create(user=request.user, reply=reply)
+        # 点赞（已经点赞过时不变）：一条 INSERT，同时确认回复存在；没有插入时再区分 404
+        if add_relation(ReplyLike, Reply.objects.filter(pk=kwargs['pk']), user=request.user, reply_id=kwargs['pk']) is None:
+            get_object_or_404(Reply.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '已经点赞过该回复'}, status=status.HTTP_200_OK)
         return Response({'message': '点赞成功'}, status=status.HTTP_201_CREATED)
 
 class ReplyUnlikeView(generics.DestroyAPIView):
@@ -180,20 +184,20 @@ class ReplyUnlikeView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        reply = get_object_or_404(Reply, id=kwargs['pk'])
-        like = get_object_or_404(ReplyLike, user=request.user, reply=reply)
-        
-        like.delete()
+        # 没有点赞过时不变；不存在的回复返回 404
+        if remove_relation(ReplyLike, user=request.user, reply=kwargs['pk']) is None:
+            get_object_or_404(Reply.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '未点赞过该回复'}, status=status.HTTP_200_OK)
         return Response({'message': '取消点赞成功'}, status=status.HTTP_200_OK)
+    
+    def post(self, request, *args, **kwargs):
+        return self.delete(request, *args, **kwargs)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_posts(request):
     """获取用户发布的帖子列表"""
-    posts = Post.objects.filter(author=request.user).select_related('tieba').annotate(
-        like_count=Count('likes'),
-        reply_count=Count('replies')
-    ).order_by('-created_at')
+    posts = Post.objects.filter(author=request.user).select_related('author', 'tieba').prefetch_related('images').order_by('-created_at')
     serializer = PostSerializer(posts, many=True, context={'request': request})
     return Response(serializer.data)
 
@@ -209,17 +213,19 @@ def user_favorites(request):
 @permission_classes([permissions.IsAuthenticated])
 def user_view_history(request):
     """获取用户浏览历史"""
-    history = PostViewHistory.objects.filter(user=request.user).select_related('post', 'post__tieba').order_by('-viewed_at')[:50]
+    history = PostViewHistory.objects.filter(user=request.user).select_related('post', 'post__author').order_by('-created_at')[:50]
     serializer = PostViewHistorySerializer(history, many=True)
     return Response(serializer.data)
 
-class ReplyListView(generics.ListAPIView):
+class ReplyListView(ResponseCacheMixin, generics.ListAPIView):
     """获取帖子的回复列表"""
     serializer_class = ReplySerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ReplyKeysetPagination
+    
+    def get_cache_scopes(self):
+        return [f"post:{self.kwargs['pk']}:replies"]
     
     def get_queryset(self):
         post = get_object_or_404(Post, id=self.kwargs['pk'])
-        return Reply.objects.filter(post=post, parent__isnull=True).select_related('author').annotate(
-            like_count=Count('likes')
-        ).order_by('created_at')
\ No newline at end of file
+        return Reply.objects.filter(post=post, parent__isnull=True).select_related('author').order_by('floor', 'id')
\ No newline at end of file
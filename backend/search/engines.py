@@ -0,0 +1,220 @@
+"""全文搜索引擎
+
+SQLite 下使用 FTS5 虚拟表（文本先经 tokenizer 切成单字/二元组再入索引），
+按 bm25 排序；其他数据库退回到 icontains 扫描的 LikeSearchEngine。
+
+索引表 rowid 编码对象：帖子为 id * 2，回复为 id * 2 + 1，
+单条更新、删除都是按 rowid 的点操作。
+"""
+
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from posts.models import Post, Reply
+from .tokenizer import tokenize_for_index, tokenize_for_query
+
+KIND_POST = 'post'
+KIND_REPLY = 'reply'
+KIND_PARITY = {KIND_POST: 0, KIND_REPLY: 1}
+
+FTS_TABLE = 'search_fts'
+
+class BaseSearchEngine(ABC):
+    """搜索引擎接口；子类必须实现 search 和 filter_posts，索引维护方法默认为空操作"""
+
+    def index_post(self, post):
+        pass
+
+    def index_reply(self, reply):
+        pass
+
+    def remove(self, kind, object_id):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+    # rank_posts 附加的相关度列 search_rank 对应的排序，最后一列必须唯一
+    rank_ordering = ('-search_rank', '-id')
+
+    @abstractmethod
+    def search(self, query, kind=KIND_POST, tieba_id=None, offset=0, limit=20):
+        """返回 (总数, 按相关度排序的对象 id 列表)"""
+
+    @abstractmethod
+    def filter_posts(self, queryset, query):
+        """把帖子查询集限制为匹配 query 的帖子"""
+
+    @abstractmethod
+    def rank_posts(self, queryset, query):
+        """同 filter_posts，并附加可按 rank_ordering 排序的相关度列 search_rank"""
+
+class FTS5SearchEngine(BaseSearchEngine):
+    # bm25 列权重：标题命中比正文重要
+    title_weight = 10.0
+    body_weight = 1.0
+    # bm25 越小越相关
+    rank_ordering = ('search_rank', '-id')
+
+    def _rowid(self, kind, object_id):
+        return object_id * 2 + KIND_PARITY[kind]
+
+    def _match_expression(self, query):
+        tokens = tokenize_for_query(query)
+        if not tokens:
+            return None
+        return ' '.join(f'"{token}"' for token in tokens)
+
+    def index_post(self, post):
+        """帖子下架时连同回复一起移出索引，重新上架时把回复补回来"""
+        rowid = self._rowid(KIND_POST, post.pk)
+        if post.status != 'published':
+            reply_ids = Reply.objects.filter(post_id=post.pk).values_list('id', flat=True)
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [(rowid,)] + [(self._rowid(KIND_REPLY, reply_id),) for reply_id in reply_ids.iterator()],
+                )
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {FTS_TABLE} WHERE rowid = %s', [rowid])
+            indexed = cursor.fetchone() is not None
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, title, body, tieba_id, post_id) VALUES (%s, %s, %s, %s, %s)',
+                [rowid, tokenize_for_index(post.title), tokenize_for_index(post.content), post.tieba_id, post.pk],
+            )
+        if not indexed:
+            for reply in Reply.objects.filter(post_id=post.pk, status='published').only('id', 'post_id', 'content'):
+                self.index_reply(reply)
+
+    def index_reply(self, reply):
+        if reply.status != 'published':
+            self.remove(KIND_REPLY, reply.pk)
+            return
+        rowid = self._rowid(KIND_REPLY, reply.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, title, body, tieba_id, post_id) '
+                f'SELECT %s, %s, %s, tieba_id, id FROM {Post._meta.db_table} WHERE id = %s',
+                [rowid, '', tokenize_for_index(reply.content), reply.post_id],
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [self._rowid(kind, object_id)])
+
+    def rebuild(self, batch_size=1000):
+        insert_sql = f'INSERT INTO {FTS_TABLE}(rowid, title, body, tieba_id, post_id) VALUES (%s, %s, %s, %s, %s)'
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+            rows = []
+            posts = Post.objects.filter(status='published').values_list('id', 'tieba_id', 'title', 'content')
+            for post_id, tieba_id, title, content in posts.iterator(chunk_size=batch_size):
+                rows.append((self._rowid(KIND_POST, post_id), tokenize_for_index(title),
+                             tokenize_for_index(content), tieba_id, post_id))
+                if len(rows) >= batch_size:
+                    cursor.executemany(insert_sql, rows)
+                    total += len(rows)
+                    rows = []
+
+            replies = Reply.objects.filter(status='published').values_list('id', 'post__tieba_id', 'post_id', 'content')
+            for reply_id, tieba_id, post_id, content in replies.iterator(chunk_size=batch_size):
+                rows.append((self._rowid(KIND_REPLY, reply_id), '', tokenize_for_index(content), tieba_id, post_id))
+                if len(rows) >= batch_size:
+                    cursor.executemany(insert_sql, rows)
+                    total += len(rows)
+                    rows = []
+
+            if rows:
+                cursor.executemany(insert_sql, rows)
+                total += len(rows)
+        return total
+
+    def search(self, query, kind=KIND_POST, tieba_id=None, offset=0, limit=20):
+        match = self._match_expression(query)
+        if match is None:
+            return 0, []
+
+        where = f'{FTS_TABLE} MATCH %s AND (rowid %% 2) = %s'
+        params = [match, KIND_PARITY[kind]]
+        if tieba_id is not None:
+            where += ' AND tieba_id = %s'
+            params.append(tieba_id)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {where}', params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {where} '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s',
+                params + [self.title_weight, self.body_weight, limit, offset],
+            )
+            ids = [rowid // 2 for (rowid,) in cursor.fetchall()]
+        return total, ids
+
+    def filter_posts(self, queryset, query):
+        match = self._match_expression(query)
+        if match is None:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid / 2 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND (rowid %% 2) = 0', [match]
+        ))
+
+    def rank_posts(self, queryset, query):
+        match = self._match_expression(query)
+        if match is None:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        # 按 rowid 点查，只对已经命中的帖子计算 bm25
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {Post._meta.db_table}.id * 2',
+            [self.title_weight, self.body_weight, match], output_field=FloatField(),
+        )
+        return self.filter_posts(queryset, query).annotate(search_rank=rank)
+
+class LikeSearchEngine(BaseSearchEngine):
+    """非 SQLite 数据库的兜底实现：icontains 扫描，标题命中排在前面"""
+
+    def search(self, query, kind=KIND_POST, tieba_id=None, offset=0, limit=20):
+        if kind == KIND_POST:
+            queryset = self.rank_posts(Post.objects.filter(status='published'), query)
+            if tieba_id is not None:
+                queryset = queryset.filter(tieba_id=tieba_id)
+            queryset = queryset.order_by(*self.rank_ordering)
+        else:
+            queryset = Reply.objects.filter(status='published', content__icontains=query)
+            if tieba_id is not None:
+                queryset = queryset.filter(post__tieba_id=tieba_id)
+            queryset = queryset.order_by('-id')
+        total = queryset.count()
+        return total, list(queryset.values_list('id', flat=True)[offset:offset + limit])
+
+    def filter_posts(self, queryset, query):
+        return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+
+    def rank_posts(self, queryset, query):
+        return self.filter_posts(queryset, query).annotate(search_rank=Case(
+            When(title__icontains=query, then=Value(2)), default=Value(1), output_field=IntegerField()
+        ))
+
+_engine = None
+
+def fts5_available():
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+def get_search_engine():
+    """按配置和数据库能力选择搜索引擎（SEARCH_ENGINE: auto / fts5 / like）"""
+    global _engine
+    if _engine is None:
+        choice = getattr(settings, 'SEARCH_ENGINE', 'auto')
+        if choice == 'fts5' or (choice == 'auto' and fts5_available()):
+            _engine = FTS5SearchEngine()
+        else:
+            _engine = LikeSearchEngine()
+    return _engine
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""搜索结果高亮与摘要"""
+
+import re
+from django.utils.html import escape
+from .tokenizer import CJK_RE, bigrams, split_segments
+
+def build_pattern(query):
+    """匹配查询中的整串及其二元组，优先匹配更长的片段"""
+    terms = set()
+    for segment in split_segments(query):
+        terms.add(segment)
+        if CJK_RE.match(segment):
+            terms.update(bigrams(segment))
+    if not terms:
+        return None
+    alternatives = sorted(terms, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(term) for term in alternatives), re.IGNORECASE)
+
+def highlight(text, pattern, tag='em'):
+    """HTML 转义后用 <em> 包裹命中片段"""
+    text = text or ''
+    if pattern is None:
+        return escape(text)
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f'<{tag}>{escape(match.group())}</{tag}>')
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return ''.join(parts)
+
+def snippet(text, pattern, length=80):
+    """截取第一个命中位置附近的一段文字并高亮"""
+    text = text or ''
+    match = pattern.search(text) if pattern is not None else None
+    start = max(0, match.start() - length // 4) if match else 0
+    end = min(len(text), start + length)
+    fragment = text[start:end]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return prefix + highlight(fragment, pattern) + suffix
\ No newline at end of file
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from search.engines import get_search_engine
+
+class Command(BaseCommand):
+    help = '重建帖子和回复的全文搜索索引'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入索引的行数')
+    
+    def handle(self, *args, **options):
+        engine = get_search_engine()
+        total = engine.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{type(engine).__name__}: 已索引 {total} 条'))
\ No newline at end of file
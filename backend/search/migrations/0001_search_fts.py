@@ -0,0 +1,32 @@
+from django.db import migrations
+
+FTS_TABLE = 'search_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 只在 SQLite 下启用，其他数据库由 LikeSearchEngine 兜底
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"title, body, tieba_id UNINDEXED, post_id UNINDEXED, tokenize='unicode61')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0003_post_last_floor'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,34 @@
+from rest_framework import serializers
+from posts.models import Post, Reply
+from .highlight import highlight, snippet
+
+class PostSearchResultSerializer(serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.username', read_only=True)
+    tieba_name = serializers.CharField(source='tieba.name', read_only=True)
+    highlighted_title = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Post
+        fields = [
+            'id', 'title', 'highlighted_title', 'snippet', 'author', 'author_name',
+            'tieba', 'tieba_name', 'reply_count', 'like_count', 'created_at'
+        ]
+    
+    def get_highlighted_title(self, obj):
+        return highlight(obj.title, self.context.get('pattern'))
+    
+    def get_snippet(self, obj):
+        return snippet(obj.content, self.context.get('pattern'))
+
+class ReplySearchResultSerializer(serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.username', read_only=True)
+    post_title = serializers.CharField(source='post.title', read_only=True)
+    snippet = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Reply
+        fields = ['id', 'post', 'post_title', 'floor', 'snippet', 'author', 'author_name', 'created_at']
+    
+    def get_snippet(self, obj):
+        return snippet(obj.content, self.context.get('pattern'))
\ No newline at end of file
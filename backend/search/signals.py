@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from posts.models import Post, Reply
+from .engines import KIND_POST, KIND_REPLY, get_search_engine
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_engine().index_post(instance)
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_search_engine().remove(KIND_POST, instance.pk)
+
+@receiver(post_save, sender=Reply)
+def index_reply(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_engine().index_reply(instance)
+
+@receiver(post_delete, sender=Reply)
+def unindex_reply(sender, instance, **kwargs):
+    get_search_engine().remove(KIND_REPLY, instance.pk)
\ No newline at end of file
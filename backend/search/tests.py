@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from posts.models import Post, Reply
+from tiebas.models import Tieba
+from users.models import User
+from .engines import KIND_POST, KIND_REPLY, FTS5SearchEngine, LikeSearchEngine, get_search_engine
+from .highlight import build_pattern, highlight, snippet
+from .tokenizer import tokenize_for_index, tokenize_for_query
+
+class TokenizerTests(TestCase):
+    def test_index_tokens(self):
+        self.assertEqual(tokenize_for_index('百度贴吧 Hello, World2'), '百 度 贴 吧 百度 度贴 贴吧 hello world2')
+
+    def test_query_tokens(self):
+        self.assertEqual(tokenize_for_query('贴吧贴吧'), ['贴吧', '吧贴'])
+        self.assertEqual(tokenize_for_query('吧 Vue'), ['吧', 'vue'])
+        self.assertEqual(tokenize_for_query('!!! ...'), [])
+
+class HighlightTests(TestCase):
+    def test_escapes_text_around_matches(self):
+        pattern = build_pattern('贴吧')
+        self.assertEqual(highlight('<b>贴吧</b>', pattern), '&lt;b&gt;<em>贴吧</em>&lt;/b&gt;')
+        self.assertEqual(
+            highlight('<script>alert("x")</script>', build_pattern('<script>')),
+            '&lt;<em>script</em>&gt;alert(&quot;x&quot;)&lt;/<em>script</em>&gt;',
+        )
+        self.assertEqual(highlight('<i>x</i>', None), '&lt;i&gt;x&lt;/i&gt;')
+
+    def test_longest_match_wins(self):
+        self.assertEqual(highlight('百度贴吧', build_pattern('度贴吧')), '百<em>度贴吧</em>')
+
+    def test_snippet_centers_on_first_match(self):
+        text = 'a' * 100 + '<关键词>' + 'b' * 100
+        result = snippet(text, build_pattern('关键词'), length=40)
+        self.assertTrue(result.startswith('…') and result.endswith('…'))
+        self.assertIn('&lt;<em>关键词</em>&gt;', result)
+        self.assertNotIn('<关', result)
+
+class SearchEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='x', nickname='author')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.author)
+        self.body_hit = Post.objects.create(tieba=self.tieba, author=self.author, title='闲聊', content='今天聊聊贴吧的历史')
+        self.title_hit = Post.objects.create(tieba=self.tieba, author=self.author, title='贴吧历史', content='正文')
+        self.miss = Post.objects.create(tieba=self.tieba, author=self.author, title='无关', content='无关内容')
+        self.reply = Reply.objects.create(post=self.miss, author=self.author, content='回复里也提到贴吧历史')
+
+    def test_fts5_is_used_on_sqlite(self):
+        self.assertIsInstance(get_search_engine(), FTS5SearchEngine)
+
+    def test_title_hits_rank_first(self):
+        for engine in (FTS5SearchEngine(), LikeSearchEngine()):
+            total, ids = engine.search('贴吧历史')
+            self.assertEqual((total, ids), (1, [self.title_hit.pk]), engine)
+            total, ids = engine.search('历史')
+            self.assertEqual((total, ids), (2, [self.title_hit.pk, self.body_hit.pk]), engine)
+            self.assertEqual(engine.search('历史', kind=KIND_REPLY), (1, [self.reply.pk]), engine)
+
+    def test_post_list_search_orders_by_rank(self):
+        # 标题命中的帖子 id 更小时，只有按相关度排才会排在前面
+        older = Post.objects.create(tieba=self.tieba, author=self.author, title='历史', content='正文')
+        newer = Post.objects.create(tieba=self.tieba, author=self.author, title='无关', content='历史')
+        url, params, seen = '/api/posts/', {'search': '历史', 'page_size': 1}, []
+        while url:
+            response = APIClient().get(url, params)
+            params = None
+            self.assertEqual(response.status_code, 200)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen[0], older.pk)
+        self.assertEqual(sorted(seen), sorted([self.body_hit.pk, self.title_hit.pk, older.pk, newer.pk]))
+        self.assertLess(seen.index(older.pk), seen.index(newer.pk))
+
+        Post.objects.filter(pk=older.pk).update(like_count=1)
+        Post.objects.filter(pk=newer.pk).update(like_count=2)
+        cache.clear()
+        response = APIClient().get('/api/posts/', {'search': '历史', 'sort': 'like_count'})
+        self.assertEqual(
+            [post['id'] for post in response.data['results']],
+            [newer.pk, older.pk, self.title_hit.pk, self.body_hit.pk],
+        )
+
+    def test_unpublished_post_takes_its_replies_out_of_the_index(self):
+        engine = get_search_engine()
+        self.miss.status = 'deleted'
+        self.miss.save()
+        self.assertEqual(engine.search('历史', kind=KIND_REPLY), (0, []))
+
+        self.miss.status = 'published'
+        self.miss.save()
+        self.assertEqual(engine.search('历史', kind=KIND_REPLY), (1, [self.reply.pk]))
+        self.assertEqual(engine.search('无关', kind=KIND_POST), (1, [self.miss.pk]))
+
+    def test_search_view_escapes_highlight(self):
+        Post.objects.create(tieba=self.tieba, author=self.author, title='<img src=x>标签', content='<b>标签</b>')
+        response = APIClient().get('/api/search/', {'q': '标签'})
+        self.assertEqual(response.status_code, 200)
+        result = response.data['results'][0]
+        self.assertEqual(result['highlighted_title'], '&lt;img src=x&gt;<em>标签</em>')
+        self.assertEqual(result['snippet'], '&lt;b&gt;<em>标签</em>&lt;/b&gt;')
@@ -0,0 +1,35 @@
+"""中文友好的分词：汉字切成单字 + 二元组（bigram），字母数字按词切分并转小写"""
+
+import re
+
+CJK_CHARS = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(f'[{CJK_CHARS}]+|[0-9a-z]+')
+CJK_RE = re.compile(f'[{CJK_CHARS}]')
+
+def split_segments(text):
+    """切出连续的汉字串和字母数字串"""
+    return TOKEN_RE.findall((text or '').lower())
+
+def bigrams(segment):
+    return [segment[i:i + 2] for i in range(len(segment) - 1)]
+
+def tokenize_for_index(text):
+    """建索引用：汉字串同时写入单字和二元组，单字查询也能命中"""
+    tokens = []
+    for segment in split_segments(text):
+        if CJK_RE.match(segment):
+            tokens.extend(segment)
+            tokens.extend(bigrams(segment))
+        else:
+            tokens.append(segment)
+    return ' '.join(tokens)
+
+def tokenize_for_query(text):
+    """查询用：多字汉字串只用二元组，单字用单字"""
+    tokens = []
+    for segment in split_segments(text):
+        if CJK_RE.match(segment) and len(segment) > 1:
+            tokens.extend(bigrams(segment))
+        else:
+            tokens.append(segment)
+    return list(dict.fromkeys(tokens))
\ No newline at end of file
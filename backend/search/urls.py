@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.SearchView.as_view(), name='search'),
+]
\ No newline at end of file
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+from posts.models import Post, Reply
+from .engines import KIND_POST, KIND_REPLY, get_search_engine
+from .highlight import build_pattern
+from .serializers import PostSearchResultSerializer, ReplySearchResultSerializer
+
+class SearchView(APIView):
+    """全文搜索帖子或回复，按相关度排序并高亮命中片段"""
+    permission_classes = [permissions.AllowAny]
+    max_page_size = 50
+    
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type', KIND_POST)
+        if kind not in (KIND_POST, KIND_REPLY):
+            return Response({'error': '不支持的搜索类型'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', api_settings.PAGE_SIZE)), 1), self.max_page_size)
+            tieba_id = int(request.query_params['tieba']) if request.query_params.get('tieba') else None
+        except ValueError:
+            return Response({'error': '参数格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        total, ids = 0, []
+        if query:
+            total, ids = get_search_engine().search(
+                query, kind=kind, tieba_id=tieba_id, offset=(page - 1) * page_size, limit=page_size
+            )
+        
+        if kind == KIND_POST:
+            objects = Post.objects.select_related('author', 'tieba').in_bulk(ids)
+            serializer_class = PostSearchResultSerializer
+        else:
+            objects = Reply.objects.select_related('author', 'post').in_bulk(ids)
+            serializer_class = ReplySearchResultSerializer
+        results = [objects[pk] for pk in ids if pk in objects]
+        serializer = serializer_class(results, many=True, context={'request': request, 'pattern': build_pattern(query)})
+        
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, 'page', page + 1) if page * page_size < total else None
+        previous_link = None
+        if page > 1:
+            previous_link = replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')
+        return Response(OrderedDict([
+            ('count', total),
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', serializer.data),
+        ]))
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+ASGI config for tieba_backend project.
+
+HTTP 请求交给 Django，/ws/chat/ 上的 WebSocket 连接交给私信实时推送。
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tieba_backend.settings')
+
+django_application = get_asgi_application()
+
+from chat.websocket import websocket_application  # noqa: E402  需在 Django 初始化之后导入
+
+chat_websocket = websocket_application()
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'].rstrip('/') == '/ws/chat':
+            return await chat_websocket(scope, receive, send)
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 4404})
+    return await django_application(scope, receive, send)
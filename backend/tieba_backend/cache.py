@@ -0,0 +1,111 @@
+"""匿名只读接口的响应缓存
+
+缓存键由请求路径、规范化后的查询参数以及若干“作用域”的版本号组成。
+作用域（如 tieba:3:posts）的版本号一变，旧键全部失效，无需逐个删除：
+某个贴吧发了新帖，只需 bump 该贴吧的帖子列表作用域。
+
+缓存的是序列化后的 data，并附带 ETag / Last-Modified，
+客户端带 If-None-Match / If-Modified-Since 时直接返回 304。
+
+版本号存放在 default 缓存中，多进程部署时必须配置共享的缓存后端
+（CACHE_BACKEND=file/db）；locmem 下其他 worker 看不到版本号变化，会继续返回旧响应。
+"""
+
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+SCOPE_KEY_PREFIX = 'scope:'
+RESPONSE_KEY_PREFIX = 'response:'
+
+def _scope_key(scope):
+    return SCOPE_KEY_PREFIX + scope
+
+def get_scope_versions(scopes):
+    """批量读取作用域版本号，缺失的用当前时间初始化（避免与被淘汰前的旧版本号重合）"""
+    keys = [_scope_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+def bump_cache_scopes(*scopes):
+    """使这些作用域下的所有缓存响应失效"""
+    for scope in scopes:
+        key = _scope_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+def normalize_query_params(query_params):
+    """按键排序、去掉空值，保证参数顺序不同的同一请求命中同一缓存"""
+    items = []
+    for key in sorted(query_params.keys()):
+        for value in sorted(query_params.getlist(key)):
+            if value != '':
+                items.append((key, value))
+    return items
+
+class ResponseCacheMixin:
+    """为 AllowAny 的只读视图缓存匿名用户的 GET 响应
+
+    子类通过 get_cache_scopes() 声明响应所依赖的作用域。
+    """
+    cache_timeout = None
+
+    def get_cache_scopes(self):
+        return []
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+    def get_response_cache_key(self, request):
+        scopes = self.get_cache_scopes()
+        raw = json.dumps([
+            request.path,
+            normalize_query_params(request.query_params),
+            list(zip(scopes, get_scope_versions(scopes))),
+        ], ensure_ascii=False)
+        return RESPONSE_KEY_PREFIX + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated or self.get_cache_timeout() <= 0:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(response.data, cls=JSONEncoder, sort_keys=True)
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, entry, self.get_cache_timeout())
+
+        headers = {'ETag': entry['etag'], 'Last-Modified': http_date(entry['last_modified'])}
+        if self._not_modified(request, entry):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    def _not_modified(self, request, entry):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [etag.strip() for etag in if_none_match.split(',')]
+            return entry['etag'] in etags or '*' in etags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and entry['last_modified'] <= if_modified_since
\ No newline at end of file
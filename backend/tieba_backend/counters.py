@@ -0,0 +1,72 @@
+"""反规范化计数器
+
+列表页直接读取 like_count、member_count 等计数列，不再对关联表做 COUNT 聚合。
+每个 Counter 描述一条 "source 表的一行 => target 行的计数列 +1" 关系，
+在 source 行创建/删除时用 F() 原子更新，并提供批量校正漂移的 reconcile。
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+
+class Counter:
+    registry = []
+
+    def __init__(self, source, fk_name, target_field):
+        self.source = source
+        self.fk_name = fk_name
+        self.fk_attname = source._meta.get_field(fk_name).attname
+        self.target = source._meta.get_field(fk_name).related_model
+        self.target_field = target_field
+
+        uid = 'counter:%s.%s:%s' % (source._meta.label, fk_name, target_field)
+        post_save.connect(self._on_save, sender=source, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._on_delete, sender=source, weak=False, dispatch_uid=uid)
+        Counter.registry.append(self)
+
+    def __str__(self):
+        return '%s.%s' % (self.target._meta.label, self.target_field)
+
+    def adjust(self, target_id, delta):
+        """原子地调整一行的计数"""
+        if not target_id or not delta:
+            return
+        self.target.objects.filter(pk=target_id).update(
+            **{self.target_field: F(self.target_field) + delta}
+        )
+
+    def _on_save(self, sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            self.adjust(getattr(instance, self.fk_attname), 1)
+
+    def _on_delete(self, sender, instance, origin=None, **kwargs):
+        # 目标行本身正在被级联删除时无需再更新计数
+        origin_model = getattr(origin, 'model', type(origin))
+        if origin is not None and origin_model is self.target:
+            return
+        self.adjust(getattr(instance, self.fk_attname), -1)
+
+    def actual_count(self):
+        """按 source 表实时统计的计数表达式"""
+        counts = self.source.objects.filter(
+            **{self.fk_name: OuterRef('pk')}
+        ).order_by().values(self.fk_name).annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(counts), 0)
+
+    def reconcile(self, batch_size=1000):
+        """按主键分批校正计数列，返回修正的行数"""
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = self.target.objects.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            actual = self.actual_count()
+            fixed += self.target.objects.filter(pk__in=pks).exclude(
+                **{self.target_field: actual}
+            ).update(**{self.target_field: actual})
+        return fixed
\ No newline at end of file
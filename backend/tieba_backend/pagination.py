@@ -0,0 +1,145 @@
+"""通用分页类"""
+
+import base64
+import json
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """游标（keyset）分页
+
+    按 ordering 中的字段组合定位，用 WHERE 条件代替 OFFSET，且不执行 COUNT。
+    ordering 的最后一个字段必须唯一（通常是 id），游标对客户端不透明。
+    排序键可以是模型字段，也可以是查询集上 annotate 出来的列。
+
+    视图可以通过 keyset_ordering 属性按请求参数改用其他排序。
+    请求带 page 参数时退回页码分页，供管理后台等需要总数和跳页的场景使用。
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = '无效的游标'
+    page_number_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+        self.page_number_paginator = None
+        if self.page_number_class is not None and self.page_number_class.page_query_param in request.query_params:
+            self.page_number_paginator = self.page_number_class()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request, queryset)
+
+        ordering = self.get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(ordering, position))
+
+        results = self.fetch(queryset, ordering, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def fetch(self, queryset, ordering, limit):
+        """取排好序的前 limit 行；子类可以改用其他方式取数"""
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return tuple(self.ordering)
+        return tuple(key[1:] if key.startswith('-') else '-' + key for key in self.ordering)
+
+    def get_position_filter(self, ordering, position):
+        """构造 (a, b, c) > (x, y, z) 形式的字典序比较条件"""
+        condition = Q()
+        for index, key in enumerate(ordering):
+            name = key.lstrip('-')
+            lookup = '%s__%s' % (name, 'lt' if key.startswith('-') else 'gt')
+            term = Q(**{lookup: position[index]})
+            for prev_key, value in zip(ordering[:index], position[:index]):
+                term &= Q(**{prev_key.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for key in self.ordering:
+            name = key.lstrip('-')
+            try:
+                position.append(instance._meta.get_field(name).value_to_string(instance))
+            except FieldDoesNotExist:
+                position.append(getattr(instance, name))
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_ordering_field(self, queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            raw_position = payload['p']
+            reverse = bool(payload.get('r'))
+            if len(raw_position) != len(self.ordering):
+                raise ValueError
+            fields = [self.get_ordering_field(queryset, key.lstrip('-')) for key in self.ordering]
+            position = [field.to_python(value) for field, value in zip(fields, raw_position)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
@@ -0,0 +1,217 @@
+"""唯一关系（点赞、收藏、关注、加入贴吧）的幂等增删
+
+原先的写法是 exists() 再 create()：两次往返，并发的重复点击会撞上唯一约束返回 500，
+删除时两个请求都查到同一行，还会各发一次 post_delete，计数被减两次。
+这里每次变更只执行一条语句，并由数据库告知这一行是否真的变化了：
+- add_relation：INSERT ... ON CONFLICT DO NOTHING RETURNING，返回新建的实例，已存在返回 None；
+  只忽略唯一约束冲突，NOT NULL、CHECK、外键等错误照常抛出 IntegrityError。
+  关联对象直接按请求中的主键写入时，用 INSERT ... SELECT ... WHERE EXISTS 在同一条语句中确认其存在
+  （SQLite 的外键检查推迟到提交时，不能依赖外键错误），不存在同样返回 None，由调用方再区分 404
+- add_relations：同上的多行 INSERT，返回真正插入的实例列表，用于一次签到多个贴吧等批量场景
+- remove_relation：DELETE ... RETURNING，返回被删除的实例，不存在返回 None；
+  被删除的行有级联时（如成员的签到日志），能直接删除的级联行先用一条 DELETE ... IN (子查询) 删除
+
+只有真正插入/删除了一行才发送 post_save(created=True) / post_delete（不发送 pre_save / pre_delete），
+计数器（Counter.adjust）、热度、通知、缓存失效等接收器因此只在关系确实变化时执行一次。
+只在 PostgreSQL 和 SQLite 3.35+ 上手写 SQL；其他数据库，或级联需要 ORM 处理（SET_NULL、有信号接收器等）时，
+退回到保存点 + create / 加锁读取后 ORM 删除，行为相同。
+"""
+
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_delete, post_save
+
+def supports_returning(connection):
+    """INSERT ... ON CONFLICT DO NOTHING 和 DELETE ... RETURNING 都可用"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        # SQLite 3.35 起支持 RETURNING，与 INSERT ... RETURNING 是同一版本
+        return connection.features.can_return_columns_from_insert
+    return False
+
+def add_relation(model, *conditions, **values):
+    """插入一行关系，返回新建的实例；唯一约束冲突（已存在）时返回 None
+
+    conditions 为必须各自至少匹配一行的查询集，如 Post.objects.filter(pk=pk)；任一不匹配时不插入，返回 None。
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    instance = model(**values)
+    meta = model._meta
+    if not supports_returning(connection):
+        try:
+            with transaction.atomic(using=using):
+                if not all(condition.using(using).exists() for condition in conditions):
+                    return None
+                instance.save(force_insert=True, using=using)
+        except IntegrityError:
+            # 只把唯一约束冲突当作已存在
+            if not model._base_manager.using(using).filter(**values).exists():
+                raise
+            return None
+        return instance
+
+    fields = _insert_fields(model)
+    params = _insert_params(connection, fields, [instance])
+    returning = meta.db_returning_fields
+    if conditions:
+        sql, params = _guarded_insert(model, connection, fields, returning, params, conditions, using)
+    else:
+        sql = _insert_sql(model, connection, fields, returning, 1)
+    # 关系变更与接收器中的计数更新在同一事务中提交
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        for field, value in zip(returning, _convert_row(model, connection, returning, row)):
+            setattr(instance, field.attname, value)
+        instance._state.adding = False
+        instance._state.db = using
+        post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+    return instance
+
+def add_relations(model, rows):
+    """批量插入关系（rows 为字段值字典的列表），返回真正插入的实例列表；唯一约束冲突（已存在）的行跳过"""
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if not supports_returning(connection):
+        return [instance for instance in (add_relation(model, **values) for values in rows) if instance is not None]
+
+    meta = model._meta
+    instances = [model(**values) for values in rows]
+    fields = _insert_fields(model)
+    returning = list(meta.concrete_fields)
+    batch_size = connection.ops.bulk_batch_size(fields, instances) or len(instances)
+    created = []
+    with transaction.atomic(using=using):
+        for start in range(0, len(instances), batch_size):
+            batch = instances[start:start + batch_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    _insert_sql(model, connection, fields, returning, len(batch)),
+                    _insert_params(connection, fields, batch),
+                )
+                inserted = cursor.fetchall()
+            for row in inserted:
+                instance = model.from_db(
+                    using, [field.attname for field in returning], _convert_row(model, connection, returning, row),
+                )
+                post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+                created.append(instance)
+    return created
+
+def _insert_fields(model):
+    meta = model._meta
+    return [field for field in meta.local_concrete_fields if field is not meta.auto_field]
+
+def _insert_params(connection, fields, instances):
+    return [
+        field.get_db_prep_save(field.pre_save(instance, add=True), connection=connection)
+        for instance in instances for field in fields
+    ]
+
+def _insert_sql(model, connection, fields, returning, count):
+    """count 行的 INSERT ... ON CONFLICT DO NOTHING RETURNING"""
+    qn = connection.ops.quote_name
+    row = '(%s)' % ', '.join(['%s'] * len(fields))
+    return 'INSERT INTO %s (%s) VALUES %s ON CONFLICT DO NOTHING RETURNING %s' % (
+        qn(model._meta.db_table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join([row] * count),
+        ', '.join(qn(field.column) for field in returning),
+    )
+
+def _guarded_insert(model, connection, fields, returning, params, conditions, using):
+    """INSERT ... SELECT 值 WHERE EXISTS (条件) ... ON CONFLICT DO NOTHING RETURNING"""
+    qn = connection.ops.quote_name
+    where = []
+    for condition in conditions:
+        condition_sql, condition_params = condition.using(using).values('pk')[:1].query.get_compiler(
+            using=using
+        ).as_sql()
+        where.append('EXISTS (%s)' % condition_sql)
+        params = params + list(condition_params)
+    sql = 'INSERT INTO %s (%s) SELECT %s WHERE %s ON CONFLICT DO NOTHING RETURNING %s' % (
+        qn(model._meta.db_table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ' AND '.join(where),
+        ', '.join(qn(field.column) for field in returning),
+    )
+    return sql, params
+
+def remove_relation(model, *conditions, **lookup):
+    """删除匹配的一行关系，返回被删除的实例；不存在时返回 None
+
+    conditions 为附加的 Q 条件，如退出贴吧时的 ~Q(role='admin')。
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    queryset = model._base_manager.using(using).filter(*conditions, **lookup)
+    cascades = _fast_cascades(model, queryset, using)
+    if not supports_returning(connection) or cascades is None or _has_joins(queryset.query):
+        with transaction.atomic(using=using):
+            instance = queryset.select_for_update().first()
+            if instance is None:
+                return None
+            pk = instance.pk
+            instance.delete(using=using)
+            instance.pk = pk
+            return instance
+
+    meta = model._meta
+    qn = connection.ops.quote_name
+    compiler = queryset.query.get_compiler(using=using)
+    where, params = compiler.compile(queryset.query.where)
+    fields = list(meta.concrete_fields)
+    sql = 'DELETE FROM %s WHERE %s RETURNING %s' % (
+        qn(meta.db_table), where, ', '.join(qn(field.column) for field in fields),
+    )
+    with transaction.atomic(using=using):
+        for related in cascades:
+            related.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        instance = model.from_db(using, [field.attname for field in fields], _convert_row(model, connection, fields, row))
+        post_delete.send(sender=model, instance=instance, using=using, origin=instance)
+    return instance
+
+def _has_joins(query):
+    """条件是否跨表（手写的 DELETE 只支持单表条件）"""
+    return sum(1 for alias in query.alias_map if query.alias_refcount[alias]) > 1
+
+def _fast_cascades(model, queryset, using):
+    """被删除行的级联：都能一条 DELETE 删除时返回这些级联行的 queryset 列表，需要 ORM 处理时返回 None"""
+    meta = model._meta
+    if meta.local_many_to_many:
+        return None
+    collector = Collector(using)
+    cascades = []
+    for relation in meta.related_objects:
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        if relation.many_to_many or relation.on_delete is not models.CASCADE:
+            return None
+        related = relation.related_model._base_manager.using(using).filter(**{
+            f'{relation.field.name}__in': queryset.values(relation.field.target_field.attname),
+        })
+        if not collector.can_fast_delete(related):
+            return None
+        cascades.append(related)
+    return cascades
+
+def _convert_row(model, connection, fields, row):
+    """按 ORM 的数据库转换器转换原始行"""
+    values = []
+    for field, value in zip(fields, row):
+        column = field.get_col(model._meta.db_table)
+        for converter in connection.ops.get_db_converters(column) + column.get_db_converters(connection):
+            value = converter(value, column, connection)
+        values.append(value)
+    return values
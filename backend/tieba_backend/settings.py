@@ -3,7 +3,7 @@ Django settings for tieba_backend project.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'tiebas',
     'posts',
     'chat',
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -68,6 +69,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tieba_backend.wsgi.application'
+ASGI_APPLICATION = 'tieba_backend.asgi.application'
 
 # Database
 DATABASES = {
@@ -77,6 +79,40 @@ DATABASES = {
     }
 }
 
+# Cache
+# CACHE_BACKEND: locmem（进程内 LRU）/ file（文件缓存）/ db（数据库缓存，需先执行 createcachetable）
+# 响应缓存的作用域版本号、屏蔽名单等失效信号都写在这里，必须所有 worker 共享：
+# locmem 只适合单进程（runserver / 单 worker），因此仅在 DEBUG 下作为默认值，生产默认用 file。
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem' if DEBUG else 'file')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': config('CACHE_LOCATION', default='tieba_cache'),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tieba',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# 匿名只读接口响应缓存时间（秒），0 表示关闭
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=60, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,6 +164,92 @@ REST_FRAMEWORK = {
     ],
 }
 
+# 回复树（楼中楼）加载上限
+REPLY_TREE_MAX_DEPTH = 3
+REPLY_TREE_MAX_CHILDREN = 20
+# 帖子详情内嵌的顶层回复数，更多楼层通过回复列表接口分页获取
+POST_DETAIL_REPLY_LIMIT = 20
+
+# 帖子浏览量写回缓冲（秒 / 条）
+POST_VIEW_FLUSH_INTERVAL = 5
+POST_VIEW_MAX_PENDING = 1000
+POST_VIEW_BATCH_SIZE = 500
+POST_VIEW_ANONYMOUS_WINDOW = 30 * 60
+POST_VIEW_ANONYMOUS_MAX = 100000
+
+# 受信任的反向代理（IP 或网段，逗号分隔）；只有来自这些地址的请求才读取 X-Forwarded-For
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default='', cast=Csv())
+
+# 全文搜索引擎：auto（SQLite 下用 FTS5，否则 icontains）/ fts5 / like
+SEARCH_ENGINE = config('SEARCH_ENGINE', default='auto')
+
+# 帖子热度：半衰期（秒）、各类互动的权重、每个进程内热度榜单的长度与重载间隔（秒）
+HOT_SCORE_HALF_LIFE = 12 * 3600
+HOT_SCORE_WEIGHTS = {'view': 0.1, 'like': 1.0, 'reply': 2.0, 'favorite': 3.0}
+HOT_RANKING_SIZE = 200
+HOT_RANKING_REFRESH_INTERVAL = 60
+
+# 贴吧成员经验排行：每个进程最多缓存的贴吧榜单数与重载间隔（秒）
+MEMBER_RANKING_MAX_BOARDS = 100
+MEMBER_RANKING_REFRESH_INTERVAL = 60
+
+# 贴吧名称联想：索引整体刷新间隔（秒）与单次最多返回条数
+SUGGEST_REFRESH_INTERVAL = 300
+SUGGEST_MAX_RESULTS = 20
+
+# 私信实时推送：hub 类型（memory 单进程 / database 多进程）、每个连接的推送队列上限、
+# 心跳间隔与超时（秒）、database hub 的轮询间隔与事件保留时长（秒）
+REALTIME_HUB = config('REALTIME_HUB', default='memory')
+REALTIME_QUEUE_SIZE = 100
+REALTIME_HEARTBEAT_INTERVAL = 25
+REALTIME_HEARTBEAT_TIMEOUT = 60
+REALTIME_POLL_INTERVAL = 0.2
+REALTIME_EVENT_RETENTION = 300
+
+# 未读数缓存时长（秒），写入时主动失效
+UNREAD_CACHE_TIMEOUT = 300
+
+# 当前用户加入、关注的贴吧 id 集合的缓存有效期（秒）
+TIEBA_VIEWER_CACHE_TIMEOUT = 300
+
+# 贴吧详情页头部数据（贴吧信息、计数、公告、规则）的缓存有效期（秒），写入时主动失效
+TIEBA_BUNDLE_TIMEOUT = 300
+
+# 贴吧签到：日志汇总方式（thread 后台线程 / inline 提交后同步 / external 由 flush_sign_ins 处理）、
+# 汇总间隔（秒）、每批汇总条数、已汇总日志的保留天数，以及签到经验（连续签到另加 SIGN_IN_STREAK_BONUS）
+SIGN_IN_FLUSH_MODE = config('SIGN_IN_FLUSH_MODE', default='thread')
+SIGN_IN_FLUSH_INTERVAL = 5
+SIGN_IN_FLUSH_BATCH_SIZE = 500
+SIGN_IN_LOG_RETENTION_DAYS = 7
+SIGN_IN_EXPERIENCE = 6
+SIGN_IN_STREAK_BONUS = 2
+
+# 发消息屏蔽检查：blocked-by 缓存的有效期（秒），屏蔽关系变化时主动失效
+BLOCK_CACHE_TIMEOUT = 60
+
+# 通知扇出：处理方式（thread 后台线程 / inline 提交后同步 / external 由 process_notifications 处理）、
+# 每块写入的接收者数、空闲时检查任务的间隔（秒）、运行中的任务多久未更新视为中断（秒）
+NOTIFICATION_FANOUT_MODE = config('NOTIFICATION_FANOUT_MODE', default='thread')
+NOTIFICATION_FANOUT_CHUNK_SIZE = 1000
+NOTIFICATION_FANOUT_POLL_INTERVAL = 30
+NOTIFICATION_FANOUT_STALE_AFTER = 600
+
+# 通知保留期：已读通知保留的天数、清理任务的运行间隔（秒）
+NOTIFICATION_RETENTION_DAYS = 30
+NOTIFICATION_COMPACT_INTERVAL = 3600
+
+# 私信附件：单个文件上限（字节）、允许的类型前缀（None 为不限制，不要放开 image/svg+xml、text/html）、
+# nginx internal location 前缀（设置后下载由 nginx 通过 X-Accel-Redirect 发送）
+ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024
+ATTACHMENT_ALLOWED_TYPES = [
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'audio/', 'video/', 'text/plain',
+    'application/pdf', 'application/zip', 'application/vnd.rar', 'application/x-7z-compressed', 'application/gzip',
+    'application/msword', 'application/vnd.ms-', 'application/vnd.openxmlformats-officedocument.',
+]
+ATTACHMENT_ACCEL_REDIRECT = config('ATTACHMENT_ACCEL_REDIRECT', default='')
+# 上传会话保留时长（秒），过期的未完成上传和无引用文件由 cleanup_uploads 清理
+UPLOAD_SESSION_TTL = 24 * 3600
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -11,4 +11,5 @@ urlpatterns = [
     path('api/tiebas/', include('tiebas.urls')),
     path('api/posts/', include('posts.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/search/', include('search.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TiebaCategory, Tieba, TiebaMember, TiebaFollow, TiebaAnnouncement, TiebaRule
+from .models import TiebaCategory, Tieba, TiebaMember, TiebaSignIn, TiebaFollow, TiebaAnnouncement, TiebaRule
 
 @admin.register(TiebaCategory)
 class TiebaCategoryAdmin(admin.ModelAdmin):
@@ -22,6 +22,12 @@ class TiebaMemberAdmin(admin.ModelAdmin):
     list_filter = ['role', 'status', 'tieba']
     search_fields = ['tieba__name', 'user__username']
 
+@admin.register(TiebaSignIn)
+class TiebaSignInAdmin(admin.ModelAdmin):
+    list_display = ['member', 'date', 'signed_at', 'applied']
+    list_filter = ['applied', 'date']
+    raw_id_fields = ['member']
+
 @admin.register(TiebaFollow)
 class TiebaFollowAdmin(admin.ModelAdmin):
     list_display = ['user', 'tieba', 'created_at']
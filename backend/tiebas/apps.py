@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class TiebasConfig(AppConfig):
+    name = 'tiebas'
+    
+    def ready(self):
+        from . import counters, signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""贴吧详情页的头部数据（bundle）缓存
+
+贴吧信息、分类名、成员数/帖子数、最新公告和规则整体序列化一次，存在 Django 缓存中，
+贴吧详情页只需一次缓存读取；当前用户的 is_followed / is_member 另从 viewer_state 的缓存叠加。
+
+贴吧、分类、公告、规则的增删改以及成员、帖子的增删（计数变化）由信号在事务提交后删除对应的 bundle，
+另按 TIEBA_BUNDLE_TIMEOUT 过期。
+bundle 不依赖请求序列化，图片字段缓存的是相对路径，返回时再按当前请求拼成绝对 URL（与其他接口一致）。
+"""
+
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Tieba
+from .serializers import TiebaDetailSerializer
+
+# 缓存中为相对路径、返回时需拼成绝对 URL 的图片字段
+IMAGE_FIELDS = ('avatar', 'banner')
+
+def _cache_key(tieba_id):
+    return f'tieba_bundle:{tieba_id}'
+
+def get_tieba_bundle(tieba_id, request=None):
+    """贴吧头部数据（匿名视角的 TiebaDetailSerializer 输出）；贴吧不存在返回 None
+
+    传入 request 时图片字段为绝对 URL。
+    """
+    key = _cache_key(tieba_id)
+    bundle = cache.get(key)
+    if bundle is None:
+        tieba = Tieba.objects.select_related('category').filter(pk=tieba_id).first()
+        if tieba is None:
+            return None
+        bundle = dict(TiebaDetailSerializer(tieba).data)
+        cache.set(key, bundle, getattr(settings, 'TIEBA_BUNDLE_TIMEOUT', 300))
+    if request is not None:
+        bundle = dict(bundle, **{
+            field: request.build_absolute_uri(bundle[field]) for field in IMAGE_FIELDS if bundle.get(field)
+        })
+    return bundle
+
+def invalidate_tieba_bundles(*tieba_ids):
+    """事务提交后删除这些贴吧的 bundle"""
+    transaction.on_commit(partial(cache.delete_many, [_cache_key(tieba_id) for tieba_id in tieba_ids]))
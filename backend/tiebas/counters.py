@@ -0,0 +1,4 @@
+from tieba_backend.counters import Counter
+from .models import TiebaMember
+
+tieba_member_count = Counter(TiebaMember, 'tieba', 'member_count')
\ No newline at end of file
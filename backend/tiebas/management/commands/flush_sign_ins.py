@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from tiebas.sign_in import flush_sign_ins, sign_in_flusher
+
+class Command(BaseCommand):
+    help = '把未汇总的签到日志批量写回贴吧成员；--loop 时持续运行并每天清理一次过期日志'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='每批汇总的签到条数')
+        parser.add_argument('--loop', action='store_true', help='持续运行，作为独立的汇总进程')
+        parser.add_argument('--interval', type=float, default=1.0, help='--loop 时空闲的轮询间隔（秒）')
+    
+    def handle(self, *args, **options):
+        while True:
+            flushed = flush_sign_ins(batch_size=options['batch_size'])
+            if flushed:
+                self.stdout.write(f'汇总 {flushed} 条签到')
+            if not options['loop']:
+                break
+            sign_in_flusher.purge_if_due()
+            if not flushed:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('签到汇总完成'))
@@ -0,0 +1,119 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from tiebas.models import Tieba, TiebaMember
+from tiebas.sign_in import flush_sign_ins, level_for, sign_in_members, sign_in_reward
+from users.models import User
+
+class Rollback(Exception):
+    pass
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+class Command(BaseCommand):
+    help = '压测零点签到高峰：对比逐行读改写与签到日志 + 批量汇总的吞吐（结束后回滚）'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='用户数')
+        parser.add_argument('--tiebas', type=int, default=50, help='贴吧数')
+        parser.add_argument('--tiebas-per-user', type=int, default=5, help='每个用户加入的贴吧数')
+        parser.add_argument('--single-ratio', type=float, default=0.2,
+                            help='逐个贴吧签到的用户比例，其余用户一键签到')
+        parser.add_argument('--naive-sample', type=int, default=5000,
+                            help='逐行读改写实测的签到数，按比例估算全部签到的耗时；0 表示跳过')
+        parser.add_argument('--batch-size', type=int, default=None, help='每批汇总的签到条数')
+    
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('压测数据已回滚'))
+    
+    def run(self, options):
+        started = time.perf_counter()
+        owner = User.objects.create(username='sign_in_bench_owner', nickname='sign_in_bench_owner')
+        tiebas = Tieba.objects.bulk_create(
+            [Tieba(name=f'sign_in_bench_{index}', title=f'sign_in_bench_{index}', creator=owner)
+             for index in range(options['tiebas'])],
+        )
+        users = User.objects.bulk_create(
+            [User(username=f'sign_in_bench_{index}', nickname=f'sign_in_bench_{index}')
+             for index in range(options['users'])],
+            batch_size=2000,
+        )
+        per_user = min(options['tiebas_per_user'], len(tiebas))
+        members = TiebaMember.objects.bulk_create(
+            [TiebaMember(tieba=tiebas[(index + offset) % len(tiebas)], user=user)
+             for index, user in enumerate(users) for offset in range(per_user)],
+            batch_size=2000,
+        )
+        # 一半成员昨天签过到，检验连续签到的计算
+        yesterday = timezone.now() - timedelta(days=1)
+        TiebaMember.objects.filter(pk__in=[member.pk for member in members[::2]]).update(
+            last_sign_in=yesterday, continuous_sign_in=3, sign_in_count=3,
+        )
+        members = list(TiebaMember.objects.filter(user__in=users).order_by('user_id', 'id'))
+        total = len(members)
+        self.stdout.write(f'准备 {len(users)} 个用户、{total} 个成员用时 {time.perf_counter() - started:.2f}s')
+        
+        sample = min(options['naive_sample'], total)
+        if sample:
+            sid = transaction.savepoint()
+            started = time.perf_counter()
+            for member in members[:sample]:
+                member = TiebaMember.objects.get(pk=member.pk)
+                continuing = member.last_sign_in is not None and \
+                    timezone.localdate(member.last_sign_in) == timezone.localdate() - timedelta(days=1)
+                member.sign_in_count += 1
+                member.continuous_sign_in = member.continuous_sign_in + 1 if continuing else 1
+                member.experience += sign_in_reward(continuing)
+                member.level = max(member.level, level_for(member.experience))
+                member.last_sign_in = timezone.now()
+                member.save()
+            elapsed = time.perf_counter() - started
+            transaction.savepoint_rollback(sid)
+            self.stdout.write(f'逐行读改写：{sample} 次签到用时 {elapsed:.2f}s，'
+                              f'{sample / elapsed:.0f} 次/秒，估算 {total} 次约 {elapsed * total / sample:.1f}s')
+        
+        by_user = {}
+        for member in members:
+            by_user.setdefault(member.user_id, []).append(member)
+        groups = list(by_user.values())
+        single_users = int(len(groups) * options['single_ratio'])
+        
+        counter = QueryCounter()
+        requests = 0
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for group in groups[:single_users]:
+                for member in group:
+                    sign_in_members([member])
+                    requests += 1
+            for group in groups[single_users:]:
+                sign_in_members(group)
+                requests += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'签到请求：{requests} 个请求（{single_users} 个用户逐个签到，其余一键签到）、'
+                          f'{total} 次签到用时 {elapsed:.2f}s，{total / elapsed:.0f} 次签到/秒，'
+                          f'每个请求 {counter.count / requests:.1f} 条 SQL')
+        
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            flushed = flush_sign_ins(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'批量汇总：{flushed} 条签到用时 {elapsed:.2f}s，{flushed / elapsed:.0f} 条/秒，{counter.count} 条 SQL')
+        
+        continued = TiebaMember.objects.filter(user__in=users, continuous_sign_in=4, sign_in_count=4).count()
+        restarted = TiebaMember.objects.filter(user__in=users, continuous_sign_in=1, sign_in_count=1).count()
+        self.stdout.write(f'汇总结果：连续签到 {continued} 个，重新开始 {restarted} 个，共 {total} 个')
@@ -0,0 +1,187 @@
+"""贴吧成员经验排行
+
+成员列表按 (tieba, status, -experience, id) 索引做游标分页，翻页不再排序整个成员集合；
+“我在本吧排第几”由进程内的有序榜单回答：每个贴吧的正常成员按 (-experience, id) 存在 SortedList 中，
+增删和按键求名次都是 O(log n)，不必 COUNT 排在前面的成员。
+
+- 榜单在首次查询时加载，最多缓存 MEMBER_RANKING_MAX_BOARDS 个贴吧，淘汰最久未用的
+- 本进程内成员的增删改由信号、签到汇总由 refresh 增量更新榜单；
+  其他进程的改动只体现在数据库里，榜单按 MEMBER_RANKING_REFRESH_INTERVAL 整体重载
+- 重载在后台线程中进行，每个贴吧同一时刻只有一次，请求继续使用旧榜单；
+  加载期间的增量更新在新榜单换入时重放，不会被快照覆盖
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.db import connection
+from sortedcontainers import SortedList
+from .models import TiebaMember
+
+logger = logging.getLogger(__name__)
+
+class MemberBoard:
+    """一个贴吧全部正常成员按经验降序、id 升序的有序榜单"""
+
+    def __init__(self, rows):
+        self.keys = SortedList((-experience, member_id) for member_id, experience in rows)
+        self.experience = dict(rows)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, member_id, experience):
+        """更新成员的经验；experience 为 None 表示移出榜单"""
+        if self.experience.get(member_id) == experience:
+            return
+        self.discard(member_id)
+        if experience is None:
+            return
+        self.keys.add((-experience, member_id))
+        self.experience[member_id] = experience
+
+    def discard(self, member_id):
+        experience = self.experience.pop(member_id, None)
+        if experience is not None:
+            self.keys.remove((-experience, member_id))
+
+    def rank(self, member_id):
+        """成员的名次（从 1 开始），不在榜单中返回 None"""
+        experience = self.experience.get(member_id)
+        if experience is None:
+            return None
+        return self.keys.bisect_left((-experience, member_id)) + 1
+
+class MemberRanking:
+    """各贴吧的成员经验榜单"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._boards = OrderedDict()
+        # 进行中的加载 {tieba_id: [每次加载期间的增量更新 [(member_id, experience)]]}
+        self._loads = defaultdict(list)
+        self._refreshing = set()
+
+    @property
+    def max_boards(self):
+        return getattr(settings, 'MEMBER_RANKING_MAX_BOARDS', 100)
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'MEMBER_RANKING_REFRESH_INTERVAL', 60)
+
+    def get_board(self, tieba_id):
+        """贴吧的榜单；首次同步加载，过期的榜单照常返回并在后台重载"""
+        with self._lock:
+            board = self._boards.get(tieba_id)
+            if board is not None:
+                self._boards.move_to_end(tieba_id)
+                if time.monotonic() - board.loaded_at > self.refresh_interval:
+                    self._refresh_in_background(tieba_id, board)
+                return board
+        return self._load(tieba_id)
+
+    def get_rank(self, member):
+        """成员在贴吧内的 (名次, 成员总数)；先用成员的当前数据校正榜单"""
+        board = self.get_board(member.tieba_id)
+        experience = member.experience if member.status == 'active' else None
+        with self._lock:
+            self._record(member.tieba_id, member.pk, experience)
+            board.update(member.pk, experience)
+            return board.rank(member.pk), len(board)
+
+    def update(self, member):
+        self._place(member.tieba_id, member.pk, member.experience if member.status == 'active' else None)
+
+    def remove(self, member):
+        self._place(member.tieba_id, member.pk, None)
+
+    def refresh(self, member_ids):
+        """按数据库中的当前经验更新这些成员（批量 UPDATE 之后调用）；没有加载的榜单不查询"""
+        with self._lock:
+            tieba_ids = set(self._boards) | set(self._loads)
+        if not tieba_ids:
+            return
+        rows = TiebaMember.objects.filter(pk__in=member_ids, tieba_id__in=tieba_ids).values_list(
+            'id', 'tieba_id', 'experience', 'status'
+        )
+        for member_id, tieba_id, experience, status in rows:
+            self._place(tieba_id, member_id, experience if status == 'active' else None)
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+    def _rows(self, tieba_id):
+        return list(TiebaMember.objects.filter(tieba_id=tieba_id, status='active').values_list('id', 'experience'))
+
+    def _load(self, tieba_id, stale=None):
+        """从数据库加载榜单并换入，返回当前的榜单
+
+        stale 为后台重载前的旧榜单：只有缓存中仍是它时才替换；
+        首次加载时若并发的加载已放入榜单，则保留已放入的。
+        """
+        changes = []
+        with self._lock:
+            self._loads[tieba_id].append(changes)
+        try:
+            rows = self._rows(tieba_id)
+        except Exception:
+            with self._lock:
+                self._end_load(tieba_id, changes)
+            raise
+        board = MemberBoard(rows)
+        with self._lock:
+            self._end_load(tieba_id, changes)
+            for member_id, experience in changes:
+                board.update(member_id, experience)
+            current = self._boards.get(tieba_id)
+            if current is not stale:
+                return current or board
+            self._boards[tieba_id] = board
+            self._boards.move_to_end(tieba_id)
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+        return board
+
+    def _end_load(self, tieba_id, changes):
+        loads = self._loads[tieba_id]
+        loads.remove(changes)
+        if not loads:
+            del self._loads[tieba_id]
+
+    def _refresh_in_background(self, tieba_id, board):
+        with self._lock:
+            if tieba_id in self._refreshing:
+                return
+            self._refreshing.add(tieba_id)
+        threading.Thread(
+            target=self._run_refresh, args=(tieba_id, board), name='tieba-member-ranking-refresh', daemon=True,
+        ).start()
+
+    def _run_refresh(self, tieba_id, board):
+        try:
+            self._load(tieba_id, stale=board)
+        except Exception:
+            logger.exception('贴吧成员榜单重载失败')
+        finally:
+            with self._lock:
+                self._refreshing.discard(tieba_id)
+            connection.close()
+
+    def _record(self, tieba_id, member_id, experience):
+        """记下增量更新，供进行中的加载在换入时重放"""
+        for changes in self._loads.get(tieba_id, ()):
+            changes.append((member_id, experience))
+
+    def _place(self, tieba_id, member_id, experience):
+        with self._lock:
+            self._record(tieba_id, member_id, experience)
+            board = self._boards.get(tieba_id)
+            if board is not None:
+                board.update(member_id, experience)
+
+member_ranking = MemberRanking()
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiebas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TiebaSignIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='签到日期')),
+                ('signed_at', models.DateTimeField(verbose_name='签到时间')),
+                ('applied', models.BooleanField(default=False, verbose_name='是否已汇总')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sign_ins', to='tiebas.tiebamember', verbose_name='成员')),
+            ],
+            options={
+                'verbose_name': '签到记录',
+                'verbose_name_plural': '签到记录',
+                'indexes': [models.Index(fields=['applied', 'date', 'id'], name='tiebas_tieb_applied_6b08fa_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tiebasignin',
+            constraint=models.UniqueConstraint(fields=('member', 'date'), name='unique_tieba_sign_in_per_day'),
+        ),
+    ]
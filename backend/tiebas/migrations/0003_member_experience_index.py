@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiebas', '0002_sign_in_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tiebamember',
+            index=models.Index(fields=['tieba', 'status', '-experience', 'id'], name='tiebas_tieb_tieba_i_683086_idx'),
+        ),
+    ]
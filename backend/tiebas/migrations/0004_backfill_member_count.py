@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_member_count(apps, schema_editor):
+    """按成员表回填 member_count，之前只由注解统计，已有贴吧的计数列都是 0"""
+    Tieba = apps.get_model('tiebas', 'Tieba')
+    TiebaMember = apps.get_model('tiebas', 'TiebaMember')
+    counts = TiebaMember.objects.filter(
+        tieba=OuterRef('pk')
+    ).order_by().values('tieba').annotate(n=Count('pk')).values('n')
+    Tieba.objects.update(member_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiebas', '0003_member_experience_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_member_count, migrations.RunPython.noop),
+    ]
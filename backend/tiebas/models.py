@@ -98,10 +98,34 @@ class TiebaMember(models.Model):
         verbose_name_plural = '贴吧成员'
         unique_together = ('tieba', 'user')
         ordering = ['-role', '-experience', 'joined_at']
+        indexes = [
+            # 成员经验排行的游标分页
+            models.Index(fields=['tieba', 'status', '-experience', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.tieba}"
 
+class TiebaSignIn(models.Model):
+    """签到日志：每个成员每天一条，只追加不修改，由 tiebas.sign_in 批量汇总到 TiebaMember"""
+    member = models.ForeignKey(TiebaMember, on_delete=models.CASCADE, related_name='sign_ins', verbose_name='成员')
+    date = models.DateField(verbose_name='签到日期')
+    signed_at = models.DateTimeField(verbose_name='签到时间')
+    applied = models.BooleanField(default=False, verbose_name='是否已汇总')
+    
+    class Meta:
+        verbose_name = '签到记录'
+        verbose_name_plural = '签到记录'
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'date'], name='unique_tieba_sign_in_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['applied', 'date', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.member} {self.date} 签到"
+
 class TiebaFollow(models.Model):
     """贴吧关注"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tieba_follows', verbose_name='用户')
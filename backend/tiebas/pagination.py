@@ -0,0 +1,5 @@
+from tieba_backend.pagination import KeysetPagination
+
+class MemberKeysetPagination(KeysetPagination):
+    """贴吧成员游标分页：按经验降序排行"""
+    ordering = ('-experience', 'id')
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import TiebaCategory, Tieba, TiebaMember, TiebaFollow, TiebaAnnouncement, TiebaRule
+from .viewer_state import get_viewer_state
 from users.models import User
 
 class TiebaCategorySerializer(serializers.ModelSerializer):
@@ -20,21 +21,15 @@ class TiebaSerializer(serializers.ModelSerializer):
         model = Tieba
         fields = [
             'id', 'name', 'description', 'avatar', 'banner', 'category', 'category_name',
-            'member_count', 'post_count', 'is_public', 'is_official', 'is_followed', 'is_member',
+            'member_count', 'post_count', 'is_public', 'is_followed', 'is_member',
             'created_at', 'updated_at'
         ]
     
     def get_is_followed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return TiebaFollow.objects.filter(user=request.user, tieba=obj).exists()
-        return False
+        return obj.pk in get_viewer_state(self.context).followed_tieba_ids
     
     def get_is_member(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return TiebaMember.objects.filter(user=request.user, tieba=obj).exists()
-        return False
+        return obj.pk in get_viewer_state(self.context).member_tieba_ids
 
 class TiebaDetailSerializer(TiebaSerializer):
     announcements = serializers.SerializerMethodField()
@@ -48,7 +43,7 @@ class TiebaDetailSerializer(TiebaSerializer):
         return TiebaAnnouncementSerializer(announcements, many=True).data
     
     def get_rules(self, obj):
-        rules = TiebaRule.objects.filter(tieba=obj, is_active=True).order_by('order')
+        rules = TiebaRule.objects.filter(tieba=obj).order_by('sort_order', 'created_at')
         return TiebaRuleSerializer(rules, many=True).data
 
 class TiebaMemberSerializer(serializers.ModelSerializer):
@@ -57,7 +52,7 @@ class TiebaMemberSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = TiebaMember
-        fields = ['id', 'user', 'username', 'avatar', 'tieba', 'role', 'joined_at', 'last_active_at']
+        fields = ['id', 'user', 'username', 'avatar', 'tieba', 'role', 'level', 'experience', 'joined_at']
 
 class TiebaFollowSerializer(serializers.ModelSerializer):
     tieba_name = serializers.CharField(source='tieba.name', read_only=True)
@@ -77,7 +72,7 @@ class TiebaAnnouncementSerializer(serializers.ModelSerializer):
 class TiebaRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = TiebaRule
-        fields = ['id', 'tieba', 'title', 'content', 'order', 'is_active', 'created_at']
+        fields = ['id', 'tieba', 'title', 'content', 'sort_order', 'created_at']
 
 class TiebaCreateSerializer(serializers.ModelSerializer):
     class Meta:
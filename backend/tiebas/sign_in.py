@@ -0,0 +1,225 @@
+"""贴吧每日签到
+
+签到请求只向 TiebaSignIn 日志追加一行（每个成员每天一条，由唯一约束去重），不读改写 TiebaMember；
+签到次数、连续天数、经验和等级由汇总任务按天批量写回：
+- 每批取最早一天的若干条未汇总日志，对这些成员执行一条 UPDATE，连续签到、经验奖励、等级
+  都用 CASE 表达式在数据库中按旧值计算，UPDATE 只匹配上次签到早于当天的成员，重复汇总不会重复计数
+- 同一成员的多天日志（汇总积压跨过零点时）按日期先后分别汇总，连续天数不会算错
+- 接口返回的签到状态由成员当前数据加上其未汇总的日志在内存中推算，与汇总结果一致
+
+汇总按 SIGN_IN_FLUSH_MODE 运行：thread 由进程内后台线程每隔 SIGN_IN_FLUSH_INTERVAL 秒汇总，
+inline 在签到事务提交后同步汇总，external 由 flush_sign_ins 命令作为独立进程汇总。
+已汇总且超过 SIGN_IN_LOG_RETENTION_DAYS 天的日志每天清理一次。
+"""
+
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from tieba_backend.relations import add_relations
+from .member_ranking import member_ranking
+from .models import TiebaMember, TiebaSignIn
+
+logger = logging.getLogger(__name__)
+
+# 各等级所需经验：第 i 项为升到 i + 1 级所需的累计经验
+DEFAULT_LEVEL_EXPERIENCE = [
+    0, 5, 15, 30, 50, 100, 200, 500, 1000, 2000, 3000, 6000, 10000, 18000, 30000, 60000, 100000, 300000,
+]
+
+def level_experience():
+    return getattr(settings, 'TIEBA_LEVEL_EXPERIENCE', DEFAULT_LEVEL_EXPERIENCE)
+
+def level_for(experience):
+    """累计经验对应的等级"""
+    return max(bisect.bisect_right(level_experience(), experience), 1)
+
+def sign_in_reward(continuing):
+    """一次签到获得的经验，连续签到有额外奖励"""
+    reward = getattr(settings, 'SIGN_IN_EXPERIENCE', 6)
+    if continuing:
+        reward += getattr(settings, 'SIGN_IN_STREAK_BONUS', 2)
+    return reward
+
+def day_start(date):
+    return timezone.make_aware(datetime.combine(date, datetime.min.time()))
+
+def sign_in_members(members, now=None):
+    """为这些成员记录今天的签到，返回 (本次新签到的成员 id 集合, 签到状态)；今天已签到的不变"""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    members = list(members)
+    logs = _load_logs(members)
+    pending = [
+        member.pk for member in members
+        if not any(date == today for date, _, _ in logs.get(member.pk, []))
+    ]
+    created = set()
+    if pending:
+        # 是否新签到以 INSERT ... ON CONFLICT DO NOTHING 的返回为准：
+        # 并发的同一天签到只有一个请求真正插入，另一个按今天已签到返回
+        created = {log.member_id for log in add_relations(
+            TiebaSignIn, [{'member_id': member_id, 'date': today, 'signed_at': now} for member_id in pending],
+        )}
+        for member_id in pending:
+            logs.setdefault(member_id, []).append((today, now, False))
+        if created:
+            transaction.on_commit(sign_in_flusher.wake)
+    return created, _project_states(members, logs, today)
+
+def get_sign_in_states(members, today=None):
+    """成员的签到状态 {member_id: {...}}，包含尚未汇总的签到"""
+    members = list(members)
+    return _project_states(members, _load_logs(members), today or timezone.localdate())
+
+def _load_logs(members):
+    """成员最近的签到日志 {member_id: [(date, signed_at, applied)]}，按日期升序
+
+    每个成员只保留最近几天的日志，按 (member, date) 唯一索引取出；不按 applied 过滤，
+    否则数据库会改用 (applied, date) 索引扫描当天全部未汇总日志。
+    """
+    logs = {}
+    for member_id, date, signed_at, applied in TiebaSignIn.objects.filter(
+        member_id__in=[member.pk for member in members]
+    ).order_by('date').values_list('member_id', 'date', 'signed_at', 'applied'):
+        logs.setdefault(member_id, []).append((date, signed_at, applied))
+    return logs
+
+def _project_states(members, logs, today):
+    """在成员当前数据上按汇总规则依次应用未汇总的日志，得到汇总后的签到状态"""
+    states = {}
+    for member in members:
+        sign_in_count = member.sign_in_count
+        continuous = member.continuous_sign_in
+        experience = member.experience
+        level = member.level
+        last_sign_in = member.last_sign_in
+        for date, signed_at, applied in logs.get(member.pk, []):
+            last_date = timezone.localdate(last_sign_in) if last_sign_in else None
+            if applied or (last_date is not None and last_date >= date):
+                continue
+            continuing = last_date == date - timedelta(days=1)
+            sign_in_count += 1
+            continuous = continuous + 1 if continuing else 1
+            experience += sign_in_reward(continuing)
+            level = max(level, level_for(experience))
+            last_sign_in = signed_at
+        last_date = timezone.localdate(last_sign_in) if last_sign_in else None
+        states[member.pk] = {
+            'signed_today': last_date == today,
+            'sign_in_count': sign_in_count,
+            # 昨天和今天都没签到时连续天数已中断
+            'continuous_sign_in': continuous if last_date and last_date >= today - timedelta(days=1) else 0,
+            'experience': experience,
+            'level': level,
+            'last_sign_in': last_sign_in,
+        }
+    return states
+
+def flush_sign_ins(batch_size=None):
+    """把未汇总的签到日志批量写回 TiebaMember，返回汇总条数"""
+    batch_size = batch_size or getattr(settings, 'SIGN_IN_FLUSH_BATCH_SIZE', 500)
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            pending = TiebaSignIn.objects.filter(applied=False)
+            date = pending.order_by('date').values_list('date', flat=True).first()
+            if date is None:
+                return flushed
+            # 只处理最早的一天；多进程时跳过其他进程已锁定的行（不支持行锁的数据库忽略）
+            rows = list(pending.filter(date=date).select_for_update(skip_locked=True).order_by('id').values_list(
+                'id', 'member_id'
+            )[:batch_size])
+            if not rows:
+                return flushed
+            _apply_day(date, [member_id for _, member_id in rows])
+            TiebaSignIn.objects.filter(pk__in=[pk for pk, _ in rows]).update(applied=True)
+        member_ranking.refresh([member_id for _, member_id in rows])
+        flushed += len(rows)
+
+def _apply_day(date, member_ids):
+    """一条 UPDATE 汇总这些成员在 date 当天的签到"""
+    continuing = Q(last_sign_in__gte=day_start(date - timedelta(days=1)))
+    experience = F('experience') + Case(
+        When(continuing, then=Value(sign_in_reward(True))), default=Value(sign_in_reward(False)),
+    )
+    thresholds = level_experience()
+    level = Case(
+        *[
+            When(GreaterThanOrEqual(experience, thresholds[index]), then=Value(index + 1))
+            for index in range(len(thresholds) - 1, 0, -1)
+        ],
+        default=Value(1),
+    )
+    TiebaMember.objects.filter(
+        Q(last_sign_in__isnull=True) | Q(last_sign_in__lt=day_start(date)), pk__in=member_ids,
+    ).update(
+        sign_in_count=F('sign_in_count') + 1,
+        continuous_sign_in=Case(When(continuing, then=F('continuous_sign_in') + 1), default=Value(1)),
+        experience=experience,
+        level=Greatest(F('level'), level),
+        last_sign_in=Subquery(
+            TiebaSignIn.objects.filter(member_id=OuterRef('pk'), date=date).values('signed_at')[:1]
+        ),
+        updated_at=timezone.now(),
+    )
+
+def purge_sign_in_log():
+    """删除已汇总且超过保留天数的签到日志，返回删除条数"""
+    cutoff = timezone.localdate() - timedelta(days=getattr(settings, 'SIGN_IN_LOG_RETENTION_DAYS', 7))
+    deleted, _ = TiebaSignIn.objects.filter(applied=True, date__lt=cutoff).delete()
+    return deleted
+
+class SignInFlusher:
+    """进程内的签到汇总线程：每隔 SIGN_IN_FLUSH_INTERVAL 秒汇总一次，每天清理一次过期日志"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._purged_on = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'SIGN_IN_FLUSH_INTERVAL', 5)
+
+    def wake(self):
+        mode = getattr(settings, 'SIGN_IN_FLUSH_MODE', 'thread')
+        if mode == 'inline':
+            flush_sign_ins()
+            return
+        if mode != 'thread':
+            return
+        # 签到高峰时不逐次唤醒，线程按间隔批量汇总
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sign-in-flush', daemon=True)
+                self._thread.start()
+
+    def purge_if_due(self):
+        today = timezone.localdate()
+        if self._purged_on == today:
+            return 0
+        self._purged_on = today
+        return purge_sign_in_log()
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    flush_sign_ins()
+                    self.purge_if_due()
+                except Exception:
+                    logger.exception('签到汇总失败')
+                close_old_connections()
+        finally:
+            connection.close()
+
+sign_in_flusher = SignInFlusher()
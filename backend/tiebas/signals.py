@@ -0,0 +1,66 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from tieba_backend.cache import bump_cache_scopes
+from .bundle import invalidate_tieba_bundles
+from .models import TiebaCategory, Tieba, TiebaMember, TiebaFollow, TiebaAnnouncement, TiebaRule
+from .member_ranking import member_ranking
+from .suggest import suggest_index
+from .viewer_state import invalidate_viewer_state
+
+@receiver([post_save, post_delete], sender=TiebaCategory)
+def invalidate_category(sender, instance, **kwargs):
+    bump_cache_scopes('tiebas')
+
+@receiver([post_save, pre_delete], sender=TiebaCategory)
+def invalidate_category_bundles(sender, instance, **kwargs):
+    """分类名包含在贴吧头部数据中；删除分类时在置空外键之前取出贴吧"""
+    tieba_ids = list(Tieba.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+    if tieba_ids:
+        invalidate_tieba_bundles(*tieba_ids)
+
+@receiver([post_save, post_delete], sender=Tieba)
+def invalidate_tieba(sender, instance, **kwargs):
+    bump_cache_scopes('tiebas')
+    invalidate_tieba_bundles(instance.pk)
+
+@receiver(post_save, sender=Tieba)
+def index_tieba_suggest(sender, instance, raw=False, **kwargs):
+    if not raw:
+        suggest_index.add(instance)
+
+@receiver(post_delete, sender=Tieba)
+def unindex_tieba_suggest(sender, instance, **kwargs):
+    suggest_index.remove(instance.pk)
+
+@receiver([post_save, post_delete], sender=TiebaAnnouncement)
+@receiver([post_save, post_delete], sender=TiebaRule)
+def invalidate_tieba_detail(sender, instance, **kwargs):
+    """公告、规则包含在贴吧头部数据中"""
+    invalidate_tieba_bundles(instance.tieba_id)
+
+@receiver(post_save, sender=TiebaMember)
+def invalidate_member_count(sender, instance, created=False, **kwargs):
+    """成员增删改变 member_count"""
+    if created:
+        invalidate_tieba_bundles(instance.tieba_id)
+
+@receiver(post_delete, sender=TiebaMember)
+def invalidate_member_count_removed(sender, instance, **kwargs):
+    invalidate_tieba_bundles(instance.tieba_id)
+
+@receiver([post_save, post_delete], sender=TiebaMember)
+@receiver([post_save, post_delete], sender=TiebaFollow)
+def invalidate_tieba_viewer_state(sender, instance, **kwargs):
+    """加入/退出、关注/取消关注后失效该用户的成员与关注状态缓存"""
+    transaction.on_commit(partial(invalidate_viewer_state, instance.user_id))
+
+@receiver(post_save, sender=TiebaMember)
+def rank_tieba_member(sender, instance, raw=False, **kwargs):
+    if not raw:
+        member_ranking.update(instance)
+
+@receiver(post_delete, sender=TiebaMember)
+def unrank_tieba_member(sender, instance, **kwargs):
+    member_ranking.remove(instance)
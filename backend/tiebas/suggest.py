@@ -0,0 +1,184 @@
+"""贴吧名称联想（typeahead）索引
+
+进程内的 n-gram 倒排索引，覆盖 Tieba.name 和 title：
+- 单字查询查单字倒排表，多字查询对二元组倒排表求交集，再校验子串
+- 前缀命中优先，其次按 member_count 排序，结果条数有上限
+- 首次查询时从数据库整体加载；贴吧增删改通过信号增量更新；
+  member_count 由计数器直接 UPDATE，不触发信号，按 SUGGEST_REFRESH_INTERVAL 定期整体刷新
+- 定期刷新在后台线程中进行，同一时刻只有一次，请求继续使用旧索引；
+  刷新期间的增删改先照常作用于旧索引，并在新快照换入后重放，不会被快照覆盖
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from .models import Tieba
+
+logger = logging.getLogger(__name__)
+
+def _grams(text):
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+class TiebaSuggestIndex:
+    """贴吧名称 n-gram 索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.RLock()
+        self._entries = {}
+        self._postings = defaultdict(set)
+        self._loaded_at = None
+        self._refreshing = False
+        # 加载期间的增删改 [(tieba_id, (name, title, member_count) 或 None)]，新快照换入后重放
+        self._changes = None
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'SUGGEST_REFRESH_INTERVAL', 300)
+
+    def load(self):
+        """从数据库整体重建索引；同一时刻只有一次加载"""
+        with self._load_lock:
+            with self._lock:
+                self._changes = []
+            try:
+                entries, postings = self._build()
+            except Exception:
+                with self._lock:
+                    self._changes = None
+                raise
+            with self._lock:
+                changes, self._changes = self._changes, None
+                self._entries = entries
+                self._postings = postings
+                self._loaded_at = time.monotonic()
+                for tieba_id, values in changes:
+                    self._put(tieba_id, values)
+
+    def add(self, tieba):
+        """新增或更新一个贴吧"""
+        self._change(tieba.pk, (tieba.name, tieba.title, tieba.member_count))
+
+    def remove(self, tieba_id):
+        self._change(tieba_id, None)
+
+    def suggest(self, query, limit=10):
+        """返回 [(id, name, title, member_count), ...]，按相关度和成员数排序"""
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            if len(query) == 1:
+                candidates = self._postings.get(query, set())
+            else:
+                grams = [query[i:i + 2] for i in range(len(query) - 1)]
+                sets = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*sets) if sets[0] else set()
+
+            scored = []
+            for tieba_id in candidates:
+                entry = self._entries[tieba_id]
+                if query not in entry['text']:
+                    continue
+                if entry['name'].startswith(query):
+                    match_rank = 2
+                elif entry['title'].startswith(query):
+                    match_rank = 1
+                else:
+                    match_rank = 0
+                scored.append(((match_rank, entry['member_count'], -tieba_id), tieba_id))
+
+            top = heapq.nlargest(limit, scored)
+            return [
+                (tieba_id, self._entries[tieba_id]['raw_name'], self._entries[tieba_id]['raw_title'],
+                 self._entries[tieba_id]['member_count'])
+                for _, tieba_id in top
+            ]
+
+    def _ensure_fresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None:
+            # 首次加载同步进行，并发的请求等待同一次加载
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self.load()
+        elif time.monotonic() - loaded_at > self.refresh_interval:
+            self._refresh_in_background()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._run_refresh, name='tieba-suggest-refresh', daemon=True).start()
+
+    def _run_refresh(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception('贴吧联想索引刷新失败')
+        finally:
+            with self._lock:
+                self._refreshing = False
+            connection.close()
+
+    def _build(self):
+        entries = {}
+        postings = defaultdict(set)
+        rows = Tieba.objects.values_list('id', 'name', 'title', 'member_count')
+        for tieba_id, name, title, member_count in rows.iterator(chunk_size=2000):
+            entry = self._make_entry(name, title, member_count)
+            entries[tieba_id] = entry
+            for gram in _grams(entry['text']):
+                postings[gram].add(tieba_id)
+        return entries, postings
+
+    def _change(self, tieba_id, values):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((tieba_id, values))
+            if self._loaded_at is not None:
+                self._put(tieba_id, values)
+
+    def _put(self, tieba_id, values):
+        """values 为 (name, title, member_count)，None 表示删除"""
+        self._discard(tieba_id)
+        if values is None:
+            return
+        entry = self._make_entry(*values)
+        self._entries[tieba_id] = entry
+        for gram in _grams(entry['text']):
+            self._postings[gram].add(tieba_id)
+
+    def _make_entry(self, name, title, member_count):
+        name_lower = (name or '').lower()
+        title_lower = (title or '').lower()
+        return {
+            'raw_name': name,
+            'raw_title': title,
+            'name': name_lower,
+            'title': title_lower,
+            'text': f'{name_lower}\n{title_lower}',
+            'member_count': member_count,
+        }
+
+    def _discard(self, tieba_id):
+        entry = self._entries.pop(tieba_id, None)
+        if entry is None:
+            return
+        for gram in _grams(entry['text']):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(tieba_id)
+                if not ids:
+                    del self._postings[gram]
+
+suggest_index = TiebaSuggestIndex()
\ No newline at end of file
@@ -0,0 +1,261 @@
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from users.models import User
+from .member_ranking import MemberRanking
+from .models import Tieba, TiebaFollow, TiebaMember, TiebaSignIn
+from .sign_in import flush_sign_ins, get_sign_in_states, sign_in_members
+from .suggest import TiebaSuggestIndex
+
+class TiebaMembershipTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='x', nickname='creator')
+        self.user = User.objects.create_user(username='user', password='x', nickname='user')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=self.creator)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def url(self, action, pk=None):
+        return f'/api/tiebas/{pk or self.tieba.pk}/{action}/'
+
+    def test_join_and_leave_are_idempotent(self):
+        self.assertEqual(self.client.post(self.url('join')).status_code, 201)
+        self.assertEqual(self.client.post(self.url('join')).status_code, 200)
+        self.tieba.refresh_from_db()
+        self.assertEqual(self.tieba.member_count, 1)
+        # 退出时一并删除签到日志
+        sign_in_members(TiebaMember.objects.filter(user=self.user))
+        self.assertEqual(self.client.post(self.url('leave')).status_code, 200)
+        self.assertFalse(TiebaMember.objects.filter(user=self.user).exists())
+        self.tieba.refresh_from_db()
+        self.assertEqual(self.tieba.member_count, 0)
+        self.assertEqual(self.client.post(self.url('leave')).status_code, 404)
+
+    def test_admin_cannot_leave(self):
+        TiebaMember.objects.create(user=self.user, tieba=self.tieba, role='admin')
+        self.assertEqual(self.client.delete(self.url('leave')).status_code, 400)
+        self.assertTrue(TiebaMember.objects.filter(user=self.user).exists())
+
+    def test_join_checks_tieba_in_the_insert(self):
+        self.assertEqual(self.client.post(self.url('join', pk=999999)).status_code, 404)
+        private = Tieba.objects.create(name='私密吧', title='私密吧', creator=self.creator, is_public=False)
+        self.assertEqual(self.client.post(self.url('join', pk=private.pk)).status_code, 400)
+        self.assertEqual(self.client.post(self.url('follow', pk=999999)).status_code, 404)
+        self.assertFalse(TiebaMember.objects.filter(user=self.user).exists())
+        self.assertFalse(TiebaFollow.objects.exists())
+
+    def test_follow_and_unfollow(self):
+        self.assertEqual(self.client.post(self.url('follow')).status_code, 201)
+        self.assertEqual(self.client.post(self.url('follow')).status_code, 200)
+        self.assertEqual(self.client.delete(self.url('unfollow')).status_code, 200)
+        self.assertEqual(self.client.delete(self.url('unfollow')).status_code, 200)
+        self.assertFalse(TiebaFollow.objects.exists())
+
+    def test_missing_tieba_returns_404(self):
+        for action in ('leave', 'unfollow', 'join', 'follow'):
+            self.assertEqual(self.client.post(self.url(action, pk=999999)).status_code, 404, action)
+
+class TiebaSuggestIndexTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='x', nickname='creator')
+        self.python = Tieba.objects.create(name='python', title='Python 吧', creator=self.creator)
+
+    def names(self, index, query):
+        return [name for _, name, _, _ in index.suggest(query)]
+
+    def test_changes_during_load_are_replayed(self):
+        index = TiebaSuggestIndex()
+        index.load()
+        build = index._build
+        added = Tieba(pk=self.python.pk + 1000, name='pypy', title='PyPy 吧', member_count=0)
+
+        def build_with_concurrent_changes():
+            snapshot = build()
+            # 模拟快照读完之后、换入之前发生的增删
+            index.add(added)
+            index.remove(self.python.pk)
+            return snapshot
+
+        with mock.patch.object(index, '_build', build_with_concurrent_changes):
+            index.load()
+        self.assertEqual(self.names(index, 'py'), ['pypy'])
+
+    @override_settings(SUGGEST_REFRESH_INTERVAL=0)
+    def test_stale_index_refreshes_once_in_background(self):
+        index = TiebaSuggestIndex()
+        index.load()
+        release = threading.Event()
+        loads = []
+
+        def slow_load():
+            loads.append(threading.current_thread().name)
+            release.wait(5)
+
+        with mock.patch.object(index, 'load', slow_load), mock.patch('tiebas.suggest.connection'):
+            # 刷新进行中，请求不等待，继续使用旧索引
+            for _ in range(3):
+                self.assertEqual(self.names(index, 'py'), ['python'])
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == 'tieba-suggest-refresh':
+                    thread.join()
+        self.assertEqual(loads, ['tieba-suggest-refresh'])
+
+
+class TiebaDetailBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        creator = User.objects.create_user(username='creator', password='x', nickname='creator')
+        self.tieba = Tieba.objects.create(
+            name='测试吧', title='测试吧', creator=creator, avatar='tieba_avatars/a.png',
+        )
+
+    def test_images_are_absolute_urls(self):
+        # 第一次请求写入 bundle 缓存，第二次请求从缓存读取，两次都应为绝对 URL
+        for _ in range(2):
+            response = APIClient().get(f'/api/tiebas/{self.tieba.pk}/')
+            self.assertEqual(response.data['avatar'], 'http://testserver/media/tieba_avatars/a.png')
+            self.assertIsNone(response.data['banner'])
+
+
+class MemberRankingTests(TestCase):
+    def setUp(self):
+        creator = User.objects.create_user(username='creator', password='x', nickname='creator')
+        self.tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=creator)
+        self.members = [
+            TiebaMember.objects.create(
+                tieba=self.tieba,
+                user=User.objects.create(username=f'user{index}', nickname=f'user{index}'),
+                experience=experience,
+            )
+            for index, experience in enumerate([10, 30, 20, 30])
+        ]
+
+    def ranks(self, ranking):
+        return [ranking.get_rank(member)[0] for member in self.members]
+
+    def test_rank_orders_by_experience_then_id(self):
+        ranking = MemberRanking()
+        self.assertEqual(self.ranks(ranking), [4, 1, 3, 2])
+        self.members[0].experience = 40
+        ranking.update(self.members[0])
+        self.assertEqual(self.ranks(ranking), [1, 2, 4, 3])
+        ranking.remove(self.members[1])
+        self.assertEqual(ranking.get_board(self.tieba.pk).rank(self.members[1].pk), None)
+
+    def test_changes_during_load_are_replayed(self):
+        ranking = MemberRanking()
+        rows = ranking._rows
+
+        def rows_with_concurrent_changes(tieba_id):
+            snapshot = rows(tieba_id)
+            # 模拟快照读完之后、换入之前发生的签到和退出
+            self.members[0].experience = 50
+            ranking.update(self.members[0])
+            ranking.remove(self.members[1])
+            return snapshot
+
+        with mock.patch.object(ranking, '_rows', rows_with_concurrent_changes):
+            board = ranking.get_board(self.tieba.pk)
+        self.assertEqual(len(board), 3)
+        self.assertEqual(board.rank(self.members[0].pk), 1)
+
+    @override_settings(MEMBER_RANKING_REFRESH_INTERVAL=0)
+    def test_stale_board_refreshes_once_in_background(self):
+        ranking = MemberRanking()
+        board = ranking.get_board(self.tieba.pk)
+        release = threading.Event()
+        loads = []
+
+        def slow_rows(tieba_id):
+            loads.append(threading.current_thread().name)
+            release.wait(5)
+            return [(self.members[0].pk, 99)]
+
+        with mock.patch.object(ranking, '_rows', slow_rows), mock.patch('tiebas.member_ranking.connection'):
+            # 重载进行中，请求不等待，继续使用旧榜单
+            for _ in range(3):
+                self.assertIs(ranking.get_board(self.tieba.pk), board)
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == 'tieba-member-ranking-refresh':
+                    thread.join()
+        self.assertEqual(loads, ['tieba-member-ranking-refresh'])
+        self.assertEqual(len(ranking._boards[self.tieba.pk]), 1)
+
+
+@override_settings(
+    SIGN_IN_FLUSH_MODE='external', SIGN_IN_EXPERIENCE=6, SIGN_IN_STREAK_BONUS=2,
+    TIEBA_LEVEL_EXPERIENCE=[0, 6, 14, 100],
+)
+class SignInTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='user', password='x', nickname='user')
+        tieba = Tieba.objects.create(name='测试吧', title='测试吧', creator=user)
+        self.member = TiebaMember.objects.create(tieba=tieba, user=user)
+        self.day = timezone.localdate() - timedelta(days=10)
+
+    def sign_in(self, offset):
+        now = timezone.make_aware(datetime.combine(self.day + timedelta(days=offset), datetime.min.time())) \
+            + timedelta(hours=12)
+        created, states = sign_in_members([TiebaMember.objects.get(pk=self.member.pk)], now=now)
+        return self.member.pk in created, states[self.member.pk]
+
+    def flushed(self):
+        flush_sign_ins()
+        member = TiebaMember.objects.get(pk=self.member.pk)
+        return member.sign_in_count, member.continuous_sign_in, member.experience, member.level
+
+    def test_streak_experience_and_level(self):
+        # 第一天：6 经验，升到 2 级
+        self.assertTrue(self.sign_in(0)[0])
+        self.assertEqual(self.flushed(), (1, 1, 6, 2))
+        # 第二天连续：6 + 2 奖励，14 经验升到 3 级
+        self.assertTrue(self.sign_in(1)[0])
+        self.assertEqual(self.flushed(), (2, 2, 14, 3))
+        # 隔一天再签：连续天数重置，没有奖励
+        self.assertTrue(self.sign_in(3)[0])
+        self.assertEqual(self.flushed(), (3, 1, 20, 3))
+
+    def test_backlog_of_several_days_is_replayed_in_order(self):
+        for offset in range(3):
+            created, state = self.sign_in(offset)
+            self.assertTrue(created)
+        # 汇总前接口推算的状态与汇总结果一致
+        self.assertEqual(
+            (state['sign_in_count'], state['continuous_sign_in'], state['experience'], state['level']), (3, 3, 22, 3),
+        )
+        self.assertEqual(self.flushed(), (3, 3, 22, 3))
+        self.assertEqual(flush_sign_ins(), 0)
+        self.assertEqual(self.flushed(), (3, 3, 22, 3))
+
+    def test_double_sign_in_on_the_same_day(self):
+        self.assertTrue(self.sign_in(0)[0])
+        created, state = self.sign_in(0)
+        self.assertFalse(created)
+        self.assertEqual((state['sign_in_count'], timezone.localdate(state['last_sign_in'])), (1, self.day))
+        self.assertEqual(self.flushed(), (1, 1, 6, 2))
+
+    def test_concurrent_sign_in_relies_on_the_insert_result(self):
+        self.assertTrue(self.sign_in(0)[0])
+        # 模拟并发：另一个请求在对方插入之前读到的日志为空
+        with mock.patch('tiebas.sign_in._load_logs', return_value={}):
+            created, state = self.sign_in(0)
+        self.assertFalse(created)
+        self.assertEqual(state['sign_in_count'], 1)
+        self.assertEqual(TiebaSignIn.objects.count(), 1)
+        self.assertEqual(self.flushed(), (1, 1, 6, 2))
+
+    def test_view_reports_already_signed_in(self):
+        client = APIClient()
+        client.force_authenticate(self.member.user)
+        url = f'/api/tiebas/{self.member.tieba_id}/sign-in/'
+        first, second = client.post(url), client.post(url)
+        self.assertEqual((first.status_code, first.data['created']), (201, True))
+        self.assertEqual((second.status_code, second.data['created']), (200, False))
+        self.assertTrue(second.data['signed_today'])
+        self.assertEqual(get_sign_in_states([self.member])[self.member.pk]['sign_in_count'], 1)
@@ -11,6 +11,7 @@ urlpatterns = [
     # 贴吧列表和创建
     path('', views.TiebaListView.as_view(), name='tieba-list'),
     path('create/', views.TiebaCreateView.as_view(), name='tieba-create'),
+    path('suggest/', views.TiebaSuggestView.as_view(), name='tieba-suggest'),
     
     # 贴吧详情和更新
     path('<int:pk>/', views.TiebaDetailView.as_view(), name='tieba-detail'),
@@ -22,8 +23,13 @@ urlpatterns = [
     path('<int:pk>/follow/', views.TiebaFollowView.as_view(), name='tieba-follow'),
     path('<int:pk>/unfollow/', views.TiebaUnfollowView.as_view(), name='tieba-unfollow'),
     
+    # 签到
+    path('<int:pk>/sign-in/', views.TiebaSignInView.as_view(), name='tieba-sign-in'),
+    path('sign-in-all/', views.sign_in_all_tiebas, name='tieba-sign-in-all'),
+    
     # 贴吧成员列表
     path('<int:pk>/members/', views.TiebaMemberListView.as_view(), name='tieba-member-list'),
+    path('<int:pk>/members/rank/', views.TiebaMemberRankView.as_view(), name='tieba-member-rank'),
     
     # 贴吧公告和规则
     path('<int:pk>/announcements/', views.TiebaAnnouncementListView.as_view(), name='tieba-announcement-list'),
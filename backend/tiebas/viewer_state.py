@@ -0,0 +1,44 @@
+"""当前用户的贴吧成员/关注状态
+
+每个用户加入、关注的贴吧 id 集合缓存在 Django 缓存中，缓存缺失时每种关系一次查询整体加载，
+同一请求内只读一次缓存；序列化整页贴吧时 is_member / is_followed 只查内存集合。
+成员、关注关系增删时由信号在事务提交后失效该用户的缓存，另按 TIEBA_VIEWER_CACHE_TIMEOUT 过期。
+"""
+
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from .models import TiebaFollow, TiebaMember
+
+CONTEXT_KEY = 'tieba_viewer_state'
+
+TiebaViewerState = namedtuple('TiebaViewerState', ['member_tieba_ids', 'followed_tieba_ids'])
+
+ANONYMOUS = TiebaViewerState(frozenset(), frozenset())
+
+def _cache_key(user_id):
+    return f'tieba_viewer:{user_id}'
+
+def load_viewer_state(user_id):
+    """读取（缓存缺失时加载）用户加入和关注的贴吧 id 集合"""
+    key = _cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = TiebaViewerState(
+            frozenset(TiebaMember.objects.filter(user_id=user_id).values_list('tieba_id', flat=True)),
+            frozenset(TiebaFollow.objects.filter(user_id=user_id).values_list('tieba_id', flat=True)),
+        )
+        cache.set(key, state, getattr(settings, 'TIEBA_VIEWER_CACHE_TIMEOUT', 300))
+    return state
+
+def invalidate_viewer_state(user_id):
+    cache.delete(_cache_key(user_id))
+
+def get_viewer_state(context):
+    """获取（或加载）序列化上下文中当前用户的 TiebaViewerState"""
+    state = context.get(CONTEXT_KEY)
+    if state is None:
+        user = getattr(context.get('request'), 'user', None)
+        state = load_viewer_state(user.pk) if user is not None and user.is_authenticated else ANONYMOUS
+        context[CONTEXT_KEY] = state
+    return state
@@ -1,31 +1,45 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.db.models import Count, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from .models import TiebaCategory, Tieba, TiebaMember, TiebaFollow, TiebaAnnouncement, TiebaRule
+from tieba_backend.cache import ResponseCacheMixin
+from tieba_backend.relations import add_relation, remove_relation
+from .bundle import get_tieba_bundle
+from .member_ranking import member_ranking
+from .pagination import MemberKeysetPagination
+from .sign_in import get_sign_in_states, sign_in_members
+from .suggest import suggest_index
+from .viewer_state import get_viewer_state
 from .serializers import (
-    TiebaCategorySerializer, TiebaSerializer, TiebaDetailSerializer,
+    TiebaCategorySerializer, TiebaSerializer,
     TiebaMemberSerializer, TiebaFollowSerializer, TiebaAnnouncementSerializer,
     TiebaRuleSerializer, TiebaCreateSerializer, TiebaUpdateSerializer
 )
 
-class TiebaCategoryListView(generics.ListAPIView):
+class TiebaCategoryListView(ResponseCacheMixin, generics.ListAPIView):
     """获取贴吧分类列表"""
     queryset = TiebaCategory.objects.annotate(tieba_count=Count('tieba'))
     serializer_class = TiebaCategorySerializer
     permission_classes = [permissions.AllowAny]
+    
+    def get_cache_scopes(self):
+        return ['tiebas']
 
-class TiebaListView(generics.ListAPIView):
+class TiebaListView(ResponseCacheMixin, generics.ListAPIView):
     """获取贴吧列表"""
     serializer_class = TiebaSerializer
     permission_classes = [permissions.AllowAny]
     
+    def get_cache_scopes(self):
+        return ['tiebas']
+    
     def get_queryset(self):
-        queryset = Tieba.objects.select_related('category').annotate(
-            annotated_member_count=Count('members'),
-            annotated_post_count=Count('posts')
-        )
+        queryset = Tieba.objects.select_related('category')
         
         # 搜索过滤
         search = self.request.query_params.get('search', None)
@@ -37,25 +51,46 @@ class TiebaListView(generics.ListAPIView):
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         
-        # 排序
-        sort = self.request.query_params.get('sort', 'annotated_member_count')
-        if sort == 'annotated_member_count':
-            queryset = queryset.order_by('-annotated_member_count')
-        elif sort == 'annotated_post_count':
-            queryset = queryset.order_by('-annotated_post_count')
+        # 排序（计数列由 counters 维护，无需聚合关联表）
+        sort = self.request.query_params.get('sort', 'member_count').lstrip('-')
+        if sort in ('member_count', 'annotated_member_count'):
+            queryset = queryset.order_by('-member_count', '-id')
+        elif sort in ('post_count', 'annotated_post_count'):
+            queryset = queryset.order_by('-post_count', '-id')
         elif sort == 'created_at':
             queryset = queryset.order_by('-created_at')
         
         return queryset
 
-class TiebaDetailView(generics.RetrieveAPIView):
-    """获取贴吧详情"""
-    queryset = Tieba.objects.select_related('category').annotate(
-        annotated_member_count=Count('members'),
-        annotated_post_count=Count('posts')
-    )
-    serializer_class = TiebaDetailSerializer
+class TiebaSuggestView(APIView):
+    """贴吧名称联想"""
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        max_results = getattr(settings, 'SUGGEST_MAX_RESULTS', 20)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), max_results)
+        except ValueError:
+            limit = 10
+        
+        suggestions = suggest_index.suggest(request.query_params.get('q', ''), limit=limit)
+        return Response([
+            {'id': tieba_id, 'name': name, 'title': title, 'member_count': member_count}
+            for tieba_id, name, title, member_count in suggestions
+        ])
+
+class TiebaDetailView(APIView):
+    """获取贴吧详情：头部数据来自 bundle 缓存，再叠加当前用户的关注/成员状态"""
     permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, pk):
+        bundle = get_tieba_bundle(pk, request)
+        if bundle is None:
+            raise Http404
+        viewer = get_viewer_state({'request': request})
+        return Response(dict(
+            bundle, is_followed=pk in viewer.followed_tieba_ids, is_member=pk in viewer.member_tieba_ids,
+        ))
 
 class TiebaCreateView(generics.CreateAPIView):
     """创建贴吧"""
@@ -87,18 +122,13 @@ class TiebaJoinView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        tieba = get_object_or_404(Tieba, id=kwargs['pk'])
-        
-        # 检查是否已经是成员
-        if TiebaMember.objects.filter(user=request.user, tieba=tieba).exists():
-            return Response({'error': '已经是该贴吧成员'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 检查贴吧是否公开
-        if not tieba.is_public:
-            return Response({'error': '该贴吧不公开，无法加入'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 加入贴吧
-        TiebaMember.objects.create(user=request.user, tieba=tieba, role='member')
+        # 加入公开的贴吧（已经是成员时不变）：一条 INSERT，同时确认贴吧存在且公开；没有插入时再区分原因
+        public = Tieba.objects.filter(pk=kwargs['pk'], is_public=True)
+        if add_relation(TiebaMember, public, user=request.user, tieba_id=kwargs['pk'], role='member') is None:
+            tieba = get_object_or_404(Tieba.objects.only('id', 'is_public'), id=kwargs['pk'])
+            if not tieba.is_public:
+                return Response({'error': '该贴吧不公开，无法加入'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'message': '已经是该贴吧成员'}, status=status.HTTP_200_OK)
         return Response({'message': '成功加入贴吧'}, status=status.HTTP_201_CREATED)
 
 class TiebaLeaveView(generics.DestroyAPIView):
@@ -106,29 +136,27 @@ class TiebaLeaveView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        tieba = get_object_or_404(Tieba, id=kwargs['pk'])
-        membership = get_object_or_404(TiebaMember, user=request.user, tieba=tieba)
-        
-        # 检查是否是贴吧管理员（管理员不能退出，只能转让或删除贴吧）
-        if membership.role == 'admin':
-            return Response({'error': '贴吧管理员不能退出，请先转让管理员权限'}, status=status.HTTP_400_BAD_REQUEST)
+        # 直接删除非管理员的成员关系（管理员不能退出，只能转让或删除贴吧）
+        if remove_relation(TiebaMember, ~Q(role='admin'), user=request.user, tieba=kwargs['pk']) is not None:
+            return Response({'message': '成功退出贴吧'}, status=status.HTTP_200_OK)
         
-        membership.delete()
-        return Response({'message': '成功退出贴吧'}, status=status.HTTP_200_OK)
+        # 没有删除任何行：贴吧不存在或不是成员返回 404，否则是管理员
+        tieba = get_object_or_404(Tieba.objects.only('id'), id=kwargs['pk'])
+        get_object_or_404(TiebaMember.objects.only('id'), user=request.user, tieba=tieba, role='admin')
+        return Response({'error': '贴吧管理员不能退出，请先转让管理员权限'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def post(self, request, *args, **kwargs):
+        return self.delete(request, *args, **kwargs)
 
 class TiebaFollowView(generics.CreateAPIView):
     """关注贴吧"""
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        tieba = get_object_or_404(Tieba, id=kwargs['pk'])
-        
-        # 检查是否已经关注
-        if TiebaFollow.objects.filter(user=request.user, tieba=tieba).exists():
-            return Response({'error': '已经关注该贴吧'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 关注贴吧
-        TiebaFollow.objects.create(user=request.user, tieba=tieba)
+        # 关注贴吧（已经关注时不变）：一条 INSERT，同时确认贴吧存在；没有插入时再区分 404
+        if add_relation(TiebaFollow, Tieba.objects.filter(pk=kwargs['pk']), user=request.user, tieba_id=kwargs['pk']) is None:
+            get_object_or_404(Tieba.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '已经关注该贴吧'}, status=status.HTTP_200_OK)
         return Response({'message': '成功关注贴吧'}, status=status.HTTP_201_CREATED)
 
 class TiebaUnfollowView(generics.DestroyAPIView):
@@ -136,20 +164,59 @@ class TiebaUnfollowView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        tieba = get_object_or_404(Tieba, id=kwargs['pk'])
-        follow = get_object_or_404(TiebaFollow, user=request.user, tieba=tieba)
-        
-        follow.delete()
+        # 没有关注时不变；不存在的贴吧返回 404
+        if remove_relation(TiebaFollow, user=request.user, tieba=kwargs['pk']) is None:
+            get_object_or_404(Tieba.objects.only('id'), id=kwargs['pk'])
+            return Response({'message': '未关注该贴吧'}, status=status.HTTP_200_OK)
         return Response({'message': '成功取消关注'}, status=status.HTTP_200_OK)
+    
+    def post(self, request, *args, **kwargs):
+        return self.delete(request, *args, **kwargs)
+
+class TiebaSignInView(APIView):
+    """贴吧签到：GET 查询今日签到状态，POST 签到"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_member(self, request, pk):
+        return get_object_or_404(TiebaMember, tieba_id=pk, user=request.user, status='active')
+    
+    def get(self, request, pk):
+        member = self.get_member(request, pk)
+        return Response(get_sign_in_states([member])[member.pk])
+    
+    def post(self, request, pk):
+        member = self.get_member(request, pk)
+        created, states = sign_in_members([member])
+        data = dict(states[member.pk], created=member.pk in created)
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 class TiebaMemberListView(generics.ListAPIView):
-    """获取贴吧成员列表"""
+    """获取贴吧成员列表（按经验排行）"""
     serializer_class = TiebaMemberSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = MemberKeysetPagination
     
     def get_queryset(self):
         tieba = get_object_or_404(Tieba, id=self.kwargs['pk'])
-        return TiebaMember.objects.filter(tieba=tieba).select_related('user')
+        return TiebaMember.objects.filter(tieba=tieba, status='active').select_related('user')
+
+class TiebaMemberRankView(APIView):
+    """查询成员在贴吧内的经验排名：默认当前用户，user 参数可指定其他用户"""
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, pk):
+        user_id = request.query_params.get('user') or (request.user.pk if request.user.is_authenticated else None)
+        if user_id is None:
+            return Response({'error': '请指定用户'}, status=status.HTTP_400_BAD_REQUEST)
+        member = get_object_or_404(TiebaMember, tieba_id=pk, user_id=user_id, status='active')
+        rank, total = member_ranking.get_rank(member)
+        return Response({
+            'user': member.user_id,
+            'rank': rank,
+            'total': total,
+            'experience': member.experience,
+            'level': member.level,
+        })
 
 class TiebaAnnouncementListView(generics.ListAPIView):
     """获取贴吧公告列表"""
@@ -167,7 +234,22 @@ class TiebaRuleListView(generics.ListAPIView):
     
     def get_queryset(self):
         tieba = get_object_or_404(Tieba, id=self.kwargs['pk'])
-        return TiebaRule.objects.filter(tieba=tieba, is_active=True).order_by('order')
+        return TiebaRule.objects.filter(tieba=tieba).order_by('sort_order', 'created_at')
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def sign_in_all_tiebas(request):
+    """一键签到用户加入的全部贴吧"""
+    members = list(TiebaMember.objects.filter(user=request.user, status='active').select_related('tieba'))
+    created, states = sign_in_members(members)
+    return Response({
+        'signed_in': len(created),
+        'already_signed_in': len(members) - len(created),
+        'results': [
+            dict(states[member.pk], tieba=member.tieba_id, tieba_name=member.tieba.name, created=member.pk in created)
+            for member in members
+        ],
+    })
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
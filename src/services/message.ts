@@ -27,6 +27,8 @@ export const messageApi = {
   
   // 获取消息列表
   async getMessages(conversationId: number, params?: {
+    cursor?: string
+    since_id?: number
     page?: number
     page_size?: number
   }) {
@@ -62,9 +64,15 @@ export const messageApi = {
     return response
   },
   
-  // 标记消息为已读
-  async markAsRead(messageId: number) {
-    const response = await api.post(`/chat/messages/${messageId}/read/`)
+  // 标记对话为已读（可只读到某条消息为止）
+  async markAsRead(conversationId: number, messageId?: number) {
+    const response = await api.post(`/chat/conversations/${conversationId}/read/`, messageId ? { message_id: messageId } : {})
+    return response
+  },
+  
+  // 批量标记消息为已读
+  async markMessagesAsRead(messageIds: number[]) {
+    const response = await api.post('/chat/messages/mark-read/', { message_ids: messageIds })
     return response
   },
   
@@ -90,6 +98,18 @@ export const messageApi = {
     return response
   },
   
+  // 批量标记通知为已读（按 id，或某时间及之前的全部）
+  async markNotificationsAsRead(params: { ids?: number[]; before?: string }) {
+    const response = await api.post('/chat/notifications/mark-read/', params)
+    return response
+  },
+  
+  // 删除通知
+  async deleteNotification(notificationId: number) {
+    const response = await api.delete(`/chat/notifications/${notificationId}/`)
+    return response
+  },
+  
   // 发送私信
   async sendDirectMessage(data: {
     recipient_id: number
@@ -128,13 +148,14 @@ export const searchApi = {
     return response
   },
   
-  // 搜索帖子
+  // 搜索帖子（全文索引，type 为 post 或 reply）
   async searchPosts(query: string, params?: {
     page?: number
     page_size?: number
     tieba?: number
+    type?: 'post' | 'reply'
   }) {
-    const response = await api.get('/posts/search/', {
+    const response = await api.get('/search/', {
       params: { q: query, ...params }
     })
     return response
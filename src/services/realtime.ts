@@ -0,0 +1,47 @@
+// 私信实时推送（WebSocket）
+const WS_URL = 'ws://127.0.0.1:8000/ws/chat/'
+
+export type RealtimeEvent =
+  | { type: 'message'; conversation: number; message: any }
+  | { type: 'read'; conversation: number; user: number; read_at: string }
+  | { type: 'notification'; notification: any }
+
+// 建立连接并在断开后自动重连，返回关闭函数
+export function connectRealtime(onEvent: (event: RealtimeEvent) => void) {
+  let socket: WebSocket | null = null
+  let retryDelay = 1000
+  let closed = false
+
+  const connect = () => {
+    const token = localStorage.getItem('token')
+    if (!token || closed) return
+
+    socket = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token)}`)
+    socket.onopen = () => {
+      retryDelay = 1000
+    }
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data)
+      if (data.type === 'ping') {
+        socket?.send(JSON.stringify({ type: 'pong' }))
+        return
+      }
+      if (data.type !== 'pong') {
+        onEvent(data)
+      }
+    }
+    socket.onclose = (event) => {
+      // 4401 表示未登录或 token 失效，不再重连
+      if (closed || event.code === 4401) return
+      setTimeout(connect, retryDelay)
+      retryDelay = Math.min(retryDelay * 2, 30000)
+    }
+  }
+
+  connect()
+
+  return () => {
+    closed = true
+    socket?.close()
+  }
+}
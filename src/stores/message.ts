@@ -286,8 +286,7 @@ export const useMessageStore = defineStore('message', () => {
   // 标记消息为已读
   const markAsRead = async (messageIds: number[]) => {
     try {
-      const promises = messageIds.map(id => messageApi.markAsRead(id))
-      await Promise.all(promises)
+      await messageApi.markMessagesAsRead(messageIds)
       
       // 更新消息状态
       messages.value.forEach(msg => {